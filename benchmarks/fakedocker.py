@@ -0,0 +1,215 @@
+'''
+Provides an in-process stand-in for the Docker SDK container objects used by `DockerUtils`,
+backed by a directory on the host filesystem. This allows the container copy paths to be
+benchmarked without a Docker daemon, so that the results reflect only our own overheads.
+'''
+from os.path import basename, join
+import io, json, os, struct, subprocess, sys, tarfile, threading
+
+# The size of the chunks yielded by `FakeContainer.get_archive()` (this matches the Docker SDK default)
+CHUNK_SIZE = 2 * 1024 * 1024
+
+
+class _Pipe(io.RawIOBase):
+	'''
+	A minimal blocking pipe used to stream tar data from a writer thread to a chunk generator
+	'''
+	
+	def __init__(self):
+		self._chunks = []
+		self._closed = False
+		self._condition = threading.Condition()
+	
+	def writable(self):
+		return True
+	
+	def write(self, data):
+		with self._condition:
+			self._chunks.append(bytes(data))
+			self._condition.notify()
+		return len(data)
+	
+	def finish(self):
+		with self._condition:
+			self._closed = True
+			self._condition.notify()
+	
+	def chunks(self):
+		buffered = b''
+		while True:
+			with self._condition:
+				while len(self._chunks) == 0 and self._closed == False:
+					self._condition.wait()
+				pending = self._chunks
+				self._chunks = []
+				finished = self._closed and len(pending) == 0
+			buffered += b''.join(pending)
+			while len(buffered) >= CHUNK_SIZE or (finished and len(buffered) > 0):
+				yield buffered[:CHUNK_SIZE]
+				buffered = buffered[CHUNK_SIZE:]
+			if finished == True:
+				return
+
+
+class _ExecSocket(object):
+	'''
+	Stand-in for the raw socket returned by `exec_start(socket=True)`. Data written to the socket is sent to the
+	stdin of the process (with container paths in each JSON request line mapped to host paths), and the output of
+	the process is returned in the multiplexed frame format used by the Docker daemon.
+	'''
+	
+	def __init__(self, process, mapper):
+		self._process = process
+		self._mapper = mapper
+		self._buffer = b''
+		self._frames = []
+		self._condition = threading.Condition()
+		self._open = 2
+		threading.Thread(target=self._pump, args=(process.stdout, 1), daemon=True).start()
+		threading.Thread(target=self._pump, args=(process.stderr, 2), daemon=True).start()
+	
+	def sendall(self, data):
+		self._buffer += bytes(data)
+		while b'\n' in self._buffer:
+			line, _, self._buffer = self._buffer.partition(b'\n')
+			self._process.stdin.write(json.dumps(self._mapper(json.loads(line.decode('utf-8')))).encode('utf-8') + b'\n')
+			self._process.stdin.flush()
+	
+	def recv(self, count):
+		with self._condition:
+			while len(self._frames) == 0 and self._open > 0:
+				self._condition.wait()
+			if len(self._frames) == 0:
+				return b''
+			data = self._frames[0][:count]
+			self._frames[0] = self._frames[0][count:]
+			if len(self._frames[0]) == 0:
+				self._frames.pop(0)
+			return data
+	
+	def close(self):
+		try:
+			self._process.stdin.close()
+		except OSError:
+			pass
+		self._process.wait()
+	
+	def _pump(self, pipe, stream):
+		for data in iter(lambda: pipe.read1(65536), b''):
+			with self._condition:
+				self._frames.append(struct.pack('>BxxxL', stream, len(data)) + data)
+				self._condition.notify_all()
+		with self._condition:
+			self._open -= 1
+			self._condition.notify_all()
+
+
+class FakeAPIClient(object):
+	'''
+	Stand-in for `docker.APIClient`, providing only the exec functionality used by `DockerUtils`.
+	
+	Commands are run on the host system. Only the Python scripts run by `DockerUtils` are supported:
+	the interpreter is replaced with the current one, and the JSON-encoded arguments passed to the
+	script have any absolute container paths mapped to the corresponding host paths.
+	'''
+	
+	def __init__(self, container):
+		self._container = container
+		self._execs = {}
+	
+	def exec_create(self, container_id, command, stdin=False, **kwargs):
+		flags = [arg for arg in command[1:] if arg in ['-u', '-c']]
+		if len(command) < 3 or command[0] not in ['python', 'python3'] or flags[-1:] != ['-c']:
+			raise RuntimeError('unsupported command: {}'.format(command))
+		
+		script = len(flags) + 1
+		arguments = [json.dumps(self._map(json.loads(arg))) for arg in command[script + 1:]]
+		identifier = 'exec-{}'.format(len(self._execs))
+		self._execs[identifier] = {'command': [sys.executable] + flags + [command[script]] + arguments, 'exit_code': None}
+		return {'Id': identifier}
+	
+	def exec_start(self, exec_id, stream=False, demux=False, socket=False):
+		details = self._execs[exec_id]
+		if socket == True:
+			details['process'] = subprocess.Popen(details['command'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+			return _ExecSocket(details['process'], self._map)
+		
+		process = subprocess.Popen(details['command'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		stdout, stderr = process.communicate()
+		details['exit_code'] = process.returncode
+		return iter([(stdout if len(stdout) > 0 else None, stderr if len(stderr) > 0 else None)])
+	
+	def exec_inspect(self, exec_id):
+		details = self._execs[exec_id]
+		if 'process' in details:
+			return {'ExitCode': details['process'].poll()}
+		return {'ExitCode': details['exit_code']}
+	
+	def _map(self, value):
+		if isinstance(value, str) and value.startswith('/'):
+			return self._container.host_path(value)
+		elif isinstance(value, list):
+			return [self._map(item) for item in value]
+		elif isinstance(value, dict):
+			return {key: self._map(item) for key, item in value.items()}
+		return value
+
+
+class FakeClient(object):
+	'''
+	Stand-in for `docker.DockerClient`, providing only what the benchmarks require
+	'''
+	
+	def __init__(self, container):
+		self.api = FakeAPIClient(container)
+
+
+class FakeContainer(object):
+	'''
+	Stand-in for `docker.models.containers.Container`, mapping the container's
+	filesystem onto the specified directory on the host system
+	'''
+	
+	def __init__(self, root, platform='linux'):
+		self.root = root
+		self.id = 'fake-{}'.format(id(self))
+		self.short_id = self.id[:12]
+		self.attrs = {'Platform': platform}
+		self.client = FakeClient(self)
+		os.makedirs(root, exist_ok=True)
+	
+	def host_path(self, container_path):
+		'''
+		Maps a container path to the corresponding path on the host system
+		'''
+		return join(self.root, container_path.lstrip('/\\'))
+	
+	def put_archive(self, path, data):
+		'''
+		Extracts tar data (bytes or a file-like object) into the specified container directory
+		'''
+		stream = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+		with tarfile.open(fileobj=stream, mode='r|*') as archive:
+			archive.extractall(self.host_path(path))
+		return True
+	
+	def get_archive(self, path, chunk_size=CHUNK_SIZE):
+		'''
+		Returns a generator of tar data chunks for the specified container path, along with its stat details
+		'''
+		source = self.host_path(path)
+		stat = {'name': basename(source.rstrip('/\\')), 'size': os.path.getsize(source), 'mode': os.stat(source).st_mode}
+		pipe = _Pipe()
+		
+		def produce():
+			try:
+				with tarfile.open(fileobj=pipe, mode='w|') as archive:
+					archive.add(source, arcname=basename(source.rstrip('/\\')))
+			finally:
+				pipe.finish()
+		
+		threading.Thread(target=produce, daemon=True).start()
+		return pipe.chunks(), stat
+	
+	def stop(self, timeout=None):
+		pass
@@ -0,0 +1,78 @@
+'''
+Provides a threaded local HTTP server that supports single byte-range requests, which the standard
+library's `http.server` does not. This allows the download paths to be benchmarked without network
+access, so that the results reflect only our own overheads.
+'''
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os.path import isfile, join
+import os, re, socketserver, threading
+
+# The size of the blocks written to each response
+BLOCK_SIZE = 1024 * 1024
+
+
+class _ThreadedServer(socketserver.ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+	'''
+	Serves the files in the server's directory, honouring `Range: bytes=start-end` headers
+	'''
+	
+	protocol_version = 'HTTP/1.1'
+	
+	def do_HEAD(self):
+		self._respond(False)
+	
+	def do_GET(self):
+		self._respond(True)
+	
+	def log_message(self, format, *args):
+		pass
+	
+	def _respond(self, body):
+		path = join(self.server.directory, self.path.lstrip('/').split('?', 1)[0])
+		if not isfile(path):
+			self.send_error(404)
+			return
+		
+		# Determine the requested byte range
+		size = os.path.getsize(path)
+		start, end = 0, size - 1
+		match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+		partial = match is not None and self.server.ranges == True
+		if partial == True:
+			start = int(match.group(1))
+			end = min(int(match.group(2)), size - 1) if match.group(2) != '' else size - 1
+		
+		self.send_response(206 if partial == True else 200)
+		self.send_header('Content-Length', str(end - start + 1))
+		self.send_header('ETag', '"{}-{}"'.format(size, int(os.path.getmtime(path))))
+		if self.server.ranges == True:
+			self.send_header('Accept-Ranges', 'bytes')
+		if partial == True:
+			self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, size))
+		self.end_headers()
+		
+		if body == True:
+			with open(path, 'rb') as f:
+				f.seek(start)
+				remaining = end - start + 1
+				while remaining > 0:
+					block = f.read(min(remaining, BLOCK_SIZE))
+					self.wfile.write(block)
+					remaining -= len(block)
+
+
+def serve(directory, ranges=True):
+	'''
+	Starts serving the specified directory on an ephemeral localhost port in a background thread.
+	Returns the server and its base URL. Range support can be disabled to exercise fallback paths.
+	'''
+	server = _ThreadedServer(('127.0.0.1', 0), _RangeHandler)
+	server.directory = directory
+	server.ranges = ranges
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+'''
+Measures the startup cost of importing the ue4helpers package for common usage patterns.
+
+Each statement is executed in a fresh interpreter so that nothing is cached between runs. The
+reported time excludes the cost of starting an interpreter that imports nothing. The heavy
+third-party modules loaded by each statement are also reported, so that regressions that cause
+eager imports can be spotted even when they are cheap on the machine running the benchmark.
+
+Example usage:
+	
+	python3 benchmarks/import_time.py --output import-time.json
+	python3 benchmarks/import_time.py --output new.json --compare import-time.json
+'''
+from os.path import abspath, dirname
+import argparse, json, os, platform, statistics, subprocess, sys, time
+
+# The in-tree version of the package is used rather than any installed version
+ROOT = dirname(dirname(abspath(__file__)))
+
+# The version of the results file format (this matches the format used by run.py)
+RESULTS_SCHEMA = 1
+
+# The statements that we measure
+STATEMENTS = {
+	'import.package': 'import ue4helpers',
+	'import.GitUtils': 'from ue4helpers import GitUtils',
+	'import.PluginPackager': 'from ue4helpers import PluginPackager',
+	'import.ArchiveUtils': 'from ue4helpers import ArchiveUtils',
+	'import.DockerUtils': 'from ue4helpers import DockerUtils',
+	'import.everything': 'from ue4helpers import *'
+}
+
+# The heavy third-party modules that we track
+HEAVY_MODULES = ['boto3', 'conans', 'docker', 'google.cloud.storage', 'requests', 'zstandard']
+
+# The code executed in each child process
+CHILD_TEMPLATE = '''
+import sys, time, json
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'modules': [m for m in {modules!r} if m in sys.modules]}}))
+'''
+
+def run_child(code):
+	'''
+	Runs the specified code in a fresh interpreter and returns a tuple containing the total wall time
+	and the JSON output of the child (if any)
+	'''
+	environment = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT] + os.environ.get('PYTHONPATH', '').split(os.pathsep)), PYTHONDONTWRITEBYTECODE='1')
+	start = time.perf_counter()
+	output = subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.PIPE, env=environment).stdout
+	elapsed = time.perf_counter() - start
+	lines = output.decode('utf-8').strip().splitlines()
+	return elapsed, json.loads(lines[-1]) if len(lines) > 0 else None
+
+def main():
+	parser = argparse.ArgumentParser(description='Measures the import time of the ue4helpers package')
+	parser.add_argument('--repeat', type=int, default=10, help='the number of fresh interpreters to run for each statement')
+	parser.add_argument('--output', default=None, help='the JSON file to write the results to')
+	parser.add_argument('--compare', default=None, help='a previous results file to compare against')
+	args = parser.parse_args()
+	
+	# Measure the cost of starting an interpreter that imports nothing
+	baseline = statistics.median([run_child('pass')[0] for _ in range(args.repeat)])
+	print('Interpreter startup: {:.1f}ms'.format(baseline * 1000))
+	
+	# Measure each of our statements
+	results = []
+	for name, statement in STATEMENTS.items():
+		runs = [run_child(CHILD_TEMPLATE.format(statement=statement, modules=HEAVY_MODULES)) for _ in range(args.repeat)]
+		wall = [r[0] for r in runs]
+		inner = [r[1]['seconds'] for r in runs]
+		results.append({
+			'name': name,
+			'statement': statement,
+			'iterations': len(runs),
+			'seconds_median': statistics.median(inner),
+			'seconds_min': min(inner),
+			'seconds_max': max(inner),
+			'wall_seconds_over_baseline': statistics.median(wall) - baseline,
+			'heavy_modules': runs[0][1]['modules']
+		})
+		print('{:<24} {:>8.1f}ms   heavy modules: {}'.format(
+			name,
+			results[-1]['seconds_median'] * 1000,
+			', '.join(results[-1]['heavy_modules']) if len(results[-1]['heavy_modules']) > 0 else 'none'
+		))
+	
+	# Write the results file
+	output = {
+		'schema': RESULTS_SCHEMA,
+		'timestamp': time.time(),
+		'profile': 'import',
+		'machine': {
+			'platform': platform.platform(),
+			'python': platform.python_version(),
+			'cpus': os.cpu_count()
+		},
+		'baseline_seconds': baseline,
+		'results': results
+	}
+	if args.output is not None:
+		with open(args.output, 'w') as f:
+			json.dump(output, f, indent=4)
+	
+	# Compare against a previous results file if one was specified
+	if args.compare is not None:
+		with open(args.compare, 'r') as f:
+			previous = {r['name']: r for r in json.load(f)['results']}
+		print('\n{:<24} {:>14} {:>14} {:>9}'.format('statement', 'baseline (ms)', 'current (ms)', 'ratio'))
+		for result in results:
+			before = previous.get(result['name'])
+			print('{:<24} {:>14} {:>14.1f} {:>9}'.format(
+				result['name'],
+				'{:.1f}'.format(before['seconds_median'] * 1000) if before is not None else '-',
+				result['seconds_median'] * 1000,
+				'{:.2f}x'.format(result['seconds_median'] / before['seconds_median']) if before is not None and before['seconds_median'] > 0 else '-'
+			))
+
+if __name__ == '__main__':
+	main()
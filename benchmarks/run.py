@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+'''
+Benchmarks the filesystem, archive and container copy hot paths against synthetic distribution trees.
+
+Each benchmark is run in a separate child process so that its peak memory usage can be measured in
+isolation. Results are written as JSON and can be compared against a previous run using `--compare`.
+
+Example usage:
+	
+	python3 benchmarks/run.py --profile small --output results.json
+	python3 benchmarks/run.py --profile small --output new.json --compare results.json
+'''
+from os.path import abspath, dirname, join
+import argparse, json, os, platform, posixpath, shutil, statistics, subprocess, sys, tempfile, time
+
+# Ensure the in-tree version of the package is used rather than any installed version
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+sys.path.insert(0, dirname(abspath(__file__)))
+
+import synthetic
+
+# The version of the results file format
+RESULTS_SCHEMA = 1
+
+
+# Benchmark implementations
+#
+# Each benchmark receives the description of the synthetic tree and a scratch directory, performs
+# any untimed setup, and returns a tuple of (function to time, bytes processed, files processed).
+
+def bench_filesystem_copy(tree, scratch):
+	from ue4helpers import FilesystemUtils
+	dest = join(scratch, 'copy')
+	return (lambda: FilesystemUtils.copy(tree['path'], dest)), tree['bytes'], tree['files']
+
+def bench_filesystem_remove_matching(tree, scratch):
+	from ue4helpers import FilesystemUtils
+	dest = join(scratch, 'strip')
+	shutil.copytree(tree['path'], dest)
+	filters = ['*.pdb', '*.dsym', '*.debug', '*.sym', 'Manifest_*.txt']
+	return (lambda: FilesystemUtils.remove_matching(dest, filters)), tree['bytes'], tree['files']
+
+def _bench_remove(background):
+	def bench(tree, scratch):
+		from ue4helpers import TrashReaper
+		from ue4helpers.TrashReaper import TRASH_DIRECTORY
+		dest = join(scratch, 'remove')
+		shutil.copytree(tree['path'], dest)
+		
+		# Background removal is timed until the reaper finishes, so this measures parallel deletion throughput
+		if background == True:
+			reaper = TrashReaper()
+			def remove():
+				reaper.trash(dest)
+				reaper.wait()
+				
+				# Ensure the reaper actually deleted everything rather than leaving items in the trash
+				trash = join(scratch, TRASH_DIRECTORY)
+				leftovers = os.listdir(trash) if os.path.isdir(trash) else []
+				if os.path.lexists(dest) or len(leftovers) > 0 or len(reaper.errors()) > 0:
+					raise RuntimeError('background removal left items behind: {}'.format(leftovers + reaper.errors()))
+			return remove, tree['bytes'], tree['files']
+		else:
+			return (lambda: shutil.rmtree(dest)), tree['bytes'], tree['files']
+	return bench
+
+def _bench_compress(format):
+	def bench(tree, scratch):
+		from ue4helpers import ArchiveUtils
+		return (lambda: ArchiveUtils.compress(join(scratch, 'archive'), format, tree['path'])), tree['bytes'], tree['files']
+	return bench
+
+def _bench_extract(format):
+	def bench(tree, scratch):
+		from ue4helpers import ArchiveUtils
+		archive = ArchiveUtils.compress(join(scratch, 'archive'), format, tree['path'])
+		return (lambda: ArchiveUtils.extract(archive, join(scratch, 'extracted'))), tree['bytes'], tree['files']
+	return bench
+
+def bench_archive_merge_zip(tree, scratch):
+	from ue4helpers import ArchiveUtils
+	
+	# Merge two identical archives, so that every entry is a duplicate that must be checked
+	first = ArchiveUtils.compress(join(scratch, 'first'), 'zip', tree['path'])
+	second = ArchiveUtils.compress(join(scratch, 'second'), 'zip', tree['path'])
+	return (lambda: ArchiveUtils.merge(join(scratch, 'merged.zip'), [first, second])), tree['bytes'], tree['files']
+
+def bench_docker_build_context(tree, scratch):
+	from ue4helpers import DockerContextBuilder
+	
+	# Exclude the debug symbols, so that the ignore rules are exercised as well as the tarring
+	context = join(scratch, 'context')
+	shutil.copytree(tree['path'], context)
+	with open(join(context, '.dockerignore'), 'w') as f:
+		f.write('**/*.pdb\n**/*.debug\n')
+	cache = join(scratch, 'cache')
+	return (lambda: DockerContextBuilder(context, cache_dir=cache).context()), tree['bytes'], tree['files']
+
+def bench_docker_copy_from_host(tree, scratch):
+	from ue4helpers import DockerUtils
+	from fakedocker import FakeContainer
+	container = FakeContainer(join(scratch, 'container'))
+	return (lambda: DockerUtils.copy_from_host(container, tree['path'], '/tmp/workspace')), tree['bytes'], tree['files']
+
+def bench_docker_sync_from_host(tree, scratch):
+	from ue4helpers import DockerUtils
+	from fakedocker import FakeContainer
+	
+	# Perform an initial copy and then modify a single file, so that only the change is timed
+	container = FakeContainer(join(scratch, 'container'))
+	source = join(scratch, 'source')
+	shutil.copytree(tree['path'], source)
+	DockerUtils.copy_from_host(container, source, '/tmp/workspace', sync=True)
+	changed = sorted([join(dirpath, f) for dirpath, dirnames, filenames in os.walk(source) for f in filenames])[0]
+	with open(changed, 'ab') as f:
+		f.write(b'modified')
+	return (lambda: DockerUtils.copy_from_host(container, source, '/tmp/workspace', sync=True)), os.path.getsize(changed), 1
+
+def bench_docker_copy_to_host(tree, scratch):
+	from ue4helpers import DockerUtils
+	from fakedocker import FakeContainer
+	container = FakeContainer(join(scratch, 'container'))
+	shutil.copytree(tree['path'], container.host_path('/tmp/workspace/dist'))
+	return (lambda: DockerUtils.copy_to_host(container, '/tmp/workspace/dist', join(scratch, 'host'))), tree['bytes'], tree['files']
+
+def bench_docker_copy_matching_to_host(tree, scratch):
+	from ue4helpers import DockerUtils, FilesystemUtils
+	from fakedocker import FakeContainer
+	container = FakeContainer(join(scratch, 'container'))
+	shutil.copytree(tree['path'], container.host_path('/tmp/workspace/dist'))
+	
+	# Only the .pak files and manifests are copied, so only their sizes are counted
+	include = ['*.pak', 'Manifest_*.txt']
+	matches = [join(dirpath, f) for dirpath, dirnames, filenames in os.walk(tree['path']) for f in filenames if FilesystemUtils.matches_any(f, include)]
+	size = sum([os.path.getsize(f) for f in matches])
+	return (lambda: DockerUtils.copy_matching_to_host(container, '/tmp/workspace/dist', join(scratch, 'host'), include=include)), size, len(matches)
+
+def _bench_glob(mode):
+	def bench(tree, scratch):
+		from ue4helpers import DockerUtils
+		from fakedocker import FakeContainer
+		container = FakeContainer(join(scratch, 'container'))
+		shutil.copytree(tree['path'], container.host_path('/tmp/workspace/dist'))
+		
+		# Resolve one pattern for each directory in the tree, as a script locating build outputs would
+		directories = [os.path.relpath(dirpath, tree['path']) for dirpath, dirnames, filenames in os.walk(tree['path'])]
+		patterns = [posixpath.join('/tmp/workspace/dist', directory.replace(os.sep, '/'), '*') for directory in directories]
+		if mode == 'single':
+			return (lambda: [DockerUtils.glob(container, pattern) for pattern in patterns]), 0, tree['files']
+		elif mode == 'multiple':
+			return (lambda: DockerUtils.glob_multiple(container, patterns)), 0, tree['files']
+		else:
+			helper = DockerUtils.filesystem_helper(container)
+			return (lambda: [helper.glob(pattern) for pattern in patterns]), 0, tree['files']
+	return bench
+
+def bench_chunkstore_put(tree, scratch):
+	from ue4helpers import ChunkStore
+	store = ChunkStore(join(scratch, 'store'))
+	return (lambda: store.put('dist', tree['path'])), tree['bytes'], tree['files']
+
+def bench_chunkstore_get(tree, scratch):
+	from ue4helpers import ChunkStore
+	store = ChunkStore(join(scratch, 'store'))
+	store.put('dist', tree['path'])
+	return (lambda: store.get('dist', join(scratch, 'restored'))), tree['bytes'], tree['files']
+
+def _bench_download(segments):
+	def bench(tree, scratch):
+		from ue4helpers import ArchiveUtils, SegmentedDownloader
+		from httpserver import serve
+		
+		# Serve an uncompressed archive of the tree from a local server that supports range requests
+		archive = ArchiveUtils.compress(join(scratch, 'dist'), 'tar', tree['path'])
+		server, url = serve(scratch)
+		downloader = SegmentedDownloader(segments=segments, min_segment_size=1024 * 1024)
+		target = join(scratch, 'downloaded.tar')
+		return (lambda: downloader.download('{}/dist.tar'.format(url), target)), os.path.getsize(archive), 1
+	return bench
+
+BENCHMARKS = {
+	'filesystem.copy': bench_filesystem_copy,
+	'filesystem.remove_matching': bench_filesystem_remove_matching,
+	'filesystem.remove': _bench_remove(False),
+	'filesystem.remove.background': _bench_remove(True),
+	'archive.compress.zip': _bench_compress('zip'),
+	'archive.compress.tar': _bench_compress('tar'),
+	'archive.extract.zip': _bench_extract('zip'),
+	'archive.extract.tar': _bench_extract('tar'),
+	'archive.compress.xztar': _bench_compress('xztar'),
+	'archive.compress.zstdtar': _bench_compress('zstdtar'),
+	'archive.extract.xztar': _bench_extract('xztar'),
+	'archive.extract.zstdtar': _bench_extract('zstdtar'),
+	'archive.merge.zip': bench_archive_merge_zip,
+	'chunkstore.put': bench_chunkstore_put,
+	'chunkstore.get': bench_chunkstore_get,
+	'docker.build_context': bench_docker_build_context,
+	'docker.copy_from_host': bench_docker_copy_from_host,
+	'docker.sync_from_host': bench_docker_sync_from_host,
+	'docker.copy_to_host': bench_docker_copy_to_host,
+	'docker.copy_matching_to_host': bench_docker_copy_matching_to_host,
+	'docker.glob': _bench_glob('single'),
+	'docker.glob_multiple': _bench_glob('multiple'),
+	'docker.glob.helper': _bench_glob('helper'),
+	'download.segmented': _bench_download(8),
+	'download.single': _bench_download(1)
+}
+
+
+# Benchmark execution
+
+def peak_rss():
+	'''
+	Returns the peak resident set size of the current process in bytes, or None if it cannot be determined
+	'''
+	from ue4helpers.Instrumentation import Instrumentation
+	return Instrumentation.peak_rss()[0]
+
+def run_single(name, tree, workdir):
+	'''
+	Runs a single iteration of the specified benchmark in the current process and returns its measurements
+	'''
+	scratch = tempfile.mkdtemp(dir=workdir)
+	try:
+		function, size, files = BENCHMARKS[name](tree, scratch)
+		baseline = peak_rss()
+		start = time.perf_counter()
+		function()
+		elapsed = time.perf_counter() - start
+		peak = peak_rss()
+		return {
+			'seconds': elapsed,
+			'bytes': size,
+			'files': files,
+			'peak_rss': peak,
+			'peak_rss_delta': peak - baseline if peak is not None and baseline is not None else None
+		}
+	finally:
+		shutil.rmtree(scratch, ignore_errors=True)
+
+def run_isolated(name, tree, workdir):
+	'''
+	Runs a single iteration of the specified benchmark in a child process and returns its measurements
+	'''
+	output = subprocess.run(
+		[sys.executable, abspath(__file__), '--single', name, '--tree', json.dumps(tree), '--workdir', workdir],
+		check=True,
+		stdout=subprocess.PIPE
+	).stdout
+	return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+def summarise(name, iterations):
+	'''
+	Combines the measurements from multiple iterations of a benchmark into a single result
+	'''
+	times = [i['seconds'] for i in iterations]
+	median = statistics.median(times)
+	peaks = [i['peak_rss'] for i in iterations if i['peak_rss'] is not None]
+	return {
+		'name': name,
+		'iterations': len(iterations),
+		'seconds_median': median,
+		'seconds_min': min(times),
+		'seconds_max': max(times),
+		'bytes': iterations[0]['bytes'],
+		'files': iterations[0]['files'],
+		'throughput_mib_per_second': (iterations[0]['bytes'] / (1024 * 1024)) / median if median > 0 else None,
+		'files_per_second': iterations[0]['files'] / median if median > 0 else None,
+		'peak_rss': max(peaks) if len(peaks) > 0 else None
+	}
+
+def compare(results, baseline):
+	'''
+	Prints a comparison between the current results and a previous results file
+	'''
+	previous = {r['name']: r for r in baseline['results']}
+	print('\n{:<32} {:>12} {:>12} {:>9} {:>12}'.format('benchmark', 'baseline (s)', 'current (s)', 'ratio', 'peak RSS'))
+	for result in results['results']:
+		before = previous.get(result['name'])
+		ratio = result['seconds_median'] / before['seconds_median'] if before is not None and before['seconds_median'] > 0 else None
+		print('{:<32} {:>12} {:>12.3f} {:>9} {:>12}'.format(
+			result['name'],
+			'{:.3f}'.format(before['seconds_median']) if before is not None else '-',
+			result['seconds_median'],
+			'{:.2f}x'.format(ratio) if ratio is not None else '-',
+			'{:.1f} MiB'.format(result['peak_rss'] / (1024 * 1024)) if result['peak_rss'] is not None else '-'
+		))
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmarks the ue4helpers filesystem, archive and container copy hot paths')
+	parser.add_argument('--profile', default='small', choices=sorted(synthetic.PROFILES.keys()), help='the size of the synthetic tree to generate')
+	parser.add_argument('--workdir', default=join(tempfile.gettempdir(), 'ue4helpers-benchmarks'), help='the directory used for the synthetic tree and scratch data')
+	parser.add_argument('--repeat', type=int, default=3, help='the number of iterations to run for each benchmark')
+	parser.add_argument('--only', action='append', default=[], help='run only the benchmarks whose names start with the specified prefix')
+	parser.add_argument('--output', default=None, help='the JSON file to write the results to')
+	parser.add_argument('--compare', default=None, help='a previous results file to compare against')
+	parser.add_argument('--single', default=None, help=argparse.SUPPRESS)
+	parser.add_argument('--tree', default=None, help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	
+	# If we are running as a child process then run the requested benchmark and report the results
+	if args.single is not None:
+		print(json.dumps(run_single(args.single, json.loads(args.tree), args.workdir)))
+		return
+	
+	# Generate (or reuse) the synthetic tree for the requested profile
+	os.makedirs(args.workdir, exist_ok=True)
+	print('Preparing synthetic "{}" tree in "{}"...'.format(args.profile, args.workdir), flush=True)
+	tree = synthetic.generate(join(args.workdir, 'tree-{}'.format(args.profile)), args.profile)
+	print('Tree contains {} files ({:.1f} MiB)'.format(tree['files'], tree['bytes'] / (1024 * 1024)), flush=True)
+	
+	# Run each of the selected benchmarks
+	names = [n for n in BENCHMARKS if len(args.only) == 0 or any([n.startswith(p) for p in args.only])]
+	results = []
+	for name in names:
+		print('Running {}...'.format(name), flush=True)
+		iterations = [run_isolated(name, tree, args.workdir) for _ in range(args.repeat)]
+		results.append(summarise(name, iterations))
+		print('  {:.3f}s median, {:.1f} MiB/s'.format(results[-1]['seconds_median'], results[-1]['throughput_mib_per_second'] or 0), flush=True)
+	
+	# Write the results file
+	output = {
+		'schema': RESULTS_SCHEMA,
+		'timestamp': time.time(),
+		'profile': args.profile,
+		'tree': {'files': tree['files'], 'bytes': tree['bytes']},
+		'machine': {
+			'platform': platform.platform(),
+			'python': platform.python_version(),
+			'cpus': os.cpu_count()
+		},
+		'results': results
+	}
+	if args.output is not None:
+		with open(args.output, 'w') as f:
+			json.dump(output, f, indent=4)
+	
+	# Compare against a previous results file if one was specified
+	if args.compare is not None:
+		with open(args.compare, 'r') as f:
+			compare(output, json.load(f))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,148 @@
+'''
+Generates synthetic distribution trees that approximate the shape of packaged Unreal projects and plugins
+'''
+from os.path import exists, join
+import json, os, random, shutil
+
+# The size of the pseudo-random block that is reused when generating file contents
+BLOCK_SIZE = 1024 * 1024
+
+# The available tree profiles. Sizes are specified in bytes.
+PROFILES = {
+	
+	# A quick profile suitable for verifying that the benchmarks work
+	'smoke': {
+		'assets': 200,
+		'asset_size': (4 * 1024, 256 * 1024),
+		'paks': 1,
+		'pak_size': 32 * 1024 * 1024,
+		'binaries': 4,
+		'binary_size': 4 * 1024 * 1024,
+		'symbols': 4,
+		'symbol_size': 8 * 1024 * 1024
+	},
+	
+	# A mid-sized profile that completes in a few minutes on a typical build agent
+	'small': {
+		'assets': 2000,
+		'asset_size': (4 * 1024, 512 * 1024),
+		'paks': 2,
+		'pak_size': 256 * 1024 * 1024,
+		'binaries': 12,
+		'binary_size': 16 * 1024 * 1024,
+		'symbols': 12,
+		'symbol_size': 48 * 1024 * 1024
+	},
+	
+	# A profile that matches the size of a real-world packaged project
+	'full': {
+		'assets': 10000,
+		'asset_size': (4 * 1024, 1024 * 1024),
+		'paks': 3,
+		'pak_size': 2 * 1024 * 1024 * 1024,
+		'binaries': 40,
+		'binary_size': 32 * 1024 * 1024,
+		'symbols': 40,
+		'symbol_size': 128 * 1024 * 1024
+	}
+}
+
+# The debug symbol file extensions that we generate (these match the filters used by `PackagerBase`)
+SYMBOL_EXTENSIONS = ['.pdb', '.debug', '.sym']
+
+
+class _ContentGenerator(object):
+	'''
+	Generates deterministic file contents with a configurable degree of compressibility
+	'''
+	
+	def __init__(self, seed):
+		self._random = random.Random(seed)
+		self._block = bytes(self._random.getrandbits(8) for _ in range(BLOCK_SIZE))
+	
+	def write(self, filename, size, compressible):
+		'''
+		Writes a file of the specified size. Compressible files repeat a short pattern between random
+		runs (roughly matching uncooked assets), whereas incompressible files contain only fresh random
+		data that cannot be deduplicated by long distance matching (roughly matching compressed .pak files.)
+		'''
+		os.makedirs(os.path.dirname(filename), exist_ok=True)
+		with open(filename, 'wb') as f:
+			remaining = size
+			while remaining > 0:
+				offset = self._random.randrange(0, BLOCK_SIZE // 2)
+				length = min(remaining, BLOCK_SIZE - offset)
+				if compressible == True:
+					run = min(length, 4096)
+					chunk = self._block[offset:offset+run] + (b'\x00\x01UE4\x00' * ((length - run) // 6 + 1))[:length - run]
+				else:
+					chunk = self._random.getrandbits(length * 8).to_bytes(length, 'little')
+				f.write(chunk)
+				remaining -= len(chunk)
+	
+	def size(self, bounds):
+		'''
+		Picks a file size within the specified bounds, biased towards the lower end
+		'''
+		low, high = bounds
+		return int(low + (high - low) * (self._random.random() ** 3))
+
+
+def generate(root, profile='small', name='SyntheticProject', seed=0):
+	'''
+	Generates a synthetic distribution tree in the "dist" subdirectory of the specified root
+	directory and returns a dictionary describing its contents. If a tree with a matching
+	description already exists then it is reused rather than being regenerated.
+	'''
+	settings = PROFILES[profile]
+	marker = join(root, '.synthetic.json')
+	dist = join(root, 'dist')
+	description = {'profile': profile, 'name': name, 'seed': seed, 'settings': settings, 'path': dist}
+	
+	# Reuse an existing tree if it was generated with the same settings
+	if exists(marker):
+		with open(marker, 'r') as f:
+			existing = json.load(f)
+		if {k: existing.get(k) for k in description} == json.loads(json.dumps(description)):
+			return existing
+	
+	# Remove any tree that was generated with different settings
+	shutil.rmtree(dist, ignore_errors=True)
+	generator = _ContentGenerator(seed)
+	files = 0
+	size = 0
+	
+	def emit(relative, filesize, compressible):
+		nonlocal files, size
+		generator.write(join(dist, relative), filesize, compressible)
+		files += 1
+		size += filesize
+	
+	# Generate the small cooked asset files, spread across a nested directory structure
+	for index in range(settings['assets']):
+		directory = join(name, 'Content', 'Maps' if index % 10 == 0 else 'Assets', 'Group{:03d}'.format(index % 97))
+		extension = '.umap' if index % 10 == 0 else ('.uexp' if index % 3 == 0 else '.uasset')
+		emit(join(directory, 'Asset{:05d}{}'.format(index, extension)), generator.size(settings['asset_size']), True)
+	
+	# Generate the large .pak files
+	for index in range(settings['paks']):
+		emit(join(name, 'Content', 'Paks', '{}-pakchunk{}.pak'.format(name, index)), settings['pak_size'], False)
+	
+	# Generate the binaries and their accompanying debug symbols
+	binaries = join(name, 'Binaries', 'Win64')
+	for index in range(settings['binaries']):
+		emit(join(binaries, 'Module{:02d}.dll'.format(index)), settings['binary_size'], True)
+	for index in range(settings['symbols']):
+		extension = SYMBOL_EXTENSIONS[index % len(SYMBOL_EXTENSIONS)]
+		emit(join(binaries, 'Module{:02d}{}'.format(index, extension)), settings['symbol_size'], True)
+	
+	# Generate the manifest files
+	for index in range(2):
+		emit(join(name, 'Manifest_NonUFSFiles_{}.txt'.format(index)), 64 * 1024, True)
+	
+	# Record the description of the generated tree so that it can be reused
+	description.update({'files': files, 'bytes': size})
+	with open(marker, 'w') as f:
+		json.dump(description, f, indent=4)
+	
+	return description
@@ -25,6 +25,9 @@ setup(
 	author_email='adam@adamrehn.com',
 	license='MIT',
 	packages=['ue4helpers'],
+	entry_points = {
+		'console_scripts': ['ue4helpers=ue4helpers.__main__:main']
+	},
 	zip_safe=True,
 	python_requires = '>=3.5',
 	install_requires = [
@@ -34,6 +37,7 @@ setup(
 		'docker>=3.7.0',
 		'google-auth>=1.6.3',
 		'google-cloud-storage>=1.16.1',
+		'numpy',
 		'requests',
 		'setuptools>=38.6.0',
 		'twine>=1.11.0',
@@ -0,0 +1,44 @@
+from os.path import abspath, dirname
+import sys, tempfile, unittest
+
+# Ensure the in-tree version of the package is used rather than any installed version
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from ue4helpers import PipelineRunner
+
+def sleep(seconds):
+	'''
+	Returns a command that sleeps for the specified number of seconds
+	'''
+	return [sys.executable, '-c', 'import time; time.sleep({})'.format(seconds)]
+
+
+class TestPipelineRunner(unittest.TestCase):
+	
+	def test_critical_path_follows_resource_holder(self):
+		'''
+		A step that waited for a resource is blocked by the step that held the resource, not by an
+		unrelated step that happened to finish at around the same time
+		'''
+		pipeline = {
+			'resources': {'uat': 1},
+			'steps': {
+				'build': {'command': sleep(0.5), 'resources': {'uat': 1}},
+				'up2': {'command': sleep(0.5)},
+				'build2': {'command': sleep(0.3), 'resources': {'uat': 1}}
+			}
+		}
+		
+		with tempfile.TemporaryDirectory() as root:
+			report = PipelineRunner(pipeline, root=root, jobs=4, echo=False).run()
+		
+		steps = report['steps']
+		first = 'build' if steps['build']['started'] < steps['build2']['started'] else 'build2'
+		second = 'build2' if first == 'build' else 'build'
+		self.assertEqual(steps[second]['blocked_by'], first)
+		self.assertEqual(report['critical_path'], [first, second])
+		self.assertAlmostEqual(report['critical_path_time'], steps[first]['duration'] + steps[second]['duration'])
+
+
+if __name__ == '__main__':
+	unittest.main()
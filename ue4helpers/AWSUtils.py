@@ -1,5 +1,4 @@
 from .FilesystemUtils import FilesystemUtils
-import boto3
 
 class AWSUtils(object):
 	'''
@@ -15,6 +14,7 @@ class AWSUtils(object):
 		
 		`id` is the ID of the EC2 instance to be queried.
 		'''
+		import boto3
 		ec2 = boto3.resource('ec2')
 		return ec2.Instance(id).state['Name'] == 'running'
 	
@@ -27,6 +27,7 @@ class AWSUtils(object):
 		'''
 		
 		# Retrieve the instance handle
+		import boto3
 		ec2 = boto3.resource('ec2')
 		instance = ec2.Instance(id)
 		
@@ -50,6 +51,7 @@ class AWSUtils(object):
 		
 		`id` is the ID of the EC2 instance to be queried.
 		'''
+		import boto3
 		ec2 = boto3.resource('ec2')
 		return ec2.Instance(id).public_ip_address
 	
@@ -65,9 +67,28 @@ class AWSUtils(object):
 		`key` is the key for the data that will be downloaded.
 		`filename` is the path to the file that will receive the downloaded data.
 		'''
+		import boto3
 		s3 = boto3.resource('s3')
 		s3.Bucket(bucket).download_file(key, filename)
 	
+	@staticmethod
+	def file_exists(bucket, key):
+		'''
+		Determines if a file exists in Amazon S3.
+		
+		`bucket` is the S3 Bucket name to query.
+		`key` is the key for the data whose existence will be checked.
+		'''
+		import boto3, botocore.exceptions
+		s3 = boto3.client('s3')
+		try:
+			s3.head_object(Bucket=bucket, Key=key)
+			return True
+		except botocore.exceptions.ClientError as err:
+			if err.response.get('Error', {}).get('Code') in ['404', 'NoSuchKey', 'NotFound']:
+				return False
+			raise
+	
 	@staticmethod
 	def upload_file(bucket, key, filename):
 		'''
@@ -77,6 +98,7 @@ class AWSUtils(object):
 		`key` is the key to assign to the uploaded data.
 		`filename` is the path to the file containing the data that will be uploaded.
 		'''
+		import boto3
 		s3 = boto3.resource('s3')
 		s3.Bucket(bucket).upload_file(filename, key)
 	
@@ -89,6 +111,7 @@ class AWSUtils(object):
 		Encrypts a file using an Amazon KMS customer master key (CMK).
 		If no output filename is specified then the file is decrypted in-place.
 		'''
+		import boto3
 		kms = boto3.client('kms')
 		encrypted = kms.encrypt(KeyId=key, Plaintext=FilesystemUtils.read(filename, decode=False))
 		FilesystemUtils.write(output if output is not None else filename, encrypted['CiphertextBlob'])
@@ -99,6 +122,7 @@ class AWSUtils(object):
 		Decrypts a file containing ciphertext generated by Amazon KMS.
 		If no output filename is specified then the file is decrypted in-place.
 		'''
+		import boto3
 		kms = boto3.client('kms')
 		decrypted = kms.decrypt(CiphertextBlob=FilesystemUtils.read(filename, decode=False))
 		FilesystemUtils.write(output if output is not None else filename, decrypted['Plaintext'])
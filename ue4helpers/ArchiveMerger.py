@@ -0,0 +1,293 @@
+from os.path import basename
+import os, struct, zipfile
+
+# The size of the blocks used when copying compressed entry data
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# The policies that can be used to resolve duplicate paths
+MERGE_POLICIES = ['dedup', 'prefer', 'fail']
+
+# The largest values that can be stored in the non-Zip64 header fields
+ZIP_MAX_32 = 0xFFFFFFFF
+ZIP_MAX_16 = 0xFFFF
+
+# The header ID of the Zip64 extended information extra field
+ZIP64_EXTRA_ID = 0x0001
+
+# The general purpose flag bits that we modify when copying entries
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+
+class ArchiveMerger(object):
+	'''
+	Merges multiple .zip archives (e.g. the per-platform archives produced by `PackagerBase.archive()`)
+	into a single archive by copying the compressed data for each entry verbatim, so no data is ever
+	decompressed or recompressed and merging is limited only by I/O throughput. Archives of any size are
+	supported, and Zip64 records are written whenever they are required.
+	
+	When the same path appears in more than one archive, the duplicate is resolved using one of the
+	following policies:
+	
+	- "dedup": entries with identical contents (as determined by their CRC-32 and size) are stored once,
+	  and an error is raised if the contents differ
+	- "prefer": the entry from the highest-priority archive is stored, where the archives listed in `prefer`
+	  take priority (in the order listed) over the remaining archives (in the order they were supplied)
+	- "fail": an error is raised for any duplicate file path, even if the contents are identical
+	
+	Directory entries (whose names end with a forward slash) that appear in more than one archive are
+	never treated as conflicts, since archives created by `shutil.make_archive()` include an entry for
+	every directory and archives that are being merged will typically share top-level directories.
+	'''
+	
+	def __init__(self, policy='dedup', prefer=[]):
+		'''
+		Creates a new ArchiveMerger that uses the specified policy for duplicate paths. `prefer` specifies
+		the list of archive filenames (or basenames) that take priority when the "prefer" policy is used.
+		'''
+		if policy not in MERGE_POLICIES:
+			raise RuntimeError('unsupported merge policy "{}"'.format(policy))
+		
+		self._policy = policy
+		self._prefer = prefer
+	
+	def merge(self, output, sources):
+		'''
+		Merges the specified list of .zip archives into the output archive. Entries are written in the
+		order they appear in the source archives. Returns a dictionary containing the number of `entries`
+		written, the number of `duplicates` that were resolved, and the number of compressed `bytes` copied.
+		'''
+		
+		# Read the central directory of each source archive and select the entry to use for each path
+		selected = {}
+		order = []
+		duplicates = 0
+		priorities = self._priorities(sources)
+		for source in sources:
+			with zipfile.ZipFile(source, 'r') as archive:
+				for info in archive.infolist():
+					existing = selected.get(info.filename)
+					if existing is None:
+						selected[info.filename] = (source, info)
+						order.append(info.filename)
+					else:
+						duplicates += 1
+						selected[info.filename] = self._resolve(info.filename, existing, (source, info), priorities)
+		
+		# Copy the selected entries into the output archive
+		handles = {}
+		written = []
+		copied = 0
+		try:
+			for source in sources:
+				handles[source] = open(source, 'rb')
+			
+			with open(output, 'wb') as out:
+				
+				# Write the local header and compressed data for each entry
+				for name in order:
+					source, info = selected[name]
+					offset = out.tell()
+					self._write_local_header(out, info)
+					self._copy_data(handles[source], out, self._data_offset(handles[source], info), info.compress_size)
+					written.append((info, offset))
+					copied += info.compress_size
+				
+				# Write the central directory and the end records
+				self._write_central_directory(out, written)
+		finally:
+			for handle in handles.values():
+				handle.close()
+		
+		return {'entries': len(written), 'duplicates': duplicates, 'bytes': copied}
+	
+	
+	# "Private" methods
+	
+	def _copy_data(self, source, dest, offset, size):
+		'''
+		Copies a range of bytes from one file to another, using `os.copy_file_range()` where it is supported
+		'''
+		dest.flush()
+		remaining = size
+		if hasattr(os, 'copy_file_range'):
+			try:
+				while remaining > 0:
+					count = os.copy_file_range(source.fileno(), dest.fileno(), remaining, offset + (size - remaining))
+					if count == 0:
+						break
+					remaining -= count
+			except OSError:
+				pass
+			dest.seek(0, os.SEEK_END)
+		
+		# Copy any remaining data using regular reads and writes
+		source.seek(offset + (size - remaining))
+		while remaining > 0:
+			block = source.read(min(remaining, COPY_BLOCK_SIZE))
+			if len(block) == 0:
+				raise RuntimeError('unexpected end of archive data')
+			dest.write(block)
+			remaining -= len(block)
+	
+	def _data_offset(self, handle, info):
+		'''
+		Returns the offset of the compressed data for an entry, as determined by its local header
+		'''
+		handle.seek(info.header_offset)
+		header = handle.read(30)
+		if len(header) != 30 or header[:4] != b'PK\x03\x04':
+			raise RuntimeError('bad local header for "{}"'.format(info.filename))
+		nameLength, extraLength = struct.unpack('<HH', header[26:30])
+		return info.header_offset + 30 + nameLength + extraLength
+	
+	def _encode_name(self, info):
+		'''
+		Encodes an entry name, returning the encoded bytes and the general purpose flags to use
+		'''
+		flags = info.flag_bits & ~FLAG_DATA_DESCRIPTOR
+		try:
+			return info.filename.encode('ascii'), flags & ~FLAG_UTF8
+		except UnicodeEncodeError:
+			return info.filename.encode('utf-8'), flags | FLAG_UTF8
+	
+	def _extra_without_zip64(self, extra):
+		'''
+		Removes any Zip64 extra field from the supplied extra data, since we generate our own
+		'''
+		result = b''
+		position = 0
+		while position + 4 <= len(extra):
+			identifier, length = struct.unpack('<HH', extra[position:position + 4])
+			if identifier != ZIP64_EXTRA_ID:
+				result += extra[position:position + 4 + length]
+			position += 4 + length
+		return result
+	
+	def _priorities(self, sources):
+		'''
+		Returns a dictionary mapping each source archive to its priority (lower values take precedence)
+		'''
+		preferred = []
+		for item in self._prefer:
+			preferred.extend([s for s in sources if (s == item or basename(s) == item) and s not in preferred])
+		remaining = [s for s in sources if s not in preferred]
+		return {source: index for index, source in enumerate(preferred + remaining)}
+	
+	def _resolve(self, name, existing, candidate, priorities):
+		'''
+		Resolves a duplicate path according to our policy, returning the (source, info) tuple to use
+		'''
+		identical = existing[1].CRC == candidate[1].CRC and existing[1].file_size == candidate[1].file_size
+		if name.endswith('/'):
+			return existing
+		elif self._policy == 'fail':
+			raise RuntimeError('duplicate path "{}" found in "{}" and "{}"'.format(name, existing[0], candidate[0]))
+		elif self._policy == 'dedup':
+			if identical == False:
+				raise RuntimeError('conflicting contents for "{}" in "{}" and "{}"'.format(name, existing[0], candidate[0]))
+			return existing
+		else:
+			return candidate if priorities[candidate[0]] < priorities[existing[0]] else existing
+	
+	def _dos_datetime(self, info):
+		'''
+		Returns the MS-DOS time and date values for an entry
+		'''
+		year, month, day, hour, minute, second = info.date_time
+		return ((hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day)
+	
+	def _write_local_header(self, out, info):
+		'''
+		Writes the local header for an entry, with the sizes and CRC-32 filled in so no data descriptor is needed
+		'''
+		name, flags = self._encode_name(info)
+		extra = self._extra_without_zip64(info.extra)
+		zip64 = info.file_size >= ZIP_MAX_32 or info.compress_size >= ZIP_MAX_32
+		if zip64 == True:
+			extra = struct.pack('<HHQQ', ZIP64_EXTRA_ID, 16, info.file_size, info.compress_size) + extra
+		
+		dosTime, dosDate = self._dos_datetime(info)
+		out.write(struct.pack(
+			'<4sHHHHHIIIHH',
+			b'PK\x03\x04',
+			max(info.extract_version, 45) if zip64 == True else info.extract_version,
+			flags,
+			info.compress_type,
+			dosTime,
+			dosDate,
+			info.CRC,
+			ZIP_MAX_32 if zip64 == True else info.compress_size,
+			ZIP_MAX_32 if zip64 == True else info.file_size,
+			len(name),
+			len(extra)
+		))
+		out.write(name)
+		out.write(extra)
+	
+	def _write_central_directory(self, out, written):
+		'''
+		Writes the central directory and end of central directory records, including the Zip64 records if required
+		'''
+		start = out.tell()
+		for info, offset in written:
+			name, flags = self._encode_name(info)
+			extra = self._extra_without_zip64(info.extra)
+			comment = info.comment if info.comment is not None else b''
+			
+			# Determine which fields need to be stored in the Zip64 extra field
+			fields = []
+			if info.file_size >= ZIP_MAX_32:
+				fields.append(info.file_size)
+			if info.compress_size >= ZIP_MAX_32:
+				fields.append(info.compress_size)
+			if offset >= ZIP_MAX_32:
+				fields.append(offset)
+			if len(fields) > 0:
+				extra = struct.pack('<HH', ZIP64_EXTRA_ID, 8 * len(fields)) + struct.pack('<{}Q'.format(len(fields)), *fields) + extra
+			
+			dosTime, dosDate = self._dos_datetime(info)
+			out.write(struct.pack(
+				'<4sBBHHHHHIIIHHHHHII',
+				b'PK\x01\x02',
+				info.create_version,
+				info.create_system,
+				max(info.extract_version, 45) if len(fields) > 0 else info.extract_version,
+				flags,
+				info.compress_type,
+				dosTime,
+				dosDate,
+				info.CRC,
+				min(info.compress_size, ZIP_MAX_32),
+				min(info.file_size, ZIP_MAX_32),
+				len(name),
+				len(extra),
+				len(comment),
+				0,
+				info.internal_attr,
+				info.external_attr,
+				min(offset, ZIP_MAX_32)
+			))
+			out.write(name)
+			out.write(extra)
+			out.write(comment)
+		
+		# Write the Zip64 end of central directory record and locator if any of the values overflow
+		end = out.tell()
+		count = len(written)
+		size = end - start
+		if count >= ZIP_MAX_16 or size >= ZIP_MAX_32 or start >= ZIP_MAX_32:
+			out.write(struct.pack('<4sQHHIIQQQQ', b'PK\x06\x06', 44, 45, 45, 0, 0, count, count, size, start))
+			out.write(struct.pack('<4sIQI', b'PK\x06\x07', 0, end, 1))
+		
+		# Write the end of central directory record
+		out.write(struct.pack(
+			'<4sHHHHIIH',
+			b'PK\x05\x06',
+			0,
+			0,
+			min(count, ZIP_MAX_16),
+			min(count, ZIP_MAX_16),
+			min(size, ZIP_MAX_32),
+			min(start, ZIP_MAX_32),
+			0
+		))
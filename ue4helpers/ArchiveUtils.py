@@ -1,6 +1,37 @@
+from .ArchiveMerger import ArchiveMerger
 from .FilesystemUtils import FilesystemUtils
-from conans import tools
-import shutil
+from .SegmentedDownloader import SegmentedDownloader
+from os.path import basename, isdir, join, relpath
+import concurrent.futures, contextlib, hashlib, io, os, queue, shutil, stat, subprocess, tarfile, tempfile, threading, zipfile
+
+# The file extensions for each of the archive formats that we support
+ARCHIVE_EXTENSIONS = {
+	'zip': '.zip',
+	'tar': '.tar',
+	'gztar': '.tar.gz',
+	'bztar': '.tar.bz2',
+	'xztar': '.tar.xz',
+	'zstdtar': '.tar.zst'
+}
+
+# The `tarfile` write modes for the tar-based archive formats that are compressed by `tarfile` itself
+TAR_MODES = {
+	'tar': 'w',
+	'gztar': 'w:gz',
+	'bztar': 'w:bz2'
+}
+
+# The tar-based archive formats that are compressed using multi-threaded compressors
+MULTITHREADED_FORMATS = ['xztar', 'zstdtar']
+
+# The tar-based archive formats, all of which can be extracted in a streaming manner
+TAR_FORMATS = ['tar', 'gztar', 'bztar', 'xztar', 'zstdtar']
+
+# The size of the chunks used when streaming archive data
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# The window size (as a power of two) used for zstd long distance matching (128MiB, the largest size that zstd will decompress by default)
+ZSTD_LONG_WINDOW_LOG = 27
 
 class ArchiveUtils(object):
 	'''
@@ -8,28 +39,551 @@ class ArchiveUtils(object):
 	'''
 	
 	@staticmethod
-	def compress(base_name, format, root_dir=None, **kwargs):
+	def compress(base_name, format, root_dir=None, level=None, threads=0, long_distance=True, **kwargs):
 		'''
-		This function is simply a wrapper for `shutil.make_archive`.
+		Compresses the contents of `root_dir` into an archive and returns the archive filename.
+		
+		The "xztar" and "zstdtar" formats are compressed using multiple threads (see `compress_tree()`
+		for details of the `level`, `threads` and `long_distance` parameters.) All other formats are
+		handled by `shutil.make_archive`, to which any additional keyword arguments are passed. An
+		error is raised if any of the supplied options do not apply to the requested format.
 		'''
+		ArchiveUtils._check_options(format, level, threads, long_distance)
+		if format in MULTITHREADED_FORMATS:
+			if len(kwargs) > 0:
+				raise RuntimeError('options {} are not supported for the "{}" archive format'.format(sorted(kwargs.keys()), format))
+			source = root_dir if root_dir is not None else os.getcwd()
+			return ArchiveUtils.compress_tree(base_name, format, [(source, '')], level=level, threads=threads, long_distance=long_distance)
+		
 		return shutil.make_archive(base_name, format, root_dir, **kwargs)
 	
 	@staticmethod
-	def extract(archive, destination, remove=True):
+	def compress_tree(base_name, format, sources, exclude=[], on_exclude=None, on_include=None, level=None, threads=0, long_distance=True):
+		'''
+		Creates an archive by streaming files directly from one or more source locations, without
+		first copying them into a single directory. Returns the filename of the generated archive.
+		
+		`format` is one of the formats listed in `ARCHIVE_EXTENSIONS` and determines the file extension
+		that will be appended to `base_name`.
+		
+		`sources` is a list of `(path, arcname)` tuples, where `path` is a file or directory on the
+		filesystem and `arcname` is the path that it will be given inside the archive. Directories are
+		added recursively. If multiple sources produce the same archive path then the first one wins.
+		
+		`exclude` is a list of filename patterns (see `FilesystemUtils.matches_any()`) for files and
+		directories that should be omitted from the archive. Excluded directories are not descended into.
+		If `on_exclude` is specified then it will be called with the path of each excluded item, and if
+		`on_include` is specified then it will be called with the path of each item that is added.
+		
+		The remaining parameters only apply to the multi-threaded "xztar" and "zstdtar" formats:
+		
+		- `level` specifies the compression level (defaults to the compressor's own default level)
+		- `threads` specifies the number of compression threads (0 uses one thread per CPU core)
+		- `long_distance` specifies whether zstd long distance matching should be used, which improves
+		  the compression ratio for large archives that contain data repeated far apart (this only applies
+		  to the "zstdtar" format)
+		
+		An error is raised if a non-default value is specified for any of these parameters when using a
+		format that they do not apply to.
+		
+		The "zstdtar" format uses the `zstandard` Python package if it is installed, and otherwise uses
+		the `zstd` command-line tool. The "xztar" format uses the `xz` command-line tool if it is available,
+		and otherwise falls back to single-threaded compression using Python's `lzma` module.
+		'''
+		
+		# Verify that the requested archive format is supported
+		if format not in ARCHIVE_EXTENSIONS:
+			raise RuntimeError('unsupported archive format "{}"'.format(format))
+		ArchiveUtils._check_options(format, level, threads, long_distance)
+		
+		# Open the archive for writing
+		filename = base_name + ARCHIVE_EXTENSIONS[format]
+		with contextlib.ExitStack() as stack:
+			if format == 'zip':
+				archive = stack.enter_context(zipfile.ZipFile(filename, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True))
+				add = lambda path, arcname: archive.write(path, arcname)
+			elif format in MULTITHREADED_FORMATS:
+				output = stack.enter_context(ArchiveUtils._compressed_writer(filename, format, level, threads, long_distance))
+				archive = stack.enter_context(tarfile.open(fileobj=output, mode='w|'))
+				add = lambda path, arcname: archive.add(path, arcname, recursive=False)
+			else:
+				archive = stack.enter_context(tarfile.open(filename, TAR_MODES[format]))
+				add = lambda path, arcname: archive.add(path, arcname, recursive=False)
+			
+			# Add the entries for each of our sources
+			written = set()
+			for source, arcname in sources:
+				for path, name in ArchiveUtils._walk_entries(source, arcname, exclude, on_exclude):
+					if name not in written:
+						add(path, name)
+						written.add(name)
+						if on_include is not None:
+							on_include(path)
+		
+		return filename
+	
+	@staticmethod
+	def extract(archive, destination, remove=True, threads=0, checksum=None, segments=None):
 		'''
 		Extracts the specified archive to the specified destination directory.
 		If the archive name is a URL then it will be downloaded to a temporary
 		location and removed after extraction is complete. If the destination
 		directory already exists then it will be deleted prior to extraction,
 		unless `remove` is set to False.
+		
+		.zip archives are extracted using multiple threads, each of which decompresses
+		a subset of the archive's members into preallocated output files. Tar-based
+		archives are extracted in a streaming manner. `threads` specifies the number
+		of extraction threads (0 uses one per CPU core.)
+		
+		Tar-based archives retrieved from a URL are decompressed and extracted while the
+		download is still in progress, unless a `checksum` is specified or `segments` is
+		greater than 1. In that case (and for all other archive types) URLs are first
+		downloaded using a `SegmentedDownloader` with the specified number of concurrent
+		`segments` (or its default), and an interrupted download will be resumed the next
+		time the same URL is extracted. The download is verified against `checksum` (see
+		`SegmentedDownloader.download()` for the supported formats) or against any checksum
+		advertised by the server.
 		'''
 		
 		# Remove the destination directory if it already exists
 		if remove == True:
 			FilesystemUtils.remove(destination)
 		
-		# Extract the archive, downloading it first if it is a URL
-		if FilesystemUtils.is_uri(archive):
-			tools.get(archive, destination=destination)
-		else:
-			tools.unzip(archive, destination)
+		# Extract tar-based archives as they are streamed over the network unless a verified or segmented download was requested
+		format = ArchiveUtils.format_for(archive)
+		if FilesystemUtils.is_uri(archive) and format in TAR_FORMATS and (segments is None or segments <= 1) and checksum is None:
+			with ArchiveUtils._open_stream(archive) as stream:
+				ArchiveUtils._extract_tar(stream, format, destination, threads)
+			return
+		
+		with ArchiveUtils._local_copy(archive, checksum, segments) as filename:
+			
+			# Extract .zip archives in parallel
+			if format == 'zip':
+				ArchiveUtils._extract_zip(filename, destination, threads)
+				return
+			
+			# Extract tar-based archives as they are streamed from disk
+			if format in TAR_FORMATS:
+				with open(filename, 'rb') as stream:
+					ArchiveUtils._extract_tar(stream, format, destination, threads)
+				return
+			
+			# Fall back to Conan's extraction logic for any other archive types
+			from conans import tools
+			tools.unzip(filename, destination)
+	
+	@staticmethod
+	def merge(output, sources, policy='dedup', prefer=[]):
+		'''
+		Merges multiple .zip archives (e.g. per-platform distributions) into a single .zip archive
+		without decompressing or recompressing any data. See `ArchiveMerger` for details of the
+		`policy` and `prefer` parameters that control how duplicate paths are resolved. Returns
+		the merge statistics.
+		'''
+		return ArchiveMerger(policy, prefer).merge(output, sources)
+	
+	@staticmethod
+	def extension(format):
+		'''
+		Returns the file extension (including the leading dot) for the specified archive format
+		'''
+		if format not in ARCHIVE_EXTENSIONS:
+			raise RuntimeError('unsupported archive format "{}"'.format(format))
+		return ARCHIVE_EXTENSIONS[format]
+	
+	@staticmethod
+	def format_for(filename):
+		'''
+		Determines the archive format for the specified filename or URL based on its file extension.
+		Returns None if the file extension does not match any of the supported archive formats.
+		'''
+		path = filename.split('?')[0].lower() if FilesystemUtils.is_uri(filename) else filename.lower()
+		matches = [format for format, extension in ARCHIVE_EXTENSIONS.items() if path.endswith(extension)]
+		return max(matches, key=lambda format: len(ARCHIVE_EXTENSIONS[format])) if len(matches) > 0 else None
+	
+	
+	# "Private" methods
+	
+	@staticmethod
+	def _check_options(format, level, threads, long_distance):
+		'''
+		Raises an error if non-default values are specified for compression options that do not apply to the specified format
+		'''
+		unsupported = []
+		if format not in MULTITHREADED_FORMATS:
+			unsupported.extend([name for name, value in [('level', level), ('threads', threads)] if value not in [None, 0]])
+		if format != 'zstdtar' and long_distance != True:
+			unsupported.append('long_distance')
+		if len(unsupported) > 0:
+			raise RuntimeError('options {} are not supported for the "{}" archive format'.format(unsupported, format))
+	
+	@staticmethod
+	@contextlib.contextmanager
+	def _compressed_reader(source, format, threads=0):
+		'''
+		Context manager that wraps a binary file object containing "xztar" or "zstdtar" data and yields
+		a file object that produces the decompressed tar data
+		'''
+		
+		# Use the `zstandard` Python package if it is installed
+		zstandard = ArchiveUtils._import_zstandard() if format == 'zstdtar' else None
+		if zstandard is not None:
+			decompressor = zstandard.ZstdDecompressor(max_window_size=2**31)
+			with decompressor.stream_reader(source) as reader:
+				yield reader
+			return
+		
+		# Use the command-line tool for the format, falling back to Python's `lzma` module for xz
+		tool = 'zstd' if format == 'zstdtar' else 'xz'
+		if shutil.which(tool) is None:
+			if format == 'xztar':
+				import lzma
+				with lzma.open(source, 'rb') as reader:
+					yield reader
+				return
+			raise RuntimeError('extracting .tar.zst archives requires the `zstandard` Python package or the `zstd` command-line tool')
+		
+		command = [tool, '-d', '-c', '-q', '-T{}'.format(threads)] + (['--long={}'.format(ZSTD_LONG_WINDOW_LOG)] if tool == 'zstd' else [])
+		with ArchiveUtils._pipe_through(command, source=source) as process:
+			yield process.stdout
+	
+	@staticmethod
+	@contextlib.contextmanager
+	def _compressed_writer(filename, format, level, threads, long_distance):
+		'''
+		Context manager that yields a binary file object to which uncompressed tar data can be
+		written, compressing it to the specified file using a multi-threaded compressor
+		'''
+		
+		# Use the `zstandard` Python package if it is installed
+		zstandard = ArchiveUtils._import_zstandard() if format == 'zstdtar' else None
+		if zstandard is not None:
+			parameters = {'threads': threads if threads > 0 else -1}
+			if long_distance == True:
+				parameters.update({'enable_ldm': True, 'window_log': ZSTD_LONG_WINDOW_LOG})
+			compressor = zstandard.ZstdCompressor(compression_params=zstandard.ZstdCompressionParameters.from_level(
+				level if level is not None else 3,
+				**parameters
+			))
+			with open(filename, 'wb') as f:
+				writer = compressor.stream_writer(f)
+				yield writer
+				writer.flush(zstandard.FLUSH_FRAME)
+			return
+		
+		# Use the command-line tool for the format, falling back to Python's `lzma` module for xz
+		tool = 'zstd' if format == 'zstdtar' else 'xz'
+		if shutil.which(tool) is None:
+			if format == 'xztar':
+				import lzma
+				with lzma.open(filename, 'wb', preset=level if level is not None else 6) as writer:
+					yield writer
+				return
+			raise RuntimeError('creating .tar.zst archives requires the `zstandard` Python package or the `zstd` command-line tool')
+		
+		command = [tool, '-c', '-q', '-T{}'.format(threads)]
+		if level is not None:
+			command += (['--ultra'] if tool == 'zstd' and level > 19 else []) + ['-{}'.format(level)]
+		if tool == 'zstd' and long_distance == True:
+			command += ['--long={}'.format(ZSTD_LONG_WINDOW_LOG)]
+		with open(filename, 'wb') as f:
+			with ArchiveUtils._pipe_through(command, stdout=f) as process:
+				yield process.stdin
+	
+	@staticmethod
+	def _extract_tar(stream, format, destination, threads=0):
+		'''
+		Extracts tar data from the specified binary file object, decompressing it as required
+		'''
+		
+		# Determine how the stream needs to be decompressed
+		reader = contextlib.suppress()
+		if format in MULTITHREADED_FORMATS:
+			reader = ArchiveUtils._compressed_reader(stream, format, threads)
+		
+		# Extract the tar data in streaming mode, so that the stream never needs to be seekable
+		with reader as decompressed:
+			source = decompressed if decompressed is not None else stream
+			with tarfile.open(fileobj=source, mode='r|*') as archive:
+				if hasattr(tarfile, 'tar_filter'):
+					archive.extractall(destination, filter='tar')
+				else:
+					archive.extractall(destination)
+	
+	@staticmethod
+	def _extract_zip(filename, destination, threads=0):
+		'''
+		Extracts a .zip archive using multiple threads, each with its own handle to the archive
+		'''
+		
+		# Retrieve the list of archive members and determine the output path for each of them
+		with zipfile.ZipFile(filename, 'r') as archive:
+			members = [(member, ArchiveUtils._zip_target(destination, member.filename)) for member in archive.infolist()]
+		
+		# Create the directory structure up front so that the worker threads never race to create directories
+		os.makedirs(destination, exist_ok=True)
+		for member, target in members:
+			os.makedirs(target if member.filename.endswith('/') else os.path.dirname(target), exist_ok=True)
+		
+		# Each worker thread opens its own handle to the archive, since ZipFile objects are not safe for concurrent reads
+		local = threading.local()
+		handles = []
+		def extract_member(member, target):
+			if not hasattr(local, 'archive'):
+				local.archive = zipfile.ZipFile(filename, 'r')
+				handles.append(local.archive)
+			with local.archive.open(member, 'r') as source, open(target, 'wb') as output:
+				FilesystemUtils.preallocate(output, member.file_size)
+				shutil.copyfileobj(source, output, STREAM_CHUNK_SIZE)
+				output.truncate()
+			
+			# Preserve the executable bits for archives created under Unix-like systems
+			mode = (member.external_attr >> 16) & 0o777
+			if mode & 0o111 and os.name == 'posix':
+				os.chmod(target, stat.S_IMODE(os.stat(target).st_mode) | (mode & 0o111))
+		
+		# Extract the files in descending order of size so that the largest files don't end up at the tail
+		files = sorted([m for m in members if not m[0].filename.endswith('/')], key=lambda m: m[0].file_size, reverse=True)
+		try:
+			with concurrent.futures.ThreadPoolExecutor(max_workers=threads if threads > 0 else os.cpu_count()) as executor:
+				for future in [executor.submit(extract_member, member, target) for member, target in files]:
+					future.result()
+		finally:
+			for handle in handles:
+				handle.close()
+	
+	@staticmethod
+	def _import_zstandard():
+		'''
+		Returns the `zstandard` module if it is installed, or None otherwise
+		'''
+		try:
+			import zstandard
+			return zstandard
+		except ImportError:
+			return None
+	
+	@staticmethod
+	@contextlib.contextmanager
+	def _local_copy(archive, checksum=None, segments=None):
+		'''
+		Context manager that yields a local filename for the specified archive, downloading it
+		if it is a URL and removing the downloaded file afterwards. Downloads are placed in a
+		fixed location for each URL, so that an interrupted download can be resumed later.
+		'''
+		if FilesystemUtils.is_uri(archive) == False:
+			yield archive
+			return
+		
+		# Determine the download location for the URL
+		downloads = join(tempfile.gettempdir(), 'ue4helpers-downloads')
+		os.makedirs(downloads, exist_ok=True)
+		name = basename(archive.split('?', 1)[0].rstrip('/'))
+		filename = join(downloads, '{}-{}'.format(hashlib.sha256(archive.encode('utf-8')).hexdigest()[:16], name))
+		
+		# Download the archive and remove it once we are done with it
+		try:
+			downloader = SegmentedDownloader(segments=segments) if segments is not None else SegmentedDownloader()
+			downloader.download(archive, filename, checksum=checksum)
+			yield filename
+		finally:
+			FilesystemUtils.remove(filename)
+	
+	@staticmethod
+	@contextlib.contextmanager
+	def _open_stream(archive):
+		'''
+		Context manager that yields a binary file object for reading the specified archive. For URLs,
+		the data is read ahead by a background thread so that network I/O overlaps with decompression.
+		'''
+		if FilesystemUtils.is_uri(archive) == False:
+			with open(archive, 'rb') as f:
+				yield f
+			return
+		
+		import requests
+		with requests.get(archive, stream=True) as response:
+			response.raise_for_status()
+			response.raw.decode_content = True
+			stream = _ReadAheadStream(response.raw)
+			try:
+				yield stream
+			finally:
+				stream.close()
+	
+	@staticmethod
+	@contextlib.contextmanager
+	def _pipe_through(command, source=None, stdout=None):
+		'''
+		Context manager that runs an external compression or decompression tool and yields the process
+		handle. If `source` is specified then its contents are fed to the tool's stdin. If `stdout` is
+		not specified then the tool's output is available via the `stdout` attribute of the process.
+		'''
+		
+		# If the source is a real file then the tool can read from it directly, otherwise we feed it from a thread
+		directInput = None
+		if source is not None:
+			try:
+				source.fileno()
+				directInput = source
+			except (AttributeError, OSError, ValueError):
+				pass
+		
+		process = subprocess.Popen(
+			command,
+			stdin = directInput if directInput is not None else subprocess.PIPE,
+			stdout = stdout if stdout is not None else subprocess.PIPE
+		)
+		
+		# Feed non-file sources to the tool's stdin from a background thread
+		feeder = None
+		errors = []
+		if source is not None and directInput is None:
+			def feed():
+				try:
+					shutil.copyfileobj(source, process.stdin, 1024 * 1024)
+				except Exception as err:
+					errors.append(err)
+				finally:
+					process.stdin.close()
+			feeder = threading.Thread(target=feed, daemon=True)
+			feeder.start()
+		
+		try:
+			yield process
+			
+			# Drain any trailing output (e.g. tar padding) so that the tool is not terminated by a broken pipe
+			if stdout is None:
+				while len(process.stdout.read(1024 * 1024)) > 0:
+					pass
+			
+		except:
+			process.kill()
+			raise
+		finally:
+			
+			# Close our end of any pipes and wait for the tool to finish
+			if process.stdin is not None and feeder is None:
+				process.stdin.close()
+			if stdout is None:
+				process.stdout.close()
+			returncode = process.wait()
+			if feeder is not None:
+				feeder.join()
+		
+		# Verify that the tool completed successfully
+		if len(errors) > 0:
+			raise errors[0]
+		if returncode != 0:
+			raise RuntimeError('command {} failed with exit code {}'.format(command, returncode))
+	
+	@staticmethod
+	def _walk_entries(source, arcname, exclude, on_exclude):
+		'''
+		Generates `(path, arcname)` tuples for the specified file or directory and everything
+		beneath it, skipping any files or directories that match the exclusion patterns
+		'''
+		
+		# Determine whether the source itself is excluded
+		if FilesystemUtils.matches_any(os.path.basename(source), exclude):
+			if on_exclude is not None:
+				on_exclude(source)
+			return
+		
+		# Archive names always use forward slashes and never have a trailing slash
+		arcname = arcname.replace('\\', '/').strip('/')
+		if arcname != '' and arcname != '.':
+			yield (source, arcname)
+		
+		# Recursively walk directories, pruning excluded subdirectories as we go
+		if isdir(source) and not os.path.islink(source):
+			for dirpath, dirnames, filenames in os.walk(source):
+				prefix = relpath(dirpath, source).replace('\\', '/')
+				prefix = arcname if prefix == '.' else '/'.join([arcname, prefix]).strip('/')
+				for name in sorted(dirnames + filenames):
+					path = join(dirpath, name)
+					if FilesystemUtils.matches_any(name, exclude):
+						if on_exclude is not None:
+							on_exclude(path)
+						if name in dirnames:
+							dirnames.remove(name)
+					else:
+						yield (path, '/'.join([prefix, name]).strip('/'))
+				dirnames.sort()
+	
+	@staticmethod
+	def _zip_target(destination, name):
+		'''
+		Returns the output path for a .zip archive member, discarding any absolute
+		path components or parent directory references (as `zipfile` itself does)
+		'''
+		name = name.replace('/', os.path.sep)
+		if os.path.altsep:
+			name = name.replace(os.path.altsep, os.path.sep)
+		name = os.path.splitdrive(name)[1]
+		components = [c for c in name.split(os.path.sep) if c not in ['', os.path.curdir, os.path.pardir]]
+		return join(destination, *components)
+
+
+class _ReadAheadStream(io.RawIOBase):
+	'''
+	Wraps a binary file object and reads from it in a background thread,
+	buffering up to a fixed number of chunks ahead of the consumer
+	'''
+	
+	def __init__(self, source, chunk_size=STREAM_CHUNK_SIZE, max_chunks=16):
+		self._source = source
+		self._chunk_size = chunk_size
+		self._queue = queue.Queue(maxsize=max_chunks)
+		self._buffer = memoryview(b'')
+		self._finished = False
+		self._error = None
+		self._stopped = threading.Event()
+		self._thread = threading.Thread(target=self._read_ahead, daemon=True)
+		self._thread.start()
+	
+	def readable(self):
+		return True
+	
+	def readinto(self, b):
+		
+		# Retrieve the next chunk from the background thread if our buffer is empty
+		while len(self._buffer) == 0 and self._finished == False:
+			chunk = self._queue.get()
+			if chunk is None:
+				self._finished = True
+				if self._error is not None:
+					raise self._error
+			else:
+				self._buffer = memoryview(chunk)
+		
+		# Copy as much of the buffered data as will fit
+		count = min(len(b), len(self._buffer))
+		b[:count] = self._buffer[:count]
+		self._buffer = self._buffer[count:]
+		return count
+	
+	def close(self):
+		
+		# Signal the background thread to stop and unblock it if it is waiting on a full queue
+		self._stopped.set()
+		while self._thread.is_alive():
+			try:
+				self._queue.get(timeout=0.1)
+			except queue.Empty:
+				pass
+		super().close()
+	
+	def _read_ahead(self):
+		try:
+			while not self._stopped.is_set():
+				chunk = self._source.read(self._chunk_size)
+				if not chunk:
+					break
+				self._queue.put(chunk)
+		except Exception as err:
+			self._error = err
+		finally:
+			self._queue.put(None)
@@ -0,0 +1,187 @@
+from .FilesystemUtils import FilesystemUtils
+from os.path import dirname, exists, join
+import os, shutil, threading, uuid
+
+class ArtifactStore(object):
+	'''
+	Base class for stores that hold build artifacts (e.g. packaged distributions) keyed by an
+	identifier such as a build fingerprint. Concrete stores must implement `has()`, `fetch()`
+	and `store()`. Use `ArtifactStore.from_uri()` to create the appropriate store for a location.
+	'''
+	
+	@staticmethod
+	def from_uri(uri):
+		'''
+		Creates the appropriate artifact store for the specified location, which can be either
+		a local directory path, an Amazon S3 URI ("s3://bucket/prefix") or a Google Cloud Storage
+		URI ("gs://bucket/prefix"). If `uri` is already an `ArtifactStore` then it is returned as-is.
+		'''
+		if isinstance(uri, ArtifactStore):
+			return uri
+		
+		if uri.startswith('s3://'):
+			bucket, prefix = ArtifactStore._split_uri(uri)
+			return S3ArtifactStore(bucket, prefix)
+		elif uri.startswith('gs://'):
+			bucket, prefix = ArtifactStore._split_uri(uri)
+			return GCSArtifactStore(bucket, prefix)
+		elif FilesystemUtils.is_uri(uri):
+			raise RuntimeError('unsupported artifact store URI "{}"'.format(uri))
+		else:
+			return LocalArtifactStore(uri)
+	
+	def has(self, key):
+		'''
+		Determines if the store contains an artifact with the specified key
+		'''
+		raise NotImplementedError()
+	
+	def fetch(self, key, filename):
+		'''
+		Retrieves the artifact with the specified key and writes it to the specified file
+		'''
+		raise NotImplementedError()
+	
+	def store(self, key, filename):
+		'''
+		Stores the contents of the specified file as the artifact with the specified key
+		'''
+		raise NotImplementedError()
+	
+	
+	# "Private" methods
+	
+	@staticmethod
+	def _split_uri(uri):
+		'''
+		Splits a bucket URI into a tuple containing the bucket name and the key prefix
+		'''
+		components = uri.split('://', 1)[1].split('/', 1)
+		return (components[0], components[1].strip('/') if len(components) > 1 else '')
+
+
+class LocalArtifactStore(ArtifactStore):
+	'''
+	Stores artifacts in a directory on the local filesystem (which may be a network share)
+	'''
+	
+	def __init__(self, directory):
+		self._directory = directory
+	
+	def __repr__(self):
+		return self._directory
+	
+	def has(self, key):
+		return exists(self._path(key))
+	
+	def fetch(self, key, filename):
+		shutil.copyfile(self._path(key), filename)
+	
+	def store(self, key, filename):
+		
+		# Copy the file to a temporary location and then move it into place, so that
+		# concurrent readers never observe a partially-written artifact
+		path = self._path(key)
+		os.makedirs(dirname(path), exist_ok=True)
+		temp = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+		try:
+			shutil.copyfile(filename, temp)
+			os.replace(temp, path)
+		finally:
+			FilesystemUtils.remove(temp)
+	
+	
+	# "Private" methods
+	
+	def _path(self, key):
+		return join(self._directory, *key.split('/'))
+
+
+class S3ArtifactStore(ArtifactStore):
+	'''
+	Stores artifacts in an Amazon S3 bucket, under an optional key prefix. A single S3 client is created
+	for each store and shared by all threads, since boto3 clients (unlike its default session and its
+	resources) are thread-safe.
+	'''
+	
+	def __init__(self, bucket, prefix=''):
+		self._bucket = bucket
+		self._prefix = prefix.strip('/')
+		self._client = None
+		self._lock = threading.Lock()
+	
+	def __repr__(self):
+		return 's3://{}/{}'.format(self._bucket, self._prefix)
+	
+	def has(self, key):
+		import botocore.exceptions
+		try:
+			self._s3().head_object(Bucket=self._bucket, Key=self._key(key))
+			return True
+		except botocore.exceptions.ClientError as err:
+			if err.response.get('Error', {}).get('Code') in ['404', 'NoSuchKey', 'NotFound']:
+				return False
+			raise
+	
+	def fetch(self, key, filename):
+		self._s3().download_file(self._bucket, self._key(key), filename)
+	
+	def store(self, key, filename):
+		self._s3().upload_file(filename, self._bucket, self._key(key))
+	
+	
+	# "Private" methods
+	
+	def _key(self, key):
+		return '/'.join([self._prefix, key]) if len(self._prefix) > 0 else key
+	
+	def _s3(self):
+		'''
+		Returns the S3 client for the store, creating it from a dedicated session the first time it is needed
+		'''
+		with self._lock:
+			if self._client is None:
+				import boto3.session
+				self._client = boto3.session.Session().client('s3')
+			return self._client
+
+
+class GCSArtifactStore(ArtifactStore):
+	'''
+	Stores artifacts in a Google Cloud Storage bucket, under an optional key prefix. Each thread that
+	accesses the store creates one GCS client and reuses it for all subsequent requests.
+	'''
+	
+	def __init__(self, bucket, prefix=''):
+		self._bucket = bucket
+		self._prefix = prefix.strip('/')
+		self._local = threading.local()
+	
+	def __repr__(self):
+		return 'gs://{}/{}'.format(self._bucket, self._prefix)
+	
+	def has(self, key):
+		return self._gcs_bucket().blob(self._key(key)).exists()
+	
+	def fetch(self, key, filename):
+		self._gcs_bucket().blob(self._key(key)).download_to_filename(filename)
+	
+	def store(self, key, filename):
+		self._gcs_bucket().blob(self._key(key)).upload_from_filename(filename)
+	
+	
+	# "Private" methods
+	
+	def _gcs_bucket(self):
+		'''
+		Returns the bucket handle for the calling thread, creating its GCS client the first time it is needed
+		'''
+		bucket = getattr(self._local, 'bucket', None)
+		if bucket is None:
+			from google.cloud import storage
+			bucket = storage.Client().bucket(self._bucket)
+			self._local.bucket = bucket
+		return bucket
+	
+	def _key(self, key):
+		return '/'.join([self._prefix, key]) if len(self._prefix) > 0 else key
@@ -0,0 +1,57 @@
+from .ContentHasher import ContentHasher
+from os.path import exists
+import hashlib, json
+
+class BuildFingerprint(object):
+	'''
+	Computes a fingerprint that identifies the inputs of a build, so that the outputs of a previous
+	build with identical inputs can be reused. Each input is added as a named component, and the
+	fingerprint is derived from the digests of all of the components. The per-component digests are
+	also available, which makes it easy to determine which inputs changed between two builds.
+	'''
+	
+	def __init__(self, hasher=None):
+		'''
+		Creates a new BuildFingerprint. `hasher` specifies the `ContentHasher` used to hash file
+		contents, which can be used to enable a persistent hash index. If this is not specified then
+		a new `ContentHasher` without a persistent index will be created.
+		'''
+		self._hasher = hasher if hasher is not None else ContentHasher()
+		self._components = {}
+	
+	def add_value(self, name, value):
+		'''
+		Adds a component consisting of any JSON-serialisable value (e.g. a list of arguments)
+		'''
+		data = json.dumps(value, sort_keys=True).encode('utf-8')
+		self._components[name] = hashlib.sha256(data).hexdigest()
+	
+	def add_file(self, name, path):
+		'''
+		Adds a component consisting of the contents of a single file. A missing file is
+		treated as a distinct value rather than an error, so that its later creation is detected.
+		'''
+		self._components[name] = self._hasher.hash_file(path) if exists(path) else 'missing'
+	
+	def add_tree(self, name, path, exclude=[]):
+		'''
+		Adds a component consisting of the relative paths and contents of all of the files in the
+		specified file or directory. Files and directories whose names match any of the patterns in
+		`exclude` are skipped, as are hidden files and directories. Symbolic links are not followed.
+		'''
+		self._components[name] = self._hasher.hash_tree(path, exclude) if exists(path) else 'missing'
+	
+	def components(self):
+		'''
+		Returns a dictionary mapping the name of each component to its digest
+		'''
+		return dict(self._components)
+	
+	def hexdigest(self):
+		'''
+		Returns the fingerprint as a hexadecimal string
+		'''
+		digest = hashlib.sha256()
+		for name in sorted(self._components.keys()):
+			digest.update('{}={}\n'.format(name, self._components[name]).encode('utf-8'))
+		return digest.hexdigest()
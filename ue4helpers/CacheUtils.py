@@ -1,5 +1,6 @@
 from .FilesystemUtils import FilesystemUtils
-import os, requests
+from .SegmentedDownloader import SegmentedDownloader
+import os, shutil
 
 class CacheUtils(object):
 	'''
@@ -19,6 +20,25 @@ class CacheUtils(object):
 		
 		raise RuntimeError('none of the specified sources are available!')
 	
+	@staticmethod
+	def fetch(sources, filename, checksum=None, segments=8):
+		'''
+		Retrieves a resource from the most cost-effective available source (see `select_cheapest()`) and
+		writes it to the specified file. Remote sources are downloaded using a `SegmentedDownloader` with
+		the specified number of concurrent `segments`, which resumes interrupted downloads and verifies the
+		data against `checksum` or any checksum advertised by the server. Local sources are copied.
+		
+		Returns a dictionary containing the selected `source` and, for remote sources, the `download`
+		statistics (including the throughput of each segment.)
+		'''
+		source = CacheUtils.select_cheapest(sources)
+		if FilesystemUtils.is_uri(source):
+			stats = SegmentedDownloader(segments=segments).download(source, filename, checksum=checksum)
+			return {'source': source, 'download': stats}
+		else:
+			shutil.copyfile(source, filename)
+			return {'source': source, 'download': None}
+	
 	@staticmethod
 	def is_available(resource):
 		'''
@@ -38,6 +58,7 @@ class CacheUtils(object):
 		'''
 		Determines if the specified URI exists and is accessible
 		'''
+		import requests
 		try:
 			response = requests.head(uri, allow_redirects=True)
 			return response.status_code == 200
@@ -0,0 +1,327 @@
+from .ArtifactStore import ArtifactStore
+from .FilesystemUtils import FilesystemUtils
+from os.path import basename, dirname, isdir, join, relpath
+import concurrent.futures, hashlib, json, os, tempfile, threading
+
+# The version of the index file format
+INDEX_SCHEMA = 1
+
+# The number of bytes of input that influence each value of the rolling hash
+WINDOW_SIZE = 32
+
+# The size of the blocks read from input files when chunking them
+READ_SIZE = 8 * 1024 * 1024
+
+# The table of random values used by the gear rolling hash (derived deterministically so that all hosts agree)
+GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:4], 'little') for i in range(256)]
+
+class ChunkStore(object):
+	'''
+	Stores build artifacts (archive files or directory trees such as packaged distributions) as
+	deduplicated, content-addressed chunks in an `ArtifactStore`. Files are split into variable-size
+	chunks using content-defined chunking (FastCDC with a 32-byte gear hash), so that data shared
+	between artifacts (e.g. the same content for different platforms, or successive nightly builds)
+	is only stored and transferred once, even when it appears at different offsets.
+	
+	Each artifact is described by an index file listing the chunks for each of its files. Chunks are
+	stored under "chunks/" and indices under "indices/" in the underlying store.
+	'''
+	
+	def __init__(self, store, min_size=256 * 1024, avg_size=1024 * 1024, max_size=4 * 1024 * 1024, threads=4):
+		'''
+		Creates a new ChunkStore. `store` specifies the `ArtifactStore` (or a local directory path,
+		"s3://bucket/prefix" URI or "gs://bucket/prefix" URI) that will hold the chunks and indices.
+		
+		`min_size`, `avg_size` and `max_size` specify the minimum, target average and maximum chunk sizes in
+		bytes. The average size must be a power of two. Note that changing the chunk sizes changes the chunk
+		boundaries, so artifacts stored with different sizes will not share chunks.
+		
+		`threads` specifies the number of files that are processed concurrently, and the number of chunks
+		that are transferred concurrently.
+		'''
+		if avg_size & (avg_size - 1) != 0:
+			raise RuntimeError('the average chunk size must be a power of two')
+		if not WINDOW_SIZE <= min_size < avg_size < max_size:
+			raise RuntimeError('chunk sizes must satisfy {} <= min_size < avg_size < max_size'.format(WINDOW_SIZE))
+		
+		self._store = ArtifactStore.from_uri(store)
+		self._min_size = min_size
+		self._avg_size = avg_size
+		self._max_size = max_size
+		self._threads = threads
+		
+		# FastCDC normalised chunking uses a harder mask below the target size and an easier mask above it.
+		# The masks select the high bits of the hash, since the low bits only depend on the most recent bytes.
+		bits = avg_size.bit_length() - 1
+		self._mask_small = ((1 << (bits + 1)) - 1) << (32 - (bits + 1))
+		self._mask_large = ((1 << (bits - 1)) - 1) << (32 - (bits - 1))
+		
+		# The gear table is used to compute the hashes for whole blocks of input at once
+		import numpy
+		self._numpy = numpy
+		self._gear = numpy.array(GEAR, dtype=numpy.uint32)
+	
+	def put(self, name, path):
+		'''
+		Stores the specified file or directory as the artifact with the specified name, uploading only the
+		chunks that are not already present in the store. Returns a dictionary of statistics containing:
+		
+		- `files` and `bytes`: the number of files and bytes in the artifact
+		- `chunks` and `unique_chunks`: the number of chunks in the artifact, and the number of distinct chunks
+		- `unique_bytes`: the total size of the distinct chunks
+		- `transferred_chunks` and `transferred_bytes`: the number and total size of chunks that were uploaded
+		- `dedup_ratio`: the ratio of the artifact size to the number of bytes that were uploaded
+		'''
+		
+		# Determine the list of files in the artifact
+		if isdir(path):
+			files = []
+			for dirpath, dirnames, filenames in os.walk(path):
+				for filename in sorted(filenames):
+					files.append((join(dirpath, filename), relpath(join(dirpath, filename), path).replace(os.sep, '/')))
+		else:
+			files = [(path, basename(path))]
+		
+		# Chunk each of the files and upload any missing chunks
+		state = {'seen': {}, 'lock': threading.Lock(), 'transferred_chunks': 0, 'transferred_bytes': 0}
+		with concurrent.futures.ThreadPoolExecutor(max_workers=self._threads) as executor:
+			entries = list(executor.map(lambda f: self._put_file(f[0], f[1], state), files))
+		
+		# Upload the index for the artifact
+		index = {
+			'schema': INDEX_SCHEMA,
+			'name': name,
+			'chunking': {'algorithm': 'fastcdc-gear32', 'min_size': self._min_size, 'avg_size': self._avg_size, 'max_size': self._max_size},
+			'files': entries
+		}
+		with tempfile.TemporaryDirectory() as tempDir:
+			indexFile = join(tempDir, 'index.json')
+			with open(indexFile, 'w') as f:
+				json.dump(index, f)
+			self._store.store(self._index_key(name), indexFile)
+		
+		# Compute the statistics for the artifact
+		size = sum([entry['size'] for entry in entries])
+		return {
+			'files': len(entries),
+			'bytes': size,
+			'chunks': sum([len(entry['chunks']) for entry in entries]),
+			'unique_chunks': len(state['seen']),
+			'unique_bytes': sum(state['seen'].values()),
+			'transferred_chunks': state['transferred_chunks'],
+			'transferred_bytes': state['transferred_bytes'],
+			'dedup_ratio': size / state['transferred_bytes'] if state['transferred_bytes'] > 0 else None
+		}
+	
+	def get(self, name, destination):
+		'''
+		Rebuilds the artifact with the specified name in the specified destination directory, downloading
+		each distinct chunk only once. Each chunk is verified against its digest and then written directly
+		into every location where it occurs, so only the chunks currently being transferred are held on disk
+		in addition to the output files. Returns a dictionary of statistics containing the number of `files`
+		and `bytes` in the artifact, and the number and total size of the chunks that were downloaded
+		(`transferred_chunks` and `transferred_bytes`.)
+		'''
+		with tempfile.TemporaryDirectory() as tempDir:
+			
+			# Retrieve the index for the artifact
+			indexFile = join(tempDir, 'index.json')
+			self._store.fetch(self._index_key(name), indexFile)
+			with open(indexFile, 'r') as f:
+				index = json.load(f)
+			
+			# Create each of the output files and determine the offsets at which each distinct chunk occurs
+			chunks = {}
+			locations = {}
+			for entry in index['files']:
+				filename = join(destination, *entry['path'].split('/'))
+				os.makedirs(dirname(filename), exist_ok=True)
+				with open(filename, 'wb') as f:
+					FilesystemUtils.preallocate(f, entry['size'])
+					f.truncate(entry['size'])
+				
+				offset = 0
+				for digest, size in entry['chunks']:
+					chunks[digest] = size
+					locations.setdefault(digest, []).append((filename, offset))
+					offset += size
+			
+			# Download each of the distinct chunks and write it into the output files
+			with concurrent.futures.ThreadPoolExecutor(max_workers=self._threads) as executor:
+				list(executor.map(lambda digest: self._get_chunk(digest, join(tempDir, digest), locations[digest]), chunks.keys()))
+			
+			# Apply the permissions for each file once its contents are complete
+			for entry in index['files']:
+				os.chmod(join(destination, *entry['path'].split('/')), entry['mode'])
+		
+		return {
+			'files': len(index['files']),
+			'bytes': sum([entry['size'] for entry in index['files']]),
+			'transferred_chunks': len(chunks),
+			'transferred_bytes': sum(chunks.values())
+		}
+	
+	def has(self, name):
+		'''
+		Determines if the store contains an artifact with the specified name
+		'''
+		return self._store.has(self._index_key(name))
+	
+	def chunk_boundaries(self, data):
+		'''
+		Splits the supplied bytes into chunks and returns the list of chunk end offsets
+		'''
+		return self._cut_points(data, True)
+	
+	
+	# "Private" methods
+	
+	def _chunk_key(self, digest):
+		'''
+		Returns the store key for the chunk with the specified digest
+		'''
+		return 'chunks/{}/{}'.format(digest[:2], digest)
+	
+	def _cut_points(self, data, final):
+		'''
+		Returns the list of chunk end offsets for the supplied data. If `final` is False then the data is
+		assumed to be followed by more data, and the trailing bytes that cannot yet be chunked are left over.
+		
+		Rather than rolling the hash over the data one byte at a time, the hash for every position is computed
+		at once using NumPy. The hash at each position is the sum of the gear values of the preceding window
+		of bytes, each shifted by its distance from the position, which is exactly what the rolling hash computes.
+		'''
+		numpy = self._numpy
+		if len(data) == 0:
+			return []
+		
+		# Compute the hash for every position in the data, doubling the number of bytes covered by each
+		# partial sum at every step so that only log2(WINDOW_SIZE) passes over the data are required
+		hashes = self._gear[numpy.frombuffer(data, dtype=numpy.uint8)]
+		shifted = numpy.empty_like(hashes)
+		distance = 1
+		while distance < WINDOW_SIZE:
+			numpy.left_shift(hashes[:-distance], distance, out=shifted[:-distance])
+			hashes[distance:] += shifted[:-distance]
+			distance *= 2
+		
+		# Identify the positions where each of our masks matches
+		small = numpy.flatnonzero((hashes & numpy.uint32(self._mask_small)) == 0)
+		large = numpy.flatnonzero((hashes & numpy.uint32(self._mask_large)) == 0)
+		
+		# Select the first position matching the harder mask below the target size, or failing that the first
+		# position matching the easier mask above it, cutting at the maximum size if neither mask matches
+		cuts = []
+		start = 0
+		length = len(data)
+		while start < length:
+			remaining = length - start
+			if remaining < self._max_size and final == False:
+				break
+			if remaining <= self._min_size:
+				cuts.append(length)
+				break
+			
+			limit = start + min(remaining, self._max_size)
+			normal = start + min(self._avg_size, remaining)
+			cut = limit
+			candidate = numpy.searchsorted(small, start + self._min_size)
+			if candidate < len(small) and small[candidate] < normal:
+				cut = int(small[candidate]) + 1
+			else:
+				candidate = numpy.searchsorted(large, normal)
+				if candidate < len(large) and large[candidate] < limit:
+					cut = int(large[candidate]) + 1
+			
+			cuts.append(cut)
+			start = cut
+		
+		return cuts
+	
+	def _fetch_chunk(self, digest, filename):
+		'''
+		Downloads the chunk with the specified digest, verifies its contents and returns them
+		'''
+		self._store.fetch(self._chunk_key(digest), filename)
+		with open(filename, 'rb') as f:
+			data = f.read()
+		if hashlib.sha256(data).hexdigest() != digest:
+			raise RuntimeError('chunk "{}" is corrupt'.format(digest))
+		return data
+	
+	def _get_chunk(self, digest, filename, locations):
+		'''
+		Downloads the chunk with the specified digest and writes it into each of the specified (file, offset)
+		locations, removing the downloaded copy once it has been written
+		'''
+		try:
+			data = self._fetch_chunk(digest, filename)
+		finally:
+			FilesystemUtils.remove(filename)
+		
+		for path, offset in locations:
+			with open(path, 'r+b') as f:
+				f.seek(offset)
+				f.write(data)
+	
+	def _index_key(self, name):
+		'''
+		Returns the store key for the index of the artifact with the specified name
+		'''
+		return 'indices/{}.json'.format(name)
+	
+	def _put_chunk(self, data, state):
+		'''
+		Uploads a chunk if it is not already present in the store, and returns its digest
+		'''
+		digest = hashlib.sha256(data).hexdigest()
+		
+		# Only the first occurrence of each chunk within the artifact needs to be checked
+		with state['lock']:
+			if digest in state['seen']:
+				return digest
+			state['seen'][digest] = len(data)
+		
+		# Upload the chunk if the store does not already contain it
+		key = self._chunk_key(digest)
+		if self._store.has(key) == False:
+			with tempfile.TemporaryDirectory() as tempDir:
+				chunkFile = join(tempDir, digest)
+				with open(chunkFile, 'wb') as f:
+					f.write(data)
+				self._store.store(key, chunkFile)
+			with state['lock']:
+				state['transferred_chunks'] += 1
+				state['transferred_bytes'] += len(data)
+		
+		return digest
+	
+	def _put_file(self, path, name, state):
+		'''
+		Chunks a file and uploads any missing chunks, returning the index entry for the file
+		'''
+		chunks = []
+		size = os.path.getsize(path)
+		with open(path, 'rb') as f:
+			
+			# Files no larger than the maximum chunk size are stored as a single chunk without hashing
+			if size <= self._max_size:
+				data = f.read()
+				if len(data) > 0:
+					chunks.append([self._put_chunk(data, state), len(data)])
+			
+			# Larger files are read in blocks, carrying over any trailing bytes that cannot yet be chunked
+			else:
+				buffer = b''
+				finished = False
+				while finished == False:
+					block = f.read(READ_SIZE)
+					finished = len(block) == 0
+					buffer = buffer + block
+					start = 0
+					for cut in self._cut_points(buffer, finished):
+						chunks.append([self._put_chunk(buffer[start:cut], state), cut - start])
+						start = cut
+					buffer = buffer[start:]
+		
+		return {'path': name, 'size': sum([c[1] for c in chunks]), 'mode': os.stat(path).st_mode & 0o777, 'chunks': chunks}
@@ -1,7 +1,6 @@
 from .FilesystemUtils import FilesystemUtils
 from .SubprocessUtils import SubprocessUtils
 import json, subprocess, tempfile
-from conans import tools
 from os.path import join
 
 # The template contents for generated conanfile.txt files
@@ -25,6 +24,8 @@ class ConanUtils(object):
 		The destination directory will be removed if it already exists.
 		'''
 		
+		from conans import tools
+		
 		# Create an auto-deleting temporary directory to hold our generated files
 		with tempfile.TemporaryDirectory() as tempDir:
 			
@@ -0,0 +1,195 @@
+from .FilesystemUtils import FilesystemUtils
+from os.path import abspath, dirname, exists, isdir, join, relpath
+import concurrent.futures, hashlib, json, os, threading, time, uuid
+
+# The names of the generated directories that are typically excluded when hashing Unreal project and plugin trees
+GENERATED_DIRECTORIES = ['Binaries', 'DerivedDataCache', 'Intermediate', 'Saved', 'dist']
+
+# The location of the persistent index used when hashing Unreal project and plugin trees, relative to the root directory
+HASH_INDEX = join('Saved', 'ue4helpers', 'content-hash-index.json')
+
+# The hash algorithm used for digests that must be reproducible regardless of the Python version, such as
+# version strings and build fingerprints (BLAKE2b is faster, but is unavailable under Python 3.5)
+STABLE_ALGORITHM = 'sha256'
+
+# The size of the blocks read when hashing file contents
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# The version of the index file format
+INDEX_SCHEMA = 1
+
+# Files modified more recently than this (in seconds) are not added to the index, since a subsequent
+# modification within the resolution of the filesystem timestamps would not change their mtime
+INDEX_RACY_WINDOW = 2.0
+
+class ContentHasher(object):
+	'''
+	Hashes the contents of files and directory trees in parallel, using BLAKE2b by default where it
+	is available (Python 3.6 and newer) and SHA-256 otherwise. Digests can be recorded in a
+	persistent index keyed by path, size and modification time, so that re-hashing a large tree
+	after a small edit only reads the files that have actually changed.
+	'''
+	
+	def __init__(self, index=None, threads=0, algorithm=None):
+		'''
+		Creates a new ContentHasher. `index` specifies the path to the JSON file used to persist file
+		digests between runs (defaults to no persistent index). `threads` specifies the number of files
+		to hash concurrently (defaults to the number of CPU cores.) `algorithm` specifies the name of the
+		`hashlib` algorithm to use, and should be set to `STABLE_ALGORITHM` when digests are compared
+		across machines that may be running different versions of Python.
+		'''
+		self._index_file = index
+		self._threads = threads if threads > 0 else (os.cpu_count() or 1)
+		self._algorithm = algorithm if algorithm is not None else ('blake2b' if hasattr(hashlib, 'blake2b') else 'sha256')
+		self._lock = threading.Lock()
+		self._entries = self._load_index()
+		self._dirty = False
+		self._hashed = 0
+		self._reused = 0
+	
+	def algorithm(self):
+		'''
+		Returns the name of the hash algorithm used for all digests
+		'''
+		return self._algorithm
+	
+	def hash_file(self, path):
+		'''
+		Returns the digest of the contents of a single file
+		'''
+		return self._digest_file(abspath(path))
+	
+	def hash_files(self, paths):
+		'''
+		Returns a dictionary mapping each of the specified file paths to the digest of its contents
+		'''
+		paths = list(paths)
+		with concurrent.futures.ThreadPoolExecutor(max_workers=self._threads) as executor:
+			digests = list(executor.map(self._digest_file, [abspath(path) for path in paths]))
+		return dict(zip(paths, digests))
+	
+	def hash_tree(self, path, exclude=[]):
+		'''
+		Returns the digest of the relative paths and contents of all of the files in the specified file
+		or directory. Files and directories whose names match any of the patterns in `exclude` are skipped,
+		as are hidden files and directories. Symbolic links are not followed.
+		'''
+		digests = self.tree_digests(path, exclude)
+		digest = self._new_hash()
+		for relative in sorted(digests.keys()):
+			digest.update(relative.encode('utf-8') + b'\0' + digests[relative].encode('utf-8') + b'\n')
+		return digest.hexdigest()
+	
+	def tree_digests(self, path, exclude=[]):
+		'''
+		Returns a dictionary mapping the relative path of each file in the specified file or directory
+		(using forward slashes as separators) to the digest of its contents. The exclusion rules are the
+		same as for `hash_tree()`.
+		'''
+		files = ContentHasher.walk(path, exclude)
+		digests = self.hash_files(files)
+		root = path if isdir(path) else dirname(path)
+		return {relpath(f, root).replace(os.sep, '/'): digests[f] for f in files}
+	
+	def save(self):
+		'''
+		Writes the persistent index to disk, if one was specified and it has changed.
+		Entries for files that no longer exist are discarded.
+		'''
+		with self._lock:
+			if self._index_file is None or self._dirty == False:
+				return
+			entries = {path: entry for path, entry in self._entries.items() if exists(path)}
+			data = {'schema': INDEX_SCHEMA, 'algorithm': self._algorithm, 'entries': entries}
+			self._dirty = False
+		
+		# Write to a temporary file and then move it into place so that an interrupted write never corrupts the index
+		os.makedirs(dirname(abspath(self._index_file)), exist_ok=True)
+		temp = '{}.{}.tmp'.format(self._index_file, uuid.uuid4().hex)
+		try:
+			with open(temp, 'w') as f:
+				json.dump(data, f)
+			os.replace(temp, self._index_file)
+		finally:
+			FilesystemUtils.remove(temp)
+	
+	def stats(self):
+		'''
+		Returns a dictionary containing the number of files that were hashed and the number
+		of files whose digests were reused from the persistent index
+		'''
+		with self._lock:
+			return {'hashed': self._hashed, 'reused': self._reused}
+	
+	@staticmethod
+	def walk(path, exclude=[]):
+		'''
+		Returns the sorted list of files in the specified file or directory, skipping hidden files and
+		directories and any files or directories whose names match any of the patterns in `exclude`
+		'''
+		if not exists(path):
+			return []
+		elif not isdir(path):
+			return [path]
+		
+		files = []
+		for dirpath, dirnames, filenames in os.walk(path):
+			dirnames[:] = sorted([d for d in dirnames if not d.startswith('.') and not FilesystemUtils.matches_any(d, exclude)])
+			for filename in sorted(filenames):
+				if not filename.startswith('.') and not FilesystemUtils.matches_any(filename, exclude):
+					files.append(join(dirpath, filename))
+		
+		return files
+	
+	
+	# "Private" methods
+	
+	def _digest_file(self, path):
+		'''
+		Returns the digest of a file, reusing the indexed digest if the file's size and mtime are unchanged
+		'''
+		details = os.stat(path)
+		with self._lock:
+			entry = self._entries.get(path)
+			if entry is not None and entry['size'] == details.st_size and entry['mtime_ns'] == details.st_mtime_ns:
+				self._reused += 1
+				return entry['digest']
+		
+		# Hash the contents of the file
+		digest = self._new_hash()
+		with open(path, 'rb') as f:
+			for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+				digest.update(block)
+		digest = digest.hexdigest()
+		
+		# Record the digest in the index, unless the file was modified too recently for its mtime to be trusted
+		with self._lock:
+			self._hashed += 1
+			if self._index_file is not None and time.time() - (details.st_mtime_ns / 1e9) > INDEX_RACY_WINDOW:
+				self._entries[path] = {'size': details.st_size, 'mtime_ns': details.st_mtime_ns, 'digest': digest}
+				self._dirty = True
+		
+		return digest
+	
+	def _load_index(self):
+		'''
+		Loads the persistent index, discarding it if it is missing, unreadable or uses a different algorithm
+		'''
+		if self._index_file is None or not exists(self._index_file):
+			return {}
+		
+		try:
+			with open(self._index_file, 'r') as f:
+				data = json.load(f)
+			if data.get('schema') == INDEX_SCHEMA and data.get('algorithm') == self._algorithm:
+				return data['entries']
+		except (OSError, ValueError, KeyError):
+			pass
+		
+		return {}
+	
+	def _new_hash(self):
+		'''
+		Creates a new hash object for our hash algorithm
+		'''
+		return hashlib.new(self._algorithm)
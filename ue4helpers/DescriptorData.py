@@ -1,5 +1,5 @@
+from .FilesystemUtils import FilesystemUtils
 from os.path import basename, join, splitext
-from conans import tools
 from glob import glob
 import json
 
@@ -25,9 +25,9 @@ class DescriptorData(object):
 				directory
 			))
 		
-		# Parse the descriptor JSON data
+		# Parse the descriptor JSON data (which may include a UTF-8 byte order mark)
 		descriptor = descriptors[0]
-		data = json.loads(tools.load(descriptor))
+		data = json.loads(FilesystemUtils.read(descriptor, decode=False).decode('utf-8-sig'))
 		
 		# Inject the descriptor's name into the parsed data
 		data['Name'] = splitext(basename(descriptor))[0]
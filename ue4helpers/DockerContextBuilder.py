@@ -0,0 +1,327 @@
+from .ContentHasher import ContentHasher
+from .FilesystemUtils import FilesystemUtils
+from os.path import abspath, exists, isabs, join, relpath, splitdrive
+import hashlib, io, json, os, re, stat, tarfile, uuid
+
+# The image label used to record the hash of the build context and options that an image was built from
+BUILD_HASH_LABEL = 'ue4helpers.build-hash'
+
+# The number of cached context tarballs that are retained in the cache directory
+CONTEXT_CACHE_LIMIT = 4
+
+# The build options that affect the resulting image (other than the context itself)
+HASHED_OPTIONS = ['buildargs', 'container_limits', 'extra_hosts', 'isolation', 'labels', 'network_mode', 'platform', 'shmsize', 'squash', 'target']
+
+class DockerContextBuilder(object):
+	'''
+	Generates the build context tarball for a Docker build from a local directory, honouring the directory's
+	.dockerignore file using the same rules as the Docker SDK for Python (so the generated context is identical
+	to the one the SDK would send.) The ignore rules are compiled once and the directory walk skips excluded
+	subdirectories entirely wherever no exception rule could re-include anything inside them.
+	
+	The context is identified by a manifest hash computed from the path, type, permissions and contents of
+	every file it includes (file contents are hashed via a `ContentHasher` with a persistent index, so only
+	modified files are read.) Generated tarballs are cached by their manifest hash, so an unchanged context
+	is resent from the cache without being regenerated, and the manifest hash can be combined with the build
+	options to determine whether an image has already been built from an identical context.
+	'''
+	
+	def __init__(self, path, dockerfile=None, cache_dir=None):
+		'''
+		Creates a new DockerContextBuilder for the specified context directory. `dockerfile` specifies the path
+		of the Dockerfile (relative to the context directory, or absolute), and defaults to "Dockerfile" in the
+		context directory. A Dockerfile outside of the context directory is added to the context under a
+		generated name. `cache_dir` specifies the directory used to cache context tarballs and the file hash
+		index, and defaults to a directory named ".ue4helpers-context-cache" in the user's home directory.
+		'''
+		self._root = abspath(path)
+		self._cache_dir = cache_dir if cache_dir is not None else join(os.path.expanduser('~'), '.ue4helpers-context-cache')
+		self._hasher = ContentHasher(index=join(self._cache_dir, 'content-hash-index.json'))
+		self._rules = self._compile_rules(self._read_dockerignore())
+		self._manifest = None
+		
+		# Determine the name of the Dockerfile within the context, reading its contents if it lives outside of the context
+		self._extra_files = []
+		self._dockerfile = dockerfile
+		if dockerfile is not None:
+			absolute = dockerfile if isabs(dockerfile) else join(self._root, dockerfile)
+			if splitdrive(absolute)[0] != splitdrive(self._root)[0] or relpath(absolute, self._root).startswith('..'):
+				contents = FilesystemUtils.read(absolute)
+				self._dockerfile = '.dockerfile.{}'.format(hashlib.sha256(contents.encode('utf-8')).hexdigest()[:40])
+				self._extra_files = [
+					('.dockerignore', '\n'.join((self._read_dockerignore() or ['.dockerignore']) + [self._dockerfile])),
+					(self._dockerfile, contents)
+				]
+			elif dockerfile == absolute:
+				self._dockerfile = relpath(absolute, self._root)
+		
+		# The Dockerfile and the .dockerignore file are always included in the context
+		self._rules += self._compile_rules(['!' + (self._dockerfile if self._dockerfile is not None else 'Dockerfile'), '!.dockerignore'])
+	
+	def dockerfile(self):
+		'''
+		Returns the name of the Dockerfile within the context, for use as the `dockerfile` build option
+		'''
+		return self._dockerfile
+	
+	def files(self):
+		'''
+		Returns the sorted list of relative paths (files, directories and symbolic links) included in the context
+		'''
+		extra = set([name for name, contents in self._extra_files])
+		return sorted([path for path in self._walk(self._root, '') if path not in extra])
+	
+	def manifest_hash(self):
+		'''
+		Returns the hash of the manifest of the context, which identifies the context's contents
+		'''
+		return self._build_manifest()['hash']
+	
+	def build_hash(self, options={}):
+		'''
+		Returns the hash of the context combined with the build options that affect the resulting image
+		'''
+		relevant = {key: options[key] for key in HASHED_OPTIONS if options.get(key) is not None}
+		relevant['dockerfile'] = self._dockerfile
+		data = json.dumps({'context': self.manifest_hash(), 'options': relevant}, sort_keys=True)
+		return hashlib.sha256(data.encode('utf-8')).hexdigest()
+	
+	def context(self):
+		'''
+		Returns the path to the context tarball, generating it if it is not already cached
+		'''
+		manifest = self._build_manifest()
+		contexts = join(self._cache_dir, 'contexts')
+		tarball = join(contexts, '{}.tar'.format(manifest['hash']))
+		if exists(tarball):
+			os.utime(tarball)
+			return tarball
+		
+		# Generate the tarball in a temporary file and then move it into place, so that an interrupted write never poisons the cache
+		os.makedirs(contexts, exist_ok=True)
+		temp = '{}.{}.tmp'.format(tarball, uuid.uuid4().hex)
+		try:
+			with open(temp, 'wb') as f:
+				self._write_tar(f, manifest['files'])
+			os.replace(temp, tarball)
+		finally:
+			FilesystemUtils.remove(temp)
+		
+		self._prune(contexts)
+		return tarball
+	
+	def find_image(self, client, build_hash, tag=None):
+		'''
+		Returns the ID of an existing image that was built with the specified build hash (see `build_hash()`),
+		or None if there is no such image. If `tag` is specified and the image does not already have the tag
+		then the tag is applied to the image.
+		'''
+		images = client.images.list(filters={'label': '{}={}'.format(BUILD_HASH_LABEL, build_hash)})
+		if len(images) == 0:
+			return None
+		
+		image = images[0]
+		if tag is not None:
+			qualified = tag if ':' in tag.split('/')[-1] else '{}:latest'.format(tag)
+			if qualified not in image.tags:
+				repository, version = qualified.rsplit(':', 1)
+				image.tag(repository, version)
+		
+		return image.id
+	
+	
+	# "Private" methods
+	
+	def _build_manifest(self):
+		'''
+		Walks the context and computes its manifest, caching the result for the lifetime of the builder
+		'''
+		if self._manifest is not None:
+			return self._manifest
+		
+		# Hash the contents of all of the regular files in parallel
+		files = self.files()
+		details = {path: os.lstat(join(self._root, path)) for path in files}
+		regular = [path for path in files if stat.S_ISREG(details[path].st_mode)]
+		digests = self._hasher.hash_files([join(self._root, path) for path in regular])
+		self._hasher.save()
+		
+		# Record the path, type, permissions and contents of each entry
+		lines = []
+		for path in files:
+			mode = details[path].st_mode
+			if stat.S_ISREG(mode):
+				contents = digests[join(self._root, path)]
+			elif stat.S_ISLNK(mode):
+				contents = os.readlink(join(self._root, path))
+			else:
+				contents = ''
+			lines.append(json.dumps([path.replace(os.sep, '/'), stat.S_IFMT(mode), stat.S_IMODE(mode), contents]))
+		for name, contents in self._extra_files:
+			lines.append(json.dumps([name, 'extra', hashlib.sha256(contents.encode('utf-8')).hexdigest()]))
+		
+		digest = hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()
+		self._manifest = {'hash': digest, 'files': files}
+		return self._manifest
+	
+	def _compile_rules(self, patterns):
+		'''
+		Compiles .dockerignore patterns into rules, normalising them in the same way as the Docker SDK
+		'''
+		rules = []
+		for pattern in patterns:
+			exclusion = pattern.startswith('!')
+			dirs = self._normalise(pattern[1:] if exclusion == True else pattern)
+			if len(dirs) > 0:
+				cleaned = '/'.join(dirs)
+				rules.append({
+					'pattern': pattern,
+					'exclusion': exclusion,
+					'dirs': len(dirs),
+					'cleaned': cleaned,
+					'regex': re.compile(self._translate(cleaned.lower()))
+				})
+		return rules
+	
+	def _matches(self, path):
+		'''
+		Determines whether the specified relative path (using forward slashes) is excluded from the context.
+		As with the Docker SDK, matching is case-insensitive, a pattern matching any parent directory of a path
+		also matches the path itself, and the last matching rule determines the result.
+		'''
+		lowered = path.lower()
+		parents = lowered.split('/')[:-1]
+		for rule in reversed(self._rules):
+			if rule['regex'].match(lowered) is not None:
+				return rule['exclusion'] == False
+			if len(parents) > 0 and rule['dirs'] <= len(parents) and rule['regex'].match('/'.join(parents[:rule['dirs']])) is not None:
+				return rule['exclusion'] == False
+		return False
+	
+	def _normalise(self, pattern):
+		'''
+		Splits a pattern into its path components, removing "." components and resolving ".." components
+		'''
+		components = [c for c in re.split(r'/|\\' if os.name == 'nt' else r'/', pattern.strip()) if c != '' and c != '.']
+		index = 0
+		while index < len(components):
+			if components[index] == '..':
+				del components[index]
+				if index > 0:
+					del components[index - 1]
+					index -= 1
+			else:
+				index += 1
+		return components
+	
+	def _prune(self, contexts):
+		'''
+		Removes all but the most recently used context tarballs from the cache
+		'''
+		tarballs = sorted(
+			[join(contexts, f) for f in os.listdir(contexts) if f.endswith('.tar')],
+			key = lambda f: os.stat(f).st_mtime,
+			reverse = True
+		)
+		for tarball in tarballs[CONTEXT_CACHE_LIMIT:]:
+			FilesystemUtils.remove(tarball)
+	
+	def _read_dockerignore(self):
+		'''
+		Reads the patterns from the context's .dockerignore file, ignoring blank lines and comments
+		'''
+		dockerignore = join(self._root, '.dockerignore')
+		if not exists(dockerignore):
+			return []
+		
+		lines = [line.strip() for line in FilesystemUtils.read(dockerignore).splitlines()]
+		return [line for line in lines if line != '' and line[0] != '#']
+	
+	def _translate(self, pattern):
+		'''
+		Translates a .dockerignore pattern into a regular expression, where "*" and "?" do not match
+		slashes and "**" matches any number of directories
+		'''
+		index, length = 0, len(pattern)
+		result = '^'
+		while index < length:
+			c = pattern[index]
+			index += 1
+			if c == '*':
+				if index < length and pattern[index] == '*':
+					index += 1
+					if index < length and pattern[index] == '/':
+						index += 1
+					result += '.*' if index >= length else '(.*/)?'
+				else:
+					result += '[^/]*'
+			elif c == '?':
+				result += '[^/]'
+			elif c == '[':
+				end = index
+				if end < length and pattern[end] == '!':
+					end += 1
+				if end < length and pattern[end] == ']':
+					end += 1
+				while end < length and pattern[end] != ']':
+					end += 1
+				if end >= length:
+					result += '\\['
+				else:
+					contents = pattern[index:end].replace('\\', '\\\\')
+					index = end + 1
+					if contents[0] == '!':
+						contents = '^' + contents[1:]
+					elif contents[0] == '^':
+						contents = '\\' + contents
+					result += '[{}]'.format(contents)
+			else:
+				result += re.escape(c)
+		return result + '$'
+	
+	def _walk(self, directory, prefix):
+		'''
+		Yields the relative paths of the entries in the specified directory that are included in the context,
+		descending into excluded directories only if an exception rule could re-include something inside them
+		'''
+		for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+			path = prefix + entry.name
+			excluded = self._matches(path)
+			if excluded == False:
+				yield path.replace('/', os.sep)
+			
+			if entry.is_dir(follow_symlinks=False) == False:
+				continue
+			if excluded == True and not any([rule['exclusion'] == True and rule['cleaned'].startswith(path) for rule in self._rules]):
+				continue
+			
+			for child in self._walk(entry.path, path + '/'):
+				yield child
+	
+	def _write_tar(self, f, files):
+		'''
+		Writes the context tarball for the specified list of relative paths, followed by any extra files
+		'''
+		with tarfile.open(mode='w', fileobj=f) as archive:
+			for path in files:
+				info = archive.gettarinfo(join(self._root, path), arcname=path.replace(os.sep, '/'))
+				if info is None:
+					continue
+				
+				# Work around https://bugs.python.org/issue32713 and mark everything as executable under Windows, as the Docker SDK does
+				if info.mtime < 0 or info.mtime > 8**11 - 1:
+					info.mtime = int(info.mtime)
+				if os.name == 'nt':
+					info.mode = info.mode & 0o755 | 0o111
+				
+				if info.isfile():
+					with open(join(self._root, path), 'rb') as source:
+						archive.addfile(info, source)
+				else:
+					archive.addfile(info, None)
+			
+			for name, contents in self._extra_files:
+				encoded = contents.encode('utf-8')
+				info = tarfile.TarInfo(name)
+				info.size = len(encoded)
+				archive.addfile(info, io.BytesIO(encoded))
@@ -0,0 +1,211 @@
+import json, struct, threading
+
+# The Python functions shared by the one-shot globbing script run by `DockerUtils.glob_multiple()` and the
+# long-lived helper script. `glob_details()` resolves a list of patterns and returns a list containing the
+# matches for each pattern in turn, along with their sizes, modification times and types.
+GLOB_FUNCTIONS = '''
+import glob, json, os, stat, sys
+def path_details(path):
+	try:
+		info = os.stat(path)
+	except OSError:
+		info = os.lstat(path)
+	return {"path": path, "size": info.st_size, "mtime": int(info.st_mtime), "directory": stat.S_ISDIR(info.st_mode)}
+def glob_details(patterns, recursive):
+	results = []
+	for pattern in patterns:
+		entries = []
+		for path in glob.glob(pattern, recursive=recursive):
+			try:
+				entries.append(path_details(path))
+			except OSError:
+				pass
+		results.append(entries)
+	return results
+def stat_details(paths):
+	results = []
+	for path in paths:
+		try:
+			results.append(path_details(path))
+		except OSError:
+			results.append(None)
+	return results
+'''
+
+# The Python script run inside containers by `DockerFilesystemHelper`. Each line of stdin holds a JSON request
+# and each response is written to stdout as a single line of JSON. The script exits when stdin is closed or
+# a null request is received.
+HELPER_SCRIPT = GLOB_FUNCTIONS + '''
+while True:
+	line = sys.stdin.readline()
+	request = json.loads(line) if line.strip() != "" else None
+	if request is None:
+		break
+	try:
+		if request["op"] == "glob":
+			response = {"result": glob_details(request["patterns"], request["recursive"])}
+		elif request["op"] == "stat":
+			response = {"result": stat_details(request["paths"])}
+		else:
+			response = {"error": "unknown operation " + json.dumps(request["op"])}
+	except Exception as err:
+		response = {"error": repr(err)}
+	sys.stdout.write(json.dumps(response) + "\\n")
+	sys.stdout.flush()
+'''
+
+# The stream identifiers used in the headers of multiplexed Docker exec output frames
+STREAM_STDOUT = 1
+STREAM_STDERR = 2
+
+class DockerFilesystemHelper(object):
+	'''
+	Runs a long-lived Python process inside a container that answers filesystem queries over a single attached
+	exec stream. Each query costs one round trip over the existing connection rather than the creation of a
+	new exec instance and a new interpreter, which makes repeated queries far cheaper (particularly for Windows
+	containers, where process creation is slow.) Helpers are typically created with
+	`DockerUtils.filesystem_helper()` and used as context managers so that the helper process is stopped:
+		
+		with DockerUtils.filesystem_helper(container) as helper:
+			binaries = helper.glob_multiple(['C:\\workspace\\dist\\**\\*.exe', 'C:\\workspace\\dist\\**\\*.dll'], recursive=True)
+	'''
+	
+	def __init__(self, container):
+		'''
+		Starts the helper process in the specified container returned by `DockerUtils.start_for_exec()`
+		'''
+		from .DockerUtils import DockerUtils
+		interpreter = 'python' if DockerUtils.container_platform(container) == 'windows' else 'python3'
+		self._container = container
+		self._lock = threading.Lock()
+		self._stdout = b''
+		self._stderr = b''
+		
+		# Start the helper with stdin attached and retrieve the raw socket for the exec stream
+		details = container.client.api.exec_create(container.id, [interpreter, '-u', '-c', HELPER_SCRIPT], stdin=True)
+		self._exec = details['Id']
+		self._socket = container.client.api.exec_start(self._exec, socket=True)
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+	
+	def close(self):
+		'''
+		Stops the helper process and closes the exec stream
+		'''
+		with self._lock:
+			if self._socket is None:
+				return
+			try:
+				self._send(b'null\n')
+			except OSError:
+				pass
+			finally:
+				self._socket.close()
+				self._socket = None
+	
+	def glob(self, pattern, recursive=False):
+		'''
+		Returns the list of paths matching the specified pattern, in the same manner as `DockerUtils.glob()`
+		'''
+		return [entry['path'] for entry in self.glob_multiple([pattern], recursive)[pattern]]
+	
+	def glob_multiple(self, patterns, recursive=False):
+		'''
+		Resolves multiple glob patterns in a single query and returns a dictionary mapping each pattern to its list
+		of matches, in the same format as `DockerUtils.glob_multiple()`
+		'''
+		patterns = list(patterns)
+		return dict(zip(patterns, self._request({'op': 'glob', 'patterns': patterns, 'recursive': recursive})))
+	
+	def stat(self, paths):
+		'''
+		Retrieves the details of multiple paths in a single query and returns a dictionary mapping each path to a
+		dictionary with the keys "path", "size", "mtime" and "directory", or to None if the path does not exist
+		'''
+		paths = list(paths)
+		return dict(zip(paths, self._request({'op': 'stat', 'paths': paths})))
+	
+	
+	# "Private" methods
+	
+	def _failure(self, message):
+		'''
+		Closes the exec stream and returns an exception describing a failure of the helper process
+		'''
+		self._socket.close()
+		self._socket = None
+		result = self._container.client.api.exec_inspect(self._exec).get('ExitCode')
+		return RuntimeError('Filesystem helper process in container {}. Process returned exit code {} with output {}.'.format(
+			message,
+			result,
+			self._stderr.decode('utf-8', errors='replace')
+		))
+	
+	def _read_exactly(self, count):
+		'''
+		Reads the specified number of bytes from the exec stream, returning None if the stream ends first
+		'''
+		data = b''
+		while len(data) < count:
+			chunk = self._socket.recv(count - len(data)) if hasattr(self._socket, 'recv') else self._socket.read(count - len(data))
+			if chunk is None or len(chunk) == 0:
+				return None
+			data += chunk
+		return data
+	
+	def _read_line(self):
+		'''
+		Reads the next line of stdout output from the exec stream, demultiplexing the output frames
+		'''
+		while b'\n' not in self._stdout:
+			header = self._read_exactly(8)
+			if header is None:
+				return None
+			stream, length = struct.unpack('>BxxxL', header)
+			data = self._read_exactly(length)
+			if data is None:
+				return None
+			if stream == STREAM_STDERR:
+				self._stderr += data
+			else:
+				self._stdout += data
+		
+		line, _, self._stdout = self._stdout.partition(b'\n')
+		return line
+	
+	def _request(self, request):
+		'''
+		Sends a request to the helper process and returns the result from its response
+		'''
+		with self._lock:
+			if self._socket is None:
+				raise RuntimeError('Filesystem helper process has already been closed')
+			
+			# Send the request and wait for the response
+			self._send((json.dumps(request) + '\n').encode('utf-8'))
+			line = self._read_line()
+			if line is None:
+				raise self._failure('exited unexpectedly')
+			
+			# Propagate any errors reported by the helper
+			response = json.loads(line.decode('utf-8'))
+			if 'error' in response:
+				raise RuntimeError('Filesystem helper process in container failed to process request: {}'.format(response['error']))
+			return response['result']
+	
+	def _send(self, data):
+		'''
+		Writes data to the stdin of the helper process. The socket object returned by the Docker SDK differs between
+		transports, and not all of them provide `sendall()`.
+		'''
+		if hasattr(self._socket, 'sendall'):
+			self._socket.sendall(data)
+		else:
+			view = memoryview(data)
+			while len(view) > 0:
+				written = self._socket.write(view) if hasattr(self._socket, 'write') else self._socket.send(view)
+				view = view[written:]
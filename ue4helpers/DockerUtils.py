@@ -1,6 +1,89 @@
-import contextlib, docker, fnmatch, io, json, logging, posixpath, ntpath, os, sys, tempfile
+import contextlib, fnmatch, hashlib, io, json, logging, posixpath, ntpath, os, sys, tarfile, tempfile, uuid
 from .FilesystemUtils import FilesystemUtils
 from .ArchiveUtils import ArchiveUtils
+from .DockerContextBuilder import DockerContextBuilder, BUILD_HASH_LABEL
+from .DockerFilesystemHelper import DockerFilesystemHelper, GLOB_FUNCTIONS
+
+# The Python script run inside containers to list the files in a directory, along with their sizes,
+# modification times and (optionally) SHA-256 digests. If a list of names is specified then only those
+# files are listed. The output is a JSON object mapping forward-slash relative paths to file details.
+MANIFEST_SCRIPT = '''
+import hashlib, json, os, sys
+root, names, hashes = json.loads(sys.argv[1])
+def details(path):
+	info = os.lstat(path)
+	entry = {"size": info.st_size, "mtime": int(info.st_mtime)}
+	if hashes and os.path.isfile(path) and not os.path.islink(path):
+		digest = hashlib.sha256()
+		with open(path, "rb") as f:
+			for block in iter(lambda: f.read(1048576), b""):
+				digest.update(block)
+		entry["sha256"] = digest.hexdigest()
+	return entry
+manifest = {}
+if names is not None:
+	for name in names:
+		path = os.path.join(root, *name.split("/"))
+		if os.path.lexists(path) and not os.path.isdir(path):
+			manifest[name] = details(path)
+else:
+	for dirpath, dirnames, filenames in os.walk(root):
+		for filename in filenames:
+			path = os.path.join(dirpath, filename)
+			manifest[os.path.relpath(path, root).replace(os.sep, "/")] = details(path)
+print(json.dumps(manifest))
+'''
+
+# The Python script run inside containers to resolve a list of glob patterns in a single invocation. The output
+# is a JSON array containing the list of matches for each pattern in turn (see `DockerUtils.glob_multiple()`.)
+GLOB_SCRIPT = GLOB_FUNCTIONS + '''
+patterns, recursive = json.loads(sys.argv[1])
+print(json.dumps(glob_details(patterns, recursive)))
+'''
+
+# The exit code used by `COPY_MATCHING_SCRIPT` to indicate that the requested path does not exist
+NOT_FOUND_EXIT_CODE = 44
+
+# The Python script run inside containers to write a tar archive of the files matching a set of include and
+# exclude patterns to stdout. Entries are named in the same manner as those returned by `get_archive()`.
+COPY_MATCHING_SCRIPT = '''
+import fnmatch, json, os, sys, tarfile
+root, include, exclude = json.loads(sys.argv[1])
+root = os.path.normpath(root)
+prefix = os.path.basename(root)
+if not os.path.lexists(root):
+	sys.stderr.write("Could not find the file " + root)
+	sys.exit(''' + str(NOT_FOUND_EXIT_CODE) + ''')
+def matches(path, patterns):
+	name = path.rsplit("/", 1)[-1]
+	return any(fnmatch.fnmatch(path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+with tarfile.open(fileobj=sys.stdout.buffer, mode="w|") as archive:
+	if os.path.isfile(root):
+		if matches(prefix, include) and not matches(prefix, exclude):
+			archive.add(root, arcname=prefix, recursive=False)
+	for dirpath, dirnames, filenames in os.walk(root):
+		relative = os.path.relpath(dirpath, root).replace(os.sep, "/")
+		relative = "" if relative == "." else relative + "/"
+		dirnames[:] = sorted([d for d in dirnames if not matches(relative + d, exclude)])
+		for filename in sorted(filenames):
+			path = relative + filename
+			if matches(path, include) and not matches(path, exclude):
+				archive.add(os.path.join(dirpath, filename), arcname=prefix + "/" + path, recursive=False)
+sys.stdout.buffer.flush()
+'''
+
+# The Python script run inside containers to delete the files listed in a JSON file (which is then deleted itself)
+DELETE_SCRIPT = '''
+import json, os, sys
+root, listing = json.loads(sys.argv[1])
+with open(listing, "r") as f:
+	names = json.load(f)
+for name in names:
+	path = os.path.join(root, *name.split("/"))
+	if os.path.lexists(path) and not os.path.isdir(path):
+		os.unlink(path)
+os.unlink(listing)
+'''
 
 class DockerUtils(object):
 	'''
@@ -10,11 +93,23 @@ class DockerUtils(object):
 	# Image-related functionality
 	
 	@staticmethod
-	def build_image(client, **kwargs):
+	def build_image(client, context_cache=None, skip_unchanged=False, **kwargs):
 		'''
 		Builds a container image, printing progress output as it is received
+		
+		If `context_cache` is specified and the `path` argument is a local directory, the build context is
+		generated by a `DockerContextBuilder` that caches context tarballs in the `context_cache` directory,
+		so an unchanged context is streamed to the daemon from the cache without being regenerated. If
+		`skip_unchanged` is also True then the build is skipped entirely when an image built from an identical
+		context with identical build options already exists (unless `pull` or `nocache` are specified), in
+		which case the existing image is tagged with the requested tag and its ID is returned.
 		'''
 		
+		# Build using a cached context if requested
+		path = kwargs.get('path')
+		if context_cache is not None and path is not None and os.path.isdir(path):
+			return DockerUtils._build_with_context(client, context_cache, skip_unchanged, **kwargs)
+		
 		# Initiate the build and retrieve the generator for our build events
 		events = client.api.build(decode=True, **kwargs)
 		imageID = None
@@ -97,15 +192,23 @@ class DockerUtils(object):
 		return container.attrs['Platform']
 	
 	@staticmethod
-	def copy_from_host(container, host_path, container_path):
+	def copy_from_host(container, host_path, container_path, sync=False, delete=False, compare='mtime'):
 		'''
 		Copies a file or directory from the host system to a container returned by `DockerUtils.start_for_exec()`.
 		
 		`host_path` is the absolute path to the file or directory on the host system.
 		
 		`container_path` is the absolute path to the directory in the container where the copied file(s) will be placed.
+		
+		If `sync` is True then only the files that are missing or have changed in the container are copied
+		(see `DockerUtils.sync_from_host()` for details of the `delete` and `compare` parameters), and a
+		dictionary of transfer statistics is returned.
 		'''
 		
+		# If we are synchronising then only transfer the changes
+		if sync == True:
+			return DockerUtils.sync_from_host(container, host_path, container_path, delete=delete, compare=compare)
+		
 		# If the host path denotes a file rather than a directory, copy it to a temporary directory
 		# (If the host path is a directory then we create a no-op context manager to use in our `with` statement below)
 		tempDir = contextlib.suppress()
@@ -131,6 +234,50 @@ class DockerUtils(object):
 				# Remove the temporary archive
 				os.unlink(tempArchive.name)
 	
+	@staticmethod
+	def copy_matching_to_host(container, container_path, host_path, include=['*'], exclude=[]):
+		'''
+		Copies only the files matching the specified patterns from a container returned by `DockerUtils.start_for_exec()`
+		to the host system. The matching files are packed into a single tar archive inside the container, which is
+		streamed directly to the host and extracted as it is received, so only a single round trip is required.
+		
+		`container_path` is the absolute path to the file or directory in the container. As with `DockerUtils.copy_to_host()`,
+		the files are placed under a directory named after the last component of `container_path`.
+		
+		`host_path` is the absolute path to the directory on the host system where the copied file(s) will be placed.
+		
+		`include` and `exclude` are lists of glob patterns, each of which is matched against both the relative path
+		(using forward slashes as separators) and the filename of each file. A file is copied if it matches any of
+		the include patterns and none of the exclude patterns. Directories matching an exclude pattern are skipped
+		entirely. Note that `*` matches across directory separators, so "Saved/Logs/*" matches all nested logs.
+		
+		Returns the list of relative paths of the copied files. As with `DockerUtils.copy_to_host()`, a
+		`docker.errors.NotFound` exception is raised if `container_path` does not exist.
+		'''
+		
+		# Start the in-container script and wrap its output in a file object
+		stream = _ChunkStream(DockerUtils._python_stream(container, COPY_MATCHING_SCRIPT, [container_path, include, exclude]))
+		
+		# Extract the tar data as it is received
+		copied = []
+		options = {'filter': 'tar'} if hasattr(tarfile, 'tar_filter') else {}
+		try:
+			with tarfile.open(fileobj=stream, mode='r|') as archive:
+				for member in archive:
+					archive.extract(member, host_path, **options)
+					if member.isfile() == True:
+						copied.append(member.name)
+			
+			# Consume any trailing output so that the exit status of the script is checked
+			stream.drain()
+		except _ScriptError as err:
+			if err.exit_code != NOT_FOUND_EXIT_CODE:
+				raise
+			import docker.errors
+			raise docker.errors.NotFound('Could not find the file {} in container {}'.format(container_path, container.id))
+		
+		return copied
+	
 	@staticmethod
 	def copy_to_host(container, container_path, host_path):
 		'''
@@ -217,15 +364,41 @@ class DockerUtils(object):
 		return output if capture == True else None
 	
 	@staticmethod
-	def glob(container, pattern):
+	def filesystem_helper(container):
+		'''
+		Starts a long-lived helper process in a container returned by `DockerUtils.start_for_exec()` that answers
+		repeated filesystem queries over a single exec stream. See the `DockerFilesystemHelper` class for details.
+		'''
+		return DockerFilesystemHelper(container)
+	
+	@staticmethod
+	def glob(container, pattern, recursive=False):
 		'''
 		Performs globbing using Python inside a container to list the files matching the specified pattern
 		'''
-		platform = DockerUtils.container_platform(container)
-		interpreter = 'python' if platform == 'windows' else 'python3'
-		command = [interpreter, '-c', 'import glob; print("\\n".join(glob.glob({})))'.format(json.dumps(pattern))]
-		stdout, stderr = DockerUtils.exec(container, command, capture=True)
-		return stdout.strip().splitlines()
+		return [entry['path'] for entry in DockerUtils.glob_multiple(container, [pattern], recursive)[pattern]]
+	
+	@staticmethod
+	def glob_multiple(container, patterns, recursive=False):
+		'''
+		Performs globbing for multiple patterns using a single invocation of Python inside a container. Returns a
+		dictionary mapping each pattern to its list of matches, each of which is a dictionary with the keys "path",
+		"size", "mtime" (in whole seconds) and "directory". Use `DockerUtils.filesystem_helper()` instead when
+		performing many separate queries, since each call to this method runs a new exec instance.
+		'''
+		patterns = list(patterns)
+		return dict(zip(patterns, json.loads(DockerUtils._python(container, GLOB_SCRIPT, [patterns, recursive]))))
+	
+	@staticmethod
+	def manifest(container, container_path, names=None, hashes=False):
+		'''
+		Lists the files in a directory inside a container, returning a dictionary that maps the relative path
+		of each file (using forward slashes as separators) to a dictionary containing its `size` in bytes and
+		its `mtime` in whole seconds. If `hashes` is True then each dictionary also contains the `sha256` digest
+		of the file's contents. If a list of relative paths is specified in `names` then only those files are
+		listed, and any that do not exist are omitted. Symbolic links are not followed.
+		'''
+		return json.loads(DockerUtils._python(container, MANIFEST_SCRIPT, [container_path, names, hashes]))
 	
 	@staticmethod
 	def path(container):
@@ -255,6 +428,88 @@ class DockerUtils(object):
 			**kwargs
 		)
 	
+	@staticmethod
+	def sync_from_host(container, host_path, container_path, delete=False, compare='mtime'):
+		'''
+		Synchronises a file or directory from the host system to a container returned by `DockerUtils.start_for_exec()`,
+		so that repeated copies into a long-lived container only transfer what has changed. The file or directory is
+		placed in `container_path` in the same manner as `DockerUtils.copy_from_host()`.
+		
+		A manifest of the existing files is retrieved from the container, and only the files that are missing or differ
+		are sent, in a single streamed tar archive. If `compare` is "mtime" then files are considered to differ if their
+		sizes or modification times (to the nearest second) differ, and if `compare` is "hash" then files of the same size
+		are compared by SHA-256 digest, which is slower but unaffected by timestamp changes (e.g. after a fresh checkout.)
+		
+		If `delete` is True and `host_path` is a directory then files in the container that do not exist in the host
+		directory are removed. Note that empty directories are neither created nor removed.
+		
+		Returns a dictionary containing the number of files and bytes that were sent, the number of files that were
+		unchanged and the number of files that were deleted.
+		'''
+		if compare not in ['mtime', 'hash']:
+			raise RuntimeError('unsupported comparison mode "{}"'.format(compare))
+		
+		# Determine the list of files on the host system, along with their relative paths in the container
+		hostFiles = {}
+		if os.path.isdir(host_path) == True:
+			for dirpath, dirnames, filenames in os.walk(host_path):
+				for filename in filenames:
+					path = os.path.join(dirpath, filename)
+					hostFiles[os.path.relpath(path, host_path).replace(os.sep, '/')] = path
+		else:
+			hostFiles[os.path.basename(host_path)] = host_path
+		
+		# Retrieve the manifest of existing files from the container
+		names = None if os.path.isdir(host_path) == True else list(hostFiles.keys())
+		existing = DockerUtils.manifest(container, container_path, names=names, hashes=compare == 'hash')
+		
+		# Identify the files that have been added or changed
+		changed = []
+		for name, path in sorted(hostFiles.items()):
+			details = os.lstat(path)
+			remote = existing.get(name)
+			if remote is None or remote['size'] != details.st_size:
+				changed.append(name)
+			elif compare == 'mtime' and remote['mtime'] != int(details.st_mtime):
+				changed.append(name)
+			elif compare == 'hash' and remote.get('sha256') != DockerUtils._sha256(path):
+				changed.append(name)
+		
+		# Identify the files that have been removed, if we are deleting them
+		removed = sorted([name for name in existing if name not in hostFiles]) if delete == True and names is None else []
+		
+		# If there is nothing to do then don't perform a transfer
+		stats = {
+			'files': len(changed),
+			'bytes': sum([os.lstat(hostFiles[name]).st_size for name in changed]),
+			'unchanged': len(hostFiles) - len(changed),
+			'deleted': len(removed)
+		}
+		if len(changed) == 0 and len(removed) == 0:
+			return stats
+		
+		# Write the changed files (and the list of removed files, if any) to a temporary archive
+		listing = '.ue4helpers-delete-{}.json'.format(uuid.uuid4().hex)
+		with tempfile.TemporaryFile(suffix='.tar') as tempArchive:
+			with tarfile.open(fileobj=tempArchive, mode='w') as archive:
+				for name in changed:
+					archive.add(hostFiles[name], arcname=name, recursive=False, filter=DockerUtils._whole_second_mtime)
+				if len(removed) > 0:
+					data = json.dumps(removed).encode('utf-8')
+					info = tarfile.TarInfo(listing)
+					info.size = len(data)
+					archive.addfile(info, io.BytesIO(data))
+			
+			# Stream the archive to the container
+			tempArchive.seek(0)
+			container.put_archive(container_path, tempArchive)
+		
+		# Remove the deleted files inside the container
+		if len(removed) > 0:
+			DockerUtils._python(container, DELETE_SCRIPT, [container_path, DockerUtils.path(container).join(container_path, listing)])
+		
+		return stats
+	
 	@staticmethod
 	def stop(container, timeout=1):
 		'''
@@ -277,3 +532,134 @@ class DockerUtils(object):
 		'''
 		platform = DockerUtils.container_platform(container)
 		return ['cmd', '/S', '/C'] if platform == 'windows' else ['bash', '-c']
+	
+	
+	# "Private" methods
+	
+	@staticmethod
+	def _build_with_context(client, context_cache, skip_unchanged, path, **kwargs):
+		'''
+		Builds a container image using a context generated by a `DockerContextBuilder`
+		'''
+		builder = DockerContextBuilder(path, kwargs.pop('dockerfile', None), context_cache)
+		buildHash = builder.build_hash(kwargs)
+		
+		# Reuse an existing image built from an identical context and options, if any
+		if skip_unchanged == True and kwargs.get('pull', False) == False and kwargs.get('nocache', False) == False:
+			imageID = builder.find_image(client, buildHash, kwargs.get('tag'))
+			if imageID is not None:
+				print('Build context and options are unchanged, reusing existing image {}'.format(imageID), flush=True)
+				return imageID
+		
+		# Label the image with the build hash and stream the cached context to the daemon
+		labels = dict(kwargs.pop('labels', None) or {})
+		labels[BUILD_HASH_LABEL] = buildHash
+		with open(builder.context(), 'rb') as context:
+			return DockerUtils.build_image(client, fileobj=context, custom_context=True, dockerfile=builder.dockerfile(), labels=labels, **kwargs)
+	
+	@staticmethod
+	def _python(container, script, *args):
+		'''
+		Runs a Python script inside a container and returns its captured stdout. Each of the supplied
+		arguments is passed to the script as a JSON-encoded command-line argument.
+		'''
+		platform = DockerUtils.container_platform(container)
+		interpreter = 'python' if platform == 'windows' else 'python3'
+		command = [interpreter, '-c', script] + [json.dumps(arg) for arg in args]
+		stdout, stderr = DockerUtils.exec(container, command, capture=True)
+		return stdout
+	
+	@staticmethod
+	def _python_stream(container, script, *args):
+		'''
+		Runs a Python script inside a container and yields its binary stdout data as it is received. The
+		arguments are passed in the same manner as `_python()`. An exception is raised once the output has
+		been consumed if the script failed, which includes any stderr output from the script.
+		'''
+		platform = DockerUtils.container_platform(container)
+		interpreter = 'python' if platform == 'windows' else 'python3'
+		command = [interpreter, '-c', script] + [json.dumps(arg) for arg in args]
+		
+		# Start the script and stream its output
+		details = container.client.api.exec_create(container.id, command)
+		output = container.client.api.exec_start(details['Id'], stream=True, demux=True)
+		errors = []
+		for stdout, stderr in output:
+			if stderr is not None:
+				errors.append(stderr)
+			if stdout is not None:
+				yield stdout
+		
+		# Determine if the script succeeded
+		result = container.client.api.exec_inspect(details['Id'])['ExitCode']
+		if result != 0:
+			raise _ScriptError(result, 'Failed to run Python script in container. Process returned exit code {} with output {}.'.format(
+				result,
+				b''.join(errors).decode('utf-8', errors='replace')
+			))
+	
+	@staticmethod
+	def _sha256(path):
+		'''
+		Computes the SHA-256 digest of the contents of a file on the host system
+		'''
+		digest = hashlib.sha256()
+		with open(path, 'rb') as f:
+			for block in iter(lambda: f.read(1024 * 1024), b''):
+				digest.update(block)
+		return digest.hexdigest()
+	
+	@staticmethod
+	def _whole_second_mtime(info):
+		'''
+		Truncates the modification time of a tar entry to whole seconds, which matches the resolution used
+		when comparing timestamps and avoids the overhead of a pax extended header for every file
+		'''
+		info.mtime = int(info.mtime)
+		return info
+
+
+class _ScriptError(RuntimeError):
+	'''
+	Raised by `DockerUtils._python_stream()` when a script fails, recording the exit code of the script
+	'''
+	
+	def __init__(self, exit_code, message):
+		super().__init__(message)
+		self.exit_code = exit_code
+
+
+class _ChunkStream(io.RawIOBase):
+	'''
+	Presents an iterator of binary data chunks as a readable binary file object
+	'''
+	
+	def __init__(self, chunks):
+		self._chunks = iter(chunks)
+		self._buffer = memoryview(b'')
+	
+	def readable(self):
+		return True
+	
+	def readinto(self, b):
+		
+		# Retrieve the next non-empty chunk if our buffer is empty
+		while len(self._buffer) == 0:
+			chunk = next(self._chunks, None)
+			if chunk is None:
+				return 0
+			self._buffer = memoryview(chunk)
+		
+		# Copy as much of the buffered data as will fit
+		count = min(len(b), len(self._buffer))
+		b[:count] = self._buffer[:count]
+		self._buffer = self._buffer[count:]
+		return count
+	
+	def drain(self):
+		'''
+		Consumes and discards any remaining chunks
+		'''
+		self._buffer = memoryview(b'')
+		for chunk in self._chunks:
+			pass
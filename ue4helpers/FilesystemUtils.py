@@ -1,6 +1,5 @@
 from os.path import exists, isdir, join
-import itertools, os, shutil
-from conans import tools
+import fnmatch, itertools, os, shutil
 from glob import glob
 
 class FilesystemUtils(object):
@@ -25,30 +24,68 @@ class FilesystemUtils(object):
 		'''
 		return '://' in path
 	
+	@staticmethod
+	def matches_any(name, patterns):
+		'''
+		Determines if the specified file or directory name matches any of the specified
+		patterns, using the same rules that `remove_matching()` uses when globbing (i.e.
+		names starting with a dot only match patterns that also start with a dot.)
+		'''
+		for pattern in patterns:
+			if name.startswith('.') and not pattern.startswith('.'):
+				continue
+			if fnmatch.fnmatch(name, pattern):
+				return True
+		
+		return False
+	
+	@staticmethod
+	def preallocate(f, size):
+		'''
+		Preallocates space for a file that is open for writing, so that the filesystem can allocate
+		contiguous storage up front rather than extending the file as data is written. Where true
+		preallocation is not supported, the file is simply extended to the requested size.
+		'''
+		if size <= 0:
+			return
+		
+		try:
+			os.posix_fallocate(f.fileno(), 0, size)
+		except (AttributeError, OSError):
+			f.truncate(size)
+	
 	@staticmethod
 	def read(filename, decode=True):
 		'''
 		Reads the contents of a file
 		'''
-		data = tools.load(filename, binary=True)
+		with open(filename, 'rb') as f:
+			data = f.read()
 		return data.decode('utf-8') if decode == True else data
 	
 	@staticmethod
-	def remove(path):
+	def remove(path, background=False):
 		'''
-		Removes the specified file or directory if it exists
+		Removes the specified file or directory if it exists. If `background` is True then the item is
+		renamed into a trash directory alongside it and deleted by the shared `TrashReaper` in the background,
+		so this returns almost immediately even for large directory trees. Use `wait_for_removals()` to wait
+		for background removals to complete.
 		'''
-		if exists(path):
+		if background == True:
+			from .TrashReaper import TrashReaper
+			TrashReaper.default().trash(path)
+		elif exists(path):
 			if isdir(path):
 				shutil.rmtree(path)
 			else:
 				os.unlink(path)
 	
 	@staticmethod
-	def remove_matching(root, patterns):
+	def remove_matching(root, patterns, on_remove=None):
 		'''
 		Removes all files and directories within the specified root directory
-		that match any of the specified patterns.
+		that match any of the specified patterns. If `on_remove` is specified
+		then it will be called with the path of each match before it is removed.
 		
 		Returns the list of removed files and directories.
 		'''
@@ -61,13 +98,45 @@ class FilesystemUtils(object):
 		
 		# Remove all of the matching files and directories
 		for match in matches:
+			if on_remove is not None:
+				on_remove(match)
 			FilesystemUtils.remove(match)
 			
 		return matches
 	
+	@staticmethod
+	def wait_for_removals(timeout=None):
+		'''
+		Blocks until all background removals started by `remove()` have completed, or until the specified
+		timeout (in seconds) elapses. Returns True if all removals completed, or False if the timeout elapsed.
+		'''
+		from .TrashReaper import TrashReaper
+		return TrashReaper.default().wait(timeout)
+	
+	@staticmethod
+	def tree_size(path):
+		'''
+		Returns a tuple containing the number of files and the total size in bytes
+		of the specified file or directory. Symbolic links are not followed.
+		'''
+		if not exists(path):
+			return (0, 0)
+		elif not isdir(path):
+			return (1, os.path.getsize(path))
+		
+		files = 0
+		size = 0
+		for dirpath, dirnames, filenames in os.walk(path):
+			for filename in filenames:
+				files += 1
+				size += os.lstat(join(dirpath, filename)).st_size
+		
+		return (files, size)
+	
 	@staticmethod
 	def write(filename, data):
 		'''
 		Writes data to a file
 		'''
+		from conans import tools
 		return tools.save(filename, data)
@@ -1,5 +1,3 @@
-from google.cloud import storage
-
 class GCPUtils(object):
 	'''
 	Provides functionality related to Google Cloud Platform (GCP)
@@ -16,9 +14,21 @@ class GCPUtils(object):
 		`key` is the key for the data that will be downloaded.
 		`filename` is the path to the file that will receive the downloaded data.
 		'''
+		from google.cloud import storage
 		gcs = storage.Client()
 		gcs.get_bucket(bucket).get_blob(key).download_to_filename(filename)
 	
+	@staticmethod
+	def file_exists(bucket, key):
+		'''
+		Determines if a file exists in GCS.
+		
+		`bucket` is the GCS Bucket name to query.
+		`key` is the key for the data whose existence will be checked.
+		'''
+		from google.cloud import storage
+		return storage.Client().bucket(bucket).blob(key).exists()
+	
 	@staticmethod
 	def upload_file(bucket, key, filename):
 		'''
@@ -28,6 +38,7 @@ class GCPUtils(object):
 		`key` is the key to assign to the uploaded data.
 		`filename` is the path to the file containing the data that will be uploaded.
 		'''
+		from google.cloud import storage
 		bucket = storage.Client().get_bucket(bucket)
 		blob = bucket.get_blob(key)
 		blob = blob if blob is not None else bucket.blob(key)
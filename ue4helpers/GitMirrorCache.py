@@ -0,0 +1,133 @@
+from .FilesystemUtils import FilesystemUtils
+from .GitUtils import GitUtils
+from .SubprocessUtils import SubprocessUtils
+from os.path import basename, exists, expanduser, getmtime, join
+import contextlib, hashlib, os, re, time, uuid
+
+# The environment variable that overrides the default location of the mirror cache
+CACHE_ENVIRONMENT_VARIABLE = 'UE4HELPERS_GIT_CACHE'
+
+class GitMirrorCache(object):
+	'''
+	Maintains a host-side cache of bare mirror repositories, so that repeated clones of the same repository
+	(e.g. one per build container) borrow objects from the local mirror instead of fetching them over the
+	network. Each mirror is created on first use and refreshed incrementally thereafter, and clones can
+	additionally be blobless partial clones with a sparse checkout to minimise the size of the working tree.
+	'''
+	
+	def __init__(self, directory=None):
+		'''
+		Creates a new GitMirrorCache that stores its mirrors in the specified directory. If this is not specified
+		then the value of the `UE4HELPERS_GIT_CACHE` environment variable is used, falling back to a directory
+		named ".ue4helpers/git-mirrors" under the user's home directory.
+		'''
+		default = os.environ.get(CACHE_ENVIRONMENT_VARIABLE, join(expanduser('~'), '.ue4helpers', 'git-mirrors'))
+		self._directory = directory if directory is not None else default
+	
+	def directory(self):
+		'''
+		Returns the directory that holds the mirrors (e.g. so that it can be mounted in a container)
+		'''
+		return self._directory
+	
+	def mirror_path(self, url):
+		'''
+		Returns the path of the mirror for the specified repository URL (which may not exist yet)
+		'''
+		name = re.sub(r'[^A-Za-z0-9_.-]', '_', basename(url.rstrip('/')))
+		name = name[:-4] if name.endswith('.git') else name
+		return join(self._directory, '{}-{}.git'.format(name, hashlib.sha256(url.encode('utf-8')).hexdigest()[:12]))
+	
+	def update(self, url, max_age=0):
+		'''
+		Creates or incrementally refreshes the mirror for the specified repository URL and returns its path.
+		A mirror that was refreshed less than `max_age` seconds ago is not refreshed again, which avoids
+		redundant fetches when several clones of the same repository are performed in quick succession.
+		'''
+		mirror = self.mirror_path(url)
+		os.makedirs(self._directory, exist_ok=True)
+		with self._lock(mirror):
+			
+			# Create the mirror if it doesn't already exist, cloning to a temporary location first so that an interrupted clone is never mistaken for a mirror
+			if not exists(mirror):
+				temp = '{}.{}.tmp'.format(mirror, uuid.uuid4().hex)
+				try:
+					SubprocessUtils.run(['git', 'clone', '--mirror', '--quiet', url, temp])
+					os.replace(temp, mirror)
+				finally:
+					FilesystemUtils.remove(temp)
+				self._touch(mirror)
+				return mirror
+			
+			# Fetch any new objects and refs, unless the mirror was refreshed recently enough
+			if max_age <= 0 or time.time() - self._last_update(mirror) > max_age:
+				SubprocessUtils.run(['git', 'remote', 'update', '--prune'], cwd=mirror)
+				self._touch(mirror)
+			
+			return mirror
+	
+	def clone(self, url, dest, ref=None, progress=False, shallow=False, dissociate=False, partial=True, sparse=None, max_age=0):
+		'''
+		Refreshes the mirror for the specified repository URL and then clones the specified branch or tag (or the
+		default branch) into `dest`, borrowing objects from the mirror. See `GitUtils.clone_url_commands()` for
+		details of the remaining parameters. Returns the path of the mirror.
+		'''
+		mirror = self.update(url, max_age)
+		for command in self.clone_commands(url, dest, ref, progress, shallow, mirror, dissociate, partial, sparse):
+			SubprocessUtils.run(command)
+		return mirror
+	
+	def clone_commands(self, url, dest, ref=None, progress=False, shallow=False, reference=None, dissociate=False, partial=True, sparse=None):
+		'''
+		Generates the list of commands to clone the specified repository URL using its mirror as a reference
+		repository, without refreshing the mirror. `reference` specifies the path of the mirror as seen by
+		whatever will run the commands (e.g. a container with the cache directory mounted), and defaults to
+		the host path of the mirror. See `GitUtils.clone_url_commands()` for details of the remaining parameters.
+		'''
+		return GitUtils.clone_url_commands(
+			url,
+			dest,
+			ref = ref,
+			progress = progress,
+			shallow = shallow,
+			reference = reference if reference is not None else self.mirror_path(url),
+			dissociate = dissociate,
+			partial = partial,
+			sparse = sparse
+		)
+	
+	
+	# "Private" methods
+	
+	def _last_update(self, mirror):
+		'''
+		Returns the time at which the specified mirror was last refreshed
+		'''
+		marker = join(mirror, 'ue4helpers-updated')
+		return getmtime(marker) if exists(marker) else 0
+	
+	@contextlib.contextmanager
+	def _lock(self, mirror):
+		'''
+		Context manager that holds an exclusive lock for the specified mirror, so that concurrent builds on the
+		same host do not attempt to create or refresh the same mirror at once. (Locking is a no-op on Windows.)
+		'''
+		try:
+			import fcntl
+		except ImportError:
+			yield
+			return
+		
+		with open('{}.lock'.format(mirror), 'w') as lockFile:
+			fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX)
+			try:
+				yield
+			finally:
+				fcntl.flock(lockFile.fileno(), fcntl.LOCK_UN)
+	
+	def _touch(self, mirror):
+		'''
+		Records the time at which the specified mirror was refreshed
+		'''
+		with open(join(mirror, 'ue4helpers-updated'), 'w'):
+			pass
@@ -23,18 +23,73 @@ class GitUtils(object):
 		return tag if tag is not None else branch
 	
 	@staticmethod
-	def clone_command(repo, dest=None, progress=False, shallow=True):
+	def clone_command(repo, dest=None, progress=False, shallow=True, reference=None, dissociate=False, partial=False):
 		'''
 		Generates the `git clone` command to clone the currently checked out commit in the specified repository 
+		
+		See `clone_url_commands()` for details of the `reference`, `dissociate` and `partial` parameters.
 		'''
 		depth = ['--depth', '1'] if shallow == True else []
 		target = [dest] if dest is not None else []
 		verbosity = ['--progress'] if progress == True else []
-		return ['git', 'clone'] + verbosity + depth + [
+		return ['git', 'clone'] + verbosity + depth + GitUtils._clone_options(reference, dissociate, partial, False) + [
 			'-b', GitUtils.branch_or_tag_name(repo),
 			GitUtils.remote_url(repo)
 		] + target
 	
+	@staticmethod
+	def clone_commands(repo, dest, progress=False, shallow=False, reference=None, dissociate=False, partial=True, sparse=None):
+		'''
+		Generates the list of commands to clone the currently checked out branch or tag in the specified
+		repository. See `clone_url_commands()` for details of the parameters.
+		'''
+		return GitUtils.clone_url_commands(
+			GitUtils.remote_url(repo),
+			dest,
+			ref = GitUtils.branch_or_tag_name(repo),
+			progress = progress,
+			shallow = shallow,
+			reference = reference,
+			dissociate = dissociate,
+			partial = partial,
+			sparse = sparse
+		)
+	
+	@staticmethod
+	def clone_url_commands(url, dest, ref=None, progress=False, shallow=False, reference=None, dissociate=False, partial=True, sparse=None):
+		'''
+		Generates the list of commands to clone the specified branch or tag (or the default branch) of the
+		specified repository URL, so that they can be run either directly or inside a container.
+		
+		`reference` specifies the path to a local repository (typically a mirror maintained by `GitMirrorCache`)
+		whose objects will be borrowed via the alternates mechanism rather than fetched over the network. The
+		path must be valid wherever the commands are run (e.g. the mount point of the mirror inside a container.)
+		If `dissociate` is True then the borrowed objects are copied into the clone, so that the clone remains
+		usable once the reference repository is no longer available.
+		
+		If `partial` is True then a blobless partial clone (`--filter=blob:none`) is performed, so that file
+		contents are only fetched when they are checked out. Servers that do not support filtering perform a
+		regular clone instead. Git ignores the filter when `url` is a plain local path, so local repositories must
+		be specified using a `file://` URL (and have `uploadpack.allowFilter` enabled) to perform partial clones.
+		
+		`sparse` specifies the list of directories to check out using a cone-mode sparse checkout (e.g. a plugin's
+		`Source` directory.) Files in the root of the repository (e.g. the plugin descriptor) are always included.
+		This requires Git 2.25 or newer. Cone mode is enabled explicitly, since it is only the default from Git 2.37.
+		'''
+		depth = ['--depth', '1'] if shallow == True else []
+		branch = ['-b', ref] if ref is not None else []
+		verbosity = ['--progress'] if progress == True else []
+		commands = [
+			['git', 'clone'] + verbosity + depth + GitUtils._clone_options(reference, dissociate, partial, sparse is not None) + branch + [url, dest]
+		]
+		
+		# Populate the sparse checkout with the requested directories
+		if sparse is not None:
+			commands.append(['git', '-C', dest, 'sparse-checkout', 'init', '--cone'])
+			commands.append(['git', '-C', dest, 'sparse-checkout', 'set'] + list(sparse))
+		
+		return commands
+	
 	@staticmethod
 	def commit_date(repo):
 		'''
@@ -69,3 +124,17 @@ class GitUtils(object):
 			return SubprocessUtils.capture(['git', 'describe', '--tags', '--exact-match'], suppress_stderr=True, cwd=repo)
 		except:
 			return None
+	
+	
+	# "Private" methods
+	
+	@staticmethod
+	def _clone_options(reference, dissociate, partial, sparse):
+		'''
+		Generates the `git clone` options for reference repositories, partial clones and sparse checkouts
+		'''
+		options = ['--reference', reference] if reference is not None else []
+		options += ['--dissociate'] if reference is not None and dissociate == True else []
+		options += ['--filter=blob:none'] if partial == True else []
+		options += ['--sparse'] if sparse == True else []
+		return options
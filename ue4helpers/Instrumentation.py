@@ -0,0 +1,299 @@
+import contextlib, json, os, sys, threading, time
+
+class InstrumentationHook(object):
+	'''
+	Base class for objects that wish to receive notifications from an `Instrumentation` object.
+	Subclasses should override the methods for the notifications they are interested in.
+	'''
+	
+	def span_started(self, span):
+		'''
+		Called when a timed span begins
+		'''
+		pass
+	
+	def span_finished(self, span):
+		'''
+		Called when a timed span ends, after all of its metrics have been recorded
+		'''
+		pass
+	
+	def event(self, name, attributes):
+		'''
+		Called when a point-in-time event is published. Note that events may be
+		published from background threads (e.g. whilst parsing subprocess output.)
+		'''
+		pass
+
+
+class Span(object):
+	'''
+	Represents a single timed span, along with the metrics that were recorded for it
+	'''
+	
+	def __init__(self, name, parent=None, attributes={}):
+		self.name = name
+		self.parent = parent
+		self.attributes = dict(attributes)
+		self.children = []
+		self.thread = threading.get_ident()
+		self.start = time.time()
+		self.end = None
+		self.files = 0
+		self.bytes_in = 0
+		self.bytes_out = 0
+		self.peak_rss = None
+		self.peak_rss_children = None
+	
+	@property
+	def duration(self):
+		'''
+		Returns the duration of the span in seconds (or the elapsed time so far if the span is still open)
+		'''
+		return (self.end if self.end is not None else time.time()) - self.start
+	
+	def add(self, files=0, bytes_in=0, bytes_out=0):
+		'''
+		Adds to the file count and byte counters for the span
+		'''
+		self.files += files
+		self.bytes_in += bytes_in
+		self.bytes_out += bytes_out
+	
+	def set(self, **attributes):
+		'''
+		Sets one or more arbitrary attributes for the span
+		'''
+		self.attributes.update(attributes)
+	
+	def to_dict(self):
+		'''
+		Returns a JSON-compatible representation of the span and its children
+		'''
+		return {
+			'name': self.name,
+			'start': self.start,
+			'end': self.end,
+			'duration': self.duration,
+			'files': self.files,
+			'bytes_in': self.bytes_in,
+			'bytes_out': self.bytes_out,
+			'peak_rss': self.peak_rss,
+			'peak_rss_children': self.peak_rss_children,
+			'attributes': self.attributes,
+			'children': [child.to_dict() for child in self.children]
+		}
+
+
+class Instrumentation(object):
+	'''
+	Records timed spans (with file counts, byte counts and peak memory usage) for the phases
+	of a pipeline, and notifies any registered `InstrumentationHook` objects as spans begin and end.
+	'''
+	
+	def __init__(self, hooks=[]):
+		'''
+		Creates a new Instrumentation object, optionally registering the supplied list of hooks
+		'''
+		self._hooks = list(hooks)
+		self._spans = []
+		self._events = []
+		self._lock = threading.Lock()
+		self._local = threading.local()
+	
+	def add_hook(self, hook):
+		'''
+		Registers a hook that will be notified when spans begin and end
+		'''
+		self._hooks.append(hook)
+	
+	def remove_hook(self, hook):
+		'''
+		Unregisters a previously registered hook
+		'''
+		self._hooks.remove(hook)
+	
+	@contextlib.contextmanager
+	def span(self, name, **attributes):
+		'''
+		Context manager that times the enclosed block as a span with the specified name.
+		Spans opened inside the block (on the same thread) are recorded as children of this span.
+		The `Span` object is yielded so that metrics can be recorded for it.
+		'''
+		
+		# Create the span and attach it to the innermost open span for this thread, if any
+		stack = self._stack()
+		parent = stack[-1] if len(stack) > 0 else None
+		span = Span(name, parent, attributes)
+		with self._lock:
+			if parent is not None:
+				parent.children.append(span)
+			else:
+				self._spans.append(span)
+		
+		# Notify our hooks that the span has started
+		stack.append(span)
+		self._notify('span_started', span)
+		
+		try:
+			yield span
+		except BaseException as err:
+			span.set(error=repr(err))
+			raise
+		finally:
+			
+			# Record the end time and the peak memory usage so far
+			span.end = time.time()
+			span.peak_rss, span.peak_rss_children = Instrumentation.peak_rss()
+			stack.pop()
+			
+			# Notify our hooks that the span has finished
+			self._notify('span_finished', span)
+	
+	def record(self, name, start, end, **attributes):
+		'''
+		Records a span that has already completed (e.g. a phase detected in the output of a subprocess)
+		as a child of the innermost span that is currently open on the calling thread, and returns it.
+		'''
+		stack = self._stack()
+		parent = stack[-1] if len(stack) > 0 else None
+		span = Span(name, parent, attributes)
+		span.start = start
+		span.end = end
+		with self._lock:
+			if parent is not None:
+				parent.children.append(span)
+			else:
+				self._spans.append(span)
+		
+		self._notify('span_started', span)
+		self._notify('span_finished', span)
+		return span
+	
+	def event(self, name, **attributes):
+		'''
+		Publishes a point-in-time event to our hooks and records it. This is safe to call from any thread.
+		'''
+		event = {'name': name, 'time': attributes.pop('time', time.time()), 'thread': threading.get_ident(), 'attributes': attributes}
+		with self._lock:
+			self._events.append(event)
+		self._notify('event', name, attributes)
+	
+	def events(self):
+		'''
+		Returns the list of events that have been published
+		'''
+		with self._lock:
+			return list(self._events)
+	
+	def spans(self):
+		'''
+		Returns the list of top-level spans that have been recorded
+		'''
+		with self._lock:
+			return list(self._spans)
+	
+	def to_dict(self):
+		'''
+		Returns a JSON-compatible representation of all of the recorded spans
+		'''
+		return {'spans': [span.to_dict() for span in self.spans()], 'events': self.events()}
+	
+	def save_json(self, filename):
+		'''
+		Writes the recorded spans to a JSON file
+		'''
+		with open(filename, 'w') as f:
+			json.dump(self.to_dict(), f, indent=4)
+	
+	def save_chrome_trace(self, filename):
+		'''
+		Writes the recorded spans to a file in the Chrome Trace Event format,
+		which can be viewed using `chrome://tracing` or https://ui.perfetto.dev
+		'''
+		with open(filename, 'w') as f:
+			json.dump({'traceEvents': self.chrome_trace_events(), 'displayTimeUnit': 'ms'}, f)
+	
+	def chrome_trace_events(self):
+		'''
+		Returns the list of Chrome Trace Event format events for all of the recorded spans and events
+		'''
+		events = []
+		pending = self.spans()
+		while len(pending) > 0:
+			span = pending.pop(0)
+			pending.extend(span.children)
+			args = dict(span.attributes)
+			args.update({
+				'files': span.files,
+				'bytes_in': span.bytes_in,
+				'bytes_out': span.bytes_out,
+				'peak_rss': span.peak_rss,
+				'peak_rss_children': span.peak_rss_children
+			})
+			events.append({
+				'name': span.name,
+				'cat': span.name.split('.')[0],
+				'ph': 'X',
+				'ts': int(span.start * 1000000),
+				'dur': int(span.duration * 1000000),
+				'pid': os.getpid(),
+				'tid': span.thread,
+				'args': args
+			})
+		
+		# Include each of our point-in-time events as an instant event
+		for event in self.events():
+			events.append({
+				'name': event['name'],
+				'cat': event['name'].split('.')[0],
+				'ph': 'i',
+				's': 'p',
+				'ts': int(event['time'] * 1000000),
+				'pid': os.getpid(),
+				'tid': event['thread'],
+				'args': event['attributes']
+			})
+		
+		return events
+	
+	@staticmethod
+	def peak_rss():
+		'''
+		Returns a tuple containing the peak resident set size in bytes for the current process and
+		for its terminated child processes. Values that cannot be determined are returned as None.
+		'''
+		try:
+			import resource
+			scale = 1 if sys.platform == 'darwin' else 1024
+			return (
+				resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+				resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+			)
+		except ImportError:
+			pass
+		
+		# The `resource` module is not available under Windows, so fall back to psutil if it is installed
+		try:
+			import psutil
+			return (psutil.Process().memory_info().peak_wset, None)
+		except (ImportError, AttributeError):
+			return (None, None)
+	
+	
+	# "Private" methods
+	
+	def _notify(self, method, *args):
+		'''
+		Invokes the specified method on each of our registered hooks
+		'''
+		for hook in list(self._hooks):
+			getattr(hook, method)(*args)
+	
+	def _stack(self):
+		'''
+		Returns the stack of open spans for the current thread
+		'''
+		if not hasattr(self._local, 'stack'):
+			self._local.stack = []
+		return self._local.stack
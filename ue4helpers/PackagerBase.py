@@ -1,9 +1,24 @@
 from .ArchiveUtils import ArchiveUtils
+from .ArtifactStore import ArtifactStore
+from .BuildFingerprint import BuildFingerprint
+from .ContentHasher import ContentHasher, GENERATED_DIRECTORIES, HASH_INDEX, STABLE_ALGORITHM
 from .DescriptorData import DescriptorData
 from .FilesystemUtils import FilesystemUtils
+from .Instrumentation import Instrumentation
 from .PlatformInfo import PlatformInfo
-from os.path import isdir, join
-import os, shutil, subprocess
+from .SubprocessRunner import SubprocessRunner
+from .TrashReaper import TrashReaper
+from .UATLogParser import UATLogParser
+from .UnrealUtils import UnrealUtils
+from glob import glob
+from os.path import isdir, join, normpath, relpath
+import os, shutil, stat, subprocess, sys, tempfile
+
+# The subdirectories of the root directory whose contents are considered build inputs
+FINGERPRINT_DIRECTORIES = ['Config', 'Content', 'Plugins', 'Resources', 'Shaders', 'Source']
+
+# The location of the trash directory used by fast cleaning, relative to the root directory
+TRASH_DIRECTORY = join('Saved', 'ue4helpers', 'trash')
 
 class PackagerBase(object):
 	'''
@@ -12,7 +27,7 @@ class PackagerBase(object):
 	packaging projects and `PluginPackager` for packaging plugins.
 	'''
 	
-	def __init__(self, root, version, archive='{name}-{version}-{platform}', strip_debug=False, strip_manifests=False, stage=[], verbose=True):
+	def __init__(self, root, version, archive='{name}-{version}-{platform}', strip_debug=False, strip_manifests=False, stage=[], verbose=True, instrumentation=None, pipelined=False, archive_format='zip', archive_options={}, cache=None, fast_clean=False):
 		'''
 		Called by our concrete subclasses. The meanings of the parameters are as follows:
 		
@@ -22,8 +37,9 @@ class PackagerBase(object):
 		directory and descriptor data as parameters and returns the computed version string. The
 		`VersionHelpers` class provides a number of such functions for common use cases.
 		
-		`archive` specifies the template string used for generating the .zip filename
-		for compressing the packaged distribution. The following variables are supported:
+		`archive` specifies the template string used for generating the archive filename
+		for compressing the packaged distribution. The file extension for the archive format
+		(e.g. ".zip") is appended automatically. The following variables are supported:
 		
 		- `{name}` will expand to the descriptor filename with the file extension removed
 		- `{version}` will expand to the version string derived from the `version` parameter
@@ -41,6 +57,42 @@ class PackagerBase(object):
 		`verbose` specifies whether verbose output should be enabled for all of the packaging steps.
 		Note that this can be overridden on a per-step basis using the optional `verbose` override
 		argument of any given step.
+		
+		`instrumentation` specifies the `Instrumentation` object that will be used to record timed
+		spans (with file counts, byte counts and peak memory usage) for each of the packaging steps.
+		If this is not specified then a new `Instrumentation` object will be created. Either way, the
+		object can be retrieved by calling `instrumentation()` in order to export the recorded data
+		or register hooks.
+		
+		`pipelined` specifies whether staging and stripping should be deferred until the archive is
+		created. When enabled, `package()` leaves the "dist" subdirectory exactly as the Unreal
+		AutomationTool produced it, and `archive()` streams the "dist" subdirectory and the staged
+		items directly into the archive while skipping any files that would have been stripped. This
+		avoids copying staged items and deleting stripped files, so each byte is only read once.
+		Note that the "dist" subdirectory will not reflect staging or stripping in this mode.
+		
+		`archive_format` specifies the format used when compressing the packaged distribution. Any format
+		supported by `ArchiveUtils.compress()` can be used, including the multi-threaded "zstdtar" (.tar.zst)
+		and "xztar" (.tar.xz) formats, which are significantly faster than "zip" for large distributions.
+		
+		`archive_options` specifies any additional keyword arguments to pass to `ArchiveUtils.compress()`,
+		such as the compression `level`, the number of compression `threads`, or whether zstd should use
+		`long_distance` matching. An error is raised if any of the options do not apply to `archive_format`.
+		
+		`cache` specifies an `ArtifactStore` (or a local directory path, "s3://bucket/prefix" URI or
+		"gs://bucket/prefix" URI) that is used to cache packaged distributions. When a cache is specified,
+		`package()` computes a fingerprint of the build inputs (the descriptor, the Config, Content,
+		Plugins, Resources, Shaders and Source trees, the staged items, the packaging arguments, the strip
+		settings, the platform and the Engine installation). If the cache already holds a distribution
+		with a matching fingerprint then it is restored instead of running the Unreal AutomationTool,
+		and otherwise the newly packaged distribution is added to the cache.
+		
+		`fast_clean` specifies whether `clean()` (and the removal of the existing distribution when `package()`
+		restores a cached one) should move the directories being removed into a trash directory under "Saved"
+		and return immediately, leaving a `TrashReaper` to delete them in the background whilst the build
+		proceeds. In this mode, the Binaries and Intermediate subdirectories (including those of any project
+		plugins) are trashed directly rather than by running `ue4 clean`. Call `wait_for_cleanup()` to wait for
+		the deletions to complete.
 		'''
 		
 		# Parse the descriptor file for the root directory before we do anything else
@@ -62,12 +114,32 @@ class PackagerBase(object):
 		
 		# Keep track of whether or not verbose output is enabled
 		self._verbose = verbose
+		
+		# Store the instrumentation object that we will use to record timing information
+		self._instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+		
+		# Keep track of whether or not staging and stripping are deferred until archive time
+		self._pipelined = pipelined
+		
+		# Store the archive format and any additional options for the archiver
+		self._archive_format = archive_format
+		self._archive_options = archive_options
+		
+		# Store the artifact store used to cache packaged distributions, if any
+		self._cache = ArtifactStore.from_uri(cache) if cache is not None else None
+		
+		# Create the reaper used to delete trashed build artifacts in the background if fast cleaning is enabled
+		self._reaper = TrashReaper() if fast_clean == True else None
+		
+		# The file count and total size of the packaged distribution, which are tracked as the distribution is
+		# modified so that the instrumentation does not need to walk the "dist" subdirectory after every step
+		self._dist_totals = None
 	
 	def clean(self, preserve=False, verbose=None):
 		'''
 		Cleans any build artifacts leftover from a previous packaging run.
 		The "dist" subdirectory will be always be removed, along with
-		any .zip file matching our archive filename template string.
+		any archive file matching our archive filename template string.
 		
 		If the `preserve` argument is set to False then the `ue4 clean`
 		command will be run to clean any build artifacts residing outside
@@ -78,87 +150,259 @@ class PackagerBase(object):
 		
 		The `verbose` argument can be used to override the verbose output
 		setting that was set in the packager's constructor.
-		'''
-		
-		# Print progress information if verbose output is enabled
-		self._progress(verbose, 'Cleaning any existing build artifacts...')
 		
-		# Clean packaging artifacts
-		FilesystemUtils.remove(join(self._root, 'dist'))
-		FilesystemUtils.remove(join(self._root, '{}.zip'.format(self._archive)))
+		If fast cleaning was enabled in the packager's constructor then the artifacts are
+		deleted in the background, and `wait_for_cleanup()` can be used to wait for them.
+		'''
 		
-		# Unless requested otherwise, clean all build artifacts as well
-		if preserve == False:
-			subprocess.run(['ue4', 'clean'], cwd=self._root, check=True)
+		with self._instrumentation.span('clean', preserve=preserve, fast=self._reaper is not None):
+			
+			# Print progress information if verbose output is enabled
+			self._progress(verbose, 'Cleaning any existing build artifacts...')
+			
+			# Clean packaging artifacts
+			with self._instrumentation.span('clean.dist'):
+				self._dist_totals = None
+				self._remove(join(self._root, 'dist'))
+				self._remove(join(self._root, self._archive + ArchiveUtils.extension(self._archive_format)))
+			
+			# Unless requested otherwise, clean all build artifacts as well
+			if preserve == False:
+				with self._instrumentation.span('clean.ue4'):
+					if self._reaper is not None:
+						for directory in self._build_directories():
+							self._remove(directory)
+					else:
+						subprocess.run(['ue4', 'clean'], cwd=self._root, check=True)
 	
 	def package(self, args=[], verbose=None):
 		'''
 		Performs packaging, placing the packaged distribution in the "dist" subdirectory.
 		The `args` parameter can be used to specify any additional arguments to pass to the
 		`ue4 package` command, which will in turn be passed to the Unreal AutomationTool.
+		The output of the AutomationTool is parsed as it is produced, and the detected phases
+		(build, cook, stage, pak, package, archive), warnings, errors and cook progress are
+		published as "uat.*" events through our `Instrumentation` object. The phases are also
+		recorded as child spans of the "package.ue4" span once the AutomationTool completes.
 		If debug symbols and/or manifest files are being stripped, the relevant files will
 		be removed after any additional files or directories have been staged. (This ensures
 		debug symbols are stripped from the additional staged files as well, minimising output
-		distribution size.)
+		distribution size.) In pipelined mode, staging and stripping are instead performed by
+		`archive()` as the archive is written.
 		
 		The `verbose` argument can be used to override the verbose output
 		setting that was set in the packager's constructor.
-		'''
-		
-		# Print progress information if verbose output is enabled
-		self._progress(verbose, 'Performing packaging...')
 		
-		# Perform packaging
-		subprocess.run(['ue4', 'package'] + args, cwd=self._root, check=True)
+		If a cache was specified in the packager's constructor and it contains a distribution
+		whose build fingerprint matches the current build inputs, the cached distribution is
+		restored into the "dist" subdirectory and the Unreal AutomationTool is not run. The
+		fingerprint includes the contents of any existing Binaries directories, so binaries
+		kept by `clean(preserve=True)` are treated as build inputs.
+		'''
 		
-		# Stage any additional files or directories
-		for item in self._stage:
+		with self._instrumentation.span('package') as packageSpan:
+			
+			# If a cached distribution exists for the current build inputs then restore it
+			dist = join(self._root, 'dist')
+			key = self._cache_key(args, verbose) if self._cache is not None else None
+			if key is not None and self._restore_cached(key, dist, verbose) == True:
+				packageSpan.set(cache='hit')
+				self._dist_totals = FilesystemUtils.tree_size(dist)
+				packageSpan.add(files=self._dist_totals[0], bytes_out=self._dist_totals[1])
+				return
 			
 			# Print progress information if verbose output is enabled
-			self._progress(verbose, 'Staging "{}"...'.format(item))
+			self._progress(verbose, 'Performing packaging...')
 			
-			# Stage the file or directory, maintaining its relative path
-			source = join(self._root, item)
-			dest = join(self._root, 'dist', item)
-			FilesystemUtils.copy(source, dest)
-		
-		# Strip debug symbols and/or manifest files if requested
-		filters = self._strip_filters()
-		if len(filters) > 0:
+			# Perform packaging
+			with self._instrumentation.span('package.ue4', args=args) as span:
+				summary = self._run_uat(['ue4', 'package'] + args, verbose)
+				span.set(uat=summary)
+				self._dist_totals = FilesystemUtils.tree_size(dist)
+				span.add(files=self._dist_totals[0], bytes_out=self._dist_totals[1])
 			
-			# Print progress information if verbose output is enabled
-			self._progress(verbose, 'Stripping {}...'.format(self._strip_description()))
+			# Stage additional files and strip unwanted files, unless this is deferred until archive time
+			if self._pipelined == True:
+				self._progress(verbose, 'Staging and stripping will be performed during archiving.')
+			else:
+				self._stage_and_strip(dist, verbose)
 			
-			# Remove all relevant files
-			stripped = FilesystemUtils.remove_matching(join(self._root, 'dist'), filters)
+			# Record the totals for the packaged distribution
+			packageSpan.add(files=self._dist_totals[0], bytes_out=self._dist_totals[1])
 			
-			# Print the list of removed files if verbose output is enabled
-			self._progress(verbose, '\n'.join(
-				['Removed file "{}".'.format(f) for f in stripped]
-			))
+			# Add the packaged distribution to the cache if one was specified
+			if key is not None:
+				packageSpan.set(cache='miss')
+				self._store_cached(key, dist, verbose)
 	
 	def archive(self, verbose=None):
 		'''
-		Compresses the packaged distribution into a .zip file and returns the archive filename.
+		Compresses the packaged distribution into an archive file and returns the archive filename.
 		
 		The `verbose` argument can be used to override the verbose output
 		setting that was set in the packager's constructor.
 		'''
 		
-		# Print progress information if verbose output is enabled
-		self._progress(verbose, 'Compressing the packaged distribution...')
+		with self._instrumentation.span('archive', format=self._archive_format, pipelined=self._pipelined) as span:
+			
+			# Print progress information if verbose output is enabled
+			self._progress(verbose, 'Compressing the packaged distribution...')
+			
+			# In pipelined mode, stream the "dist" subdirectory and staged items directly into the archive
+			if self._pipelined == True:
+				archive, files, size = self._archive_pipelined(verbose)
+				span.add(files=files, bytes_in=size, bytes_out=os.path.getsize(archive))
+				return archive
+			
+			# If the "dist" directory contains only a single subdirectory then we use that as the archive root
+			archiveRoot = join(self._root, 'dist')
+			contents = list([join(archiveRoot, item) for item in os.listdir(archiveRoot)])
+			if len(contents) == 1 and isdir(contents[0]):
+				archiveRoot = contents[0]
+			
+			# Compress the packaged distribution (reusing the totals from `package()` if it was run by this packager)
+			archive = ArchiveUtils.compress(join(self._root, self._archive), self._archive_format, archiveRoot, **self._archive_options)
+			files, size = self._dist_totals if self._dist_totals is not None else FilesystemUtils.tree_size(archiveRoot)
+			span.add(files=files, bytes_in=size, bytes_out=os.path.getsize(archive))
+			return archive
+	
+	def instrumentation(self):
+		'''
+		Returns the `Instrumentation` object used to record timing information for the packaging steps.
+		The recorded data can be exported by calling `save_json()` or `save_chrome_trace()`, and custom
+		metrics backends can subscribe to notifications by calling `add_hook()`.
+		'''
+		return self._instrumentation
+	
+	def wait_for_cleanup(self, timeout=None):
+		'''
+		Blocks until all of the build artifacts removed in the background by fast cleaning have been deleted,
+		or until the specified timeout (in seconds) elapses. Returns True if all of the deletions completed, or
+		False if the timeout elapsed first. Returns True immediately if fast cleaning is not enabled.
+		'''
+		if self._reaper is None:
+			return True
+		
+		with self._instrumentation.span('clean.wait', pending=self._reaper.pending()):
+			return self._reaper.wait(timeout)
+	
+	
+	# "Private" methods
+	
+	def _archive_pipelined(self, verbose):
+		'''
+		Creates the archive directly from the "dist" subdirectory and the staged items, applying
+		our strip filters as exclusions. Returns a tuple containing the archive filename, and the
+		number of files and bytes that were included in the archive.
+		'''
+		
+		# Determine the top-level contents of the "dist" subdirectory as it would appear if staging had been performed
+		dist = join(self._root, 'dist')
+		contents = {item: join(dist, item) for item in os.listdir(dist)}
+		for item in self._stage:
+			components = normpath(item).split(os.sep)
+			if components[0] not in contents:
+				contents[components[0]] = join(self._root, components[0])
 		
 		# If the "dist" directory contains only a single subdirectory then we use that as the archive root
-		archiveRoot = join(self._root, 'dist')
-		contents = list([join(archiveRoot, item) for item in os.listdir(archiveRoot)])
-		if len(contents) == 1 and isdir(contents[0]):
-			archiveRoot = contents[0]
+		archiveRoot = dist
+		if len(contents) == 1:
+			name, path = list(contents.items())[0]
+			if isdir(path):
+				archiveRoot = join(dist, name)
+		
+		# Staged items are listed first so that they take precedence over files in the "dist" subdirectory
+		sources = []
+		for item in self._stage:
+			sources.append((join(self._root, item), relpath(join(dist, item), archiveRoot)))
+		if isdir(archiveRoot):
+			sources.append((archiveRoot, ''))
 		
-		# Compress the packaged distribution
-		return ArchiveUtils.compress(join(self._root, self._archive), 'zip', archiveRoot)
+		# Print progress information for each staged item if verbose output is enabled
+		for item in self._stage:
+			self._progress(verbose, 'Staging "{}"...'.format(item))
+		
+		# Stream the sources into the archive, skipping any files that match our strip filters and counting the files that are included
+		filters = self._strip_filters()
+		stripped = []
+		totals = [0, 0]
+		def include(path):
+			info = os.lstat(path)
+			if stat.S_ISDIR(info.st_mode) == False:
+				totals[0] += 1
+				totals[1] += info.st_size
+		if len(filters) > 0:
+			self._progress(verbose, 'Stripping {}...'.format(self._strip_description()))
+		archive = ArchiveUtils.compress_tree(
+			join(self._root, self._archive),
+			self._archive_format,
+			sources,
+			exclude=filters,
+			on_exclude=stripped.append,
+			on_include=include,
+			**self._archive_options
+		)
+		
+		# Print the list of skipped files if verbose output is enabled
+		if len(stripped) > 0:
+			self._progress(verbose, '\n'.join(
+				['Removed file "{}".'.format(f) for f in stripped]
+			))
+		
+		return (archive, totals[0], totals[1])
 	
+	def _build_directories(self):
+		'''
+		Returns the list of build artifact directories removed by `ue4 clean`
+		'''
+		roots = [self._root]
+		if self._extension() == '.uproject':
+			roots.extend(sorted(glob(join(self._root, 'Plugins', '*'))))
+		return [join(root, subdir) for root in roots for subdir in ['Binaries', 'Intermediate']]
 	
-	# "Private" methods
+	def _cache_key(self, args, verbose):
+		'''
+		Computes the build fingerprint for the current build inputs and returns the corresponding cache key
+		'''
+		with self._instrumentation.span('package.fingerprint') as span:
+			
+			# Print progress information if verbose output is enabled
+			self._progress(verbose, 'Computing build fingerprint...')
+			
+			# Fingerprint the descriptor and the build input trees, reusing the digests of unchanged files from previous runs
+			hasher = ContentHasher(index=join(self._root, HASH_INDEX), algorithm=STABLE_ALGORITHM)
+			fingerprint = BuildFingerprint(hasher)
+			fingerprint.add_file('descriptor', join(self._root, self._descriptor['Name'] + self._extension()))
+			for directory in FINGERPRINT_DIRECTORIES:
+				if isdir(join(self._root, directory)):
+					fingerprint.add_tree(directory, join(self._root, directory), exclude=GENERATED_DIRECTORIES)
+			
+			# Fingerprint any existing binaries, since `clean(preserve=True)` keeps prebuilt binaries (e.g. for other platforms) that are merged into the distribution
+			for directory in self._build_directories():
+				if os.path.basename(directory) == 'Binaries' and isdir(directory):
+					fingerprint.add_tree(relpath(directory, self._root).replace(os.sep, '/'), directory)
+			
+			# Fingerprint the staged items
+			fingerprint.add_value('stage', self._stage)
+			for item in self._stage:
+				fingerprint.add_tree('stage/{}'.format(item), join(self._root, item))
+			
+			# Fingerprint the packaging settings
+			fingerprint.add_value('args', args)
+			fingerprint.add_value('strip', {'debug': self._strip_debug, 'manifests': self._strip_manifests})
+			fingerprint.add_value('pipelined', self._pipelined)
+			fingerprint.add_value('platform', PlatformInfo.identifier())
+			
+			# Fingerprint the Engine installation
+			engineRoot = UnrealUtils.engine_root()
+			fingerprint.add_value('engine.root', engineRoot)
+			fingerprint.add_file('engine.version', join(engineRoot, 'Engine', 'Build', 'Build.version'))
+			
+			# The archive format is included in the key so that each format has its own cache entry
+			hasher.save()
+			digest = fingerprint.hexdigest()
+			span.set(fingerprint=digest, components=fingerprint.components(), hashing=hasher.stats())
+			return '{}/{}{}'.format(self._descriptor['Name'], digest, ArchiveUtils.extension(self._archive_format))
 	
 	def _extension(self):
 		'''
@@ -184,6 +428,139 @@ class PackagerBase(object):
 		if output == True:
 			print(message)
 	
+	def _remove(self, path):
+		'''
+		Removes a file or directory, moving it into the trash for background deletion if fast cleaning is enabled
+		'''
+		if self._reaper is not None:
+			self._reaper.trash(path, join(self._root, TRASH_DIRECTORY))
+		else:
+			FilesystemUtils.remove(path)
+	
+	def _restore_cached(self, key, dist, verbose):
+		'''
+		Restores the cached distribution with the specified key into the "dist" subdirectory.
+		Returns True if the cache contained the distribution, or False otherwise.
+		'''
+		with self._instrumentation.span('package.cache.restore', key=key, store=repr(self._cache)) as span:
+			
+			# Determine whether the cache contains the distribution
+			if self._cache.has(key) == False:
+				self._progress(verbose, 'Build cache miss for "{}" in "{}".'.format(key, self._cache))
+				self._instrumentation.event('cache.miss', key=key, store=repr(self._cache))
+				return False
+			
+			# Retrieve the cached archive and extract it into the "dist" subdirectory
+			self._progress(verbose, 'Build cache hit for "{}" in "{}", restoring the cached distribution...'.format(key, self._cache))
+			self._instrumentation.event('cache.hit', key=key, store=repr(self._cache))
+			self._remove(dist)
+			with tempfile.TemporaryDirectory() as tempDir:
+				archive = join(tempDir, 'dist' + ArchiveUtils.extension(self._archive_format))
+				self._cache.fetch(key, archive)
+				span.add(bytes_in=os.path.getsize(archive))
+				ArchiveUtils.extract(archive, dist)
+			
+			return True
+	
+	def _run_uat(self, command, verbose):
+		'''
+		Runs a command that invokes the Unreal AutomationTool, echoing its output whilst parsing it
+		for phase boundaries, warnings, errors and cook progress. Returns the parsed summary.
+		'''
+		
+		# Publish each parsed event through our instrumentation object
+		def publish(event):
+			details = dict(event)
+			self._instrumentation.event('uat.{}'.format(details.pop('type')), **details)
+		
+		# Echo each line of output as it is received, and feed it to the parser
+		parser = UATLogParser(on_event=publish)
+		def handle(line, stream):
+			print(line, file=stream, flush=True)
+			parser.feed(line)
+		
+		# Run the command, keeping only a small tail of the output for inclusion in any exception that is raised
+		runner = SubprocessRunner(max_concurrency=1, capture_limit=64 * 1024)
+		result = runner.run(
+			command,
+			cwd = self._root,
+			on_stdout = lambda line: handle(line, sys.stdout),
+			on_stderr = lambda line: handle(line, sys.stderr)
+		)
+		parser.finish()
+		
+		# Record each of the detected phases as a child span of the current span
+		summary = parser.summary()
+		for phase in summary['phases']:
+			self._instrumentation.record('package.ue4.{}'.format(phase['name']), phase['start'], phase['end'])
+		
+		# Print the timing summary if verbose output is enabled
+		self._progress(verbose, parser.format_summary())
+		
+		result.check()
+		return summary
+	
+	def _stage_and_strip(self, dist, verbose):
+		'''
+		Copies any additional files and directories into the "dist" subdirectory
+		and then removes any files matching our strip filters
+		'''
+		
+		# Stage any additional files or directories
+		for item in self._stage:
+			with self._instrumentation.span('package.stage', item=item) as span:
+				
+				# Print progress information if verbose output is enabled
+				self._progress(verbose, 'Staging "{}"...'.format(item))
+				
+				# Stage the file or directory, maintaining its relative path
+				source = join(self._root, item)
+				dest = join(self._root, 'dist', item)
+				existing = FilesystemUtils.tree_size(dest)
+				FilesystemUtils.copy(source, dest)
+				files, size = FilesystemUtils.tree_size(dest)
+				span.add(files=files, bytes_in=size, bytes_out=size)
+				self._dist_totals = (self._dist_totals[0] + files - existing[0], self._dist_totals[1] + size - existing[1])
+		
+		# Strip debug symbols and/or manifest files if requested
+		filters = self._strip_filters()
+		if len(filters) > 0:
+			with self._instrumentation.span('package.strip', filters=filters) as span:
+				
+				# Print progress information if verbose output is enabled
+				self._progress(verbose, 'Stripping {}...'.format(self._strip_description()))
+				
+				# Remove all relevant files, measuring each one as it is removed rather than walking the whole distribution again
+				removed = [0, 0]
+				def measure(path):
+					files, size = FilesystemUtils.tree_size(path)
+					removed[0] += files
+					removed[1] += size
+				filesBefore, sizeBefore = self._dist_totals
+				stripped = FilesystemUtils.remove_matching(dist, filters, on_remove=measure)
+				self._dist_totals = (filesBefore - removed[0], sizeBefore - removed[1])
+				span.add(files=removed[0], bytes_in=sizeBefore, bytes_out=self._dist_totals[1])
+				
+				# Print the list of removed files if verbose output is enabled
+				self._progress(verbose, '\n'.join(
+					['Removed file "{}".'.format(f) for f in stripped]
+				))
+	
+	def _store_cached(self, key, dist, verbose):
+		'''
+		Adds the contents of the "dist" subdirectory to the cache under the specified key
+		'''
+		with self._instrumentation.span('package.cache.store', key=key, store=repr(self._cache)) as span:
+			
+			# Print progress information if verbose output is enabled
+			self._progress(verbose, 'Adding the packaged distribution to the build cache "{}"...'.format(self._cache))
+			
+			# Compress the "dist" subdirectory and upload the archive
+			with tempfile.TemporaryDirectory() as tempDir:
+				archive = ArchiveUtils.compress(join(tempDir, 'dist'), self._archive_format, dist, **self._archive_options)
+				self._cache.store(key, archive)
+				span.add(bytes_out=os.path.getsize(archive))
+	
 	def _strip_description(self):
 		'''
 		Returns the description of the types of files that we are stripping
@@ -0,0 +1,522 @@
+from .BuildFingerprint import BuildFingerprint
+from .ContentHasher import ContentHasher
+from .Instrumentation import Instrumentation
+from .SubprocessRunner import SubprocessRunner
+from os.path import abspath, dirname, exists, join
+import collections, concurrent.futures, json, os, sys, threading, time, uuid
+
+# The name of the directory (relative to the pipeline file) that holds the pipeline state, logs and hash index
+PIPELINE_DIRECTORY = '.ue4helpers'
+
+# The version of the pipeline state file format
+STATE_SCHEMA = 1
+
+# The keys that are recognised in each step definition
+STEP_KEYS = ['command', 'needs', 'resources', 'inputs', 'exclude', 'outputs', 'cwd', 'env', 'timeout']
+
+# The step statuses that allow dependent steps to run
+SUCCESSFUL_STATUSES = ['succeeded', 'skipped']
+
+
+class PipelineStep(object):
+	'''
+	Represents a single step of a pipeline, along with the outcome of running it
+	'''
+	
+	def __init__(self, name, details):
+		self.name = name
+		self.command = details['command']
+		self.needs = list(details.get('needs', []))
+		self.resources = dict(details.get('resources', {}))
+		self.inputs = details.get('inputs')
+		self.exclude = list(details.get('exclude', []))
+		self.outputs = list(details.get('outputs', []))
+		self.cwd = details.get('cwd', '.')
+		self.env = dict(details.get('env', {}))
+		self.timeout = details.get('timeout')
+		self.status = 'pending'
+		self.fingerprint = None
+		self.ready = None
+		self.started = None
+		self.finished = None
+		self.returncode = None
+		self.blocked_by = None
+		self.log = None
+		self.error = None
+	
+	@property
+	def duration(self):
+		'''
+		Returns the wall time taken by the step in seconds
+		'''
+		return (self.finished - self.started) if self.started is not None and self.finished is not None else None
+	
+	@property
+	def waited(self):
+		'''
+		Returns the time in seconds that the step spent waiting for resources after its dependencies completed
+		'''
+		return (self.started - self.ready) if self.started is not None and self.ready is not None else None
+	
+	def to_dict(self):
+		'''
+		Returns a JSON-compatible representation of the step and its outcome
+		'''
+		return {
+			'name': self.name,
+			'status': self.status,
+			'needs': self.needs,
+			'resources': self.resources,
+			'ready': self.ready,
+			'started': self.started,
+			'finished': self.finished,
+			'duration': self.duration,
+			'waited': self.waited,
+			'blocked_by': self.blocked_by,
+			'returncode': self.returncode,
+			'log': self.log,
+			'error': self.error
+		}
+
+
+class PipelineRunner(object):
+	'''
+	Runs a declarative pipeline of shell commands whose dependencies form a directed acyclic graph.
+	Independent steps run concurrently, subject to a limit on the total number of concurrent steps and
+	to named resource limits (e.g. at most one AutomationTool invocation but many uploads at once.)
+	Ready steps are started in order of the longest remaining path through the graph, using the step
+	durations recorded by previous runs, so that the critical path is never held up by other work.
+	
+	A pipeline is a JSON (or YAML, if PyYAML is installed) document of the following form:
+		
+		{
+			"resources": {"uat": 1, "upload": 8},
+			"steps": {
+				"package": {
+					"command": ["python3", "build.py"],
+					"resources": {"uat": 1},
+					"inputs": ["Config", "Content", "Source", "build.py"],
+					"outputs": ["dist"]
+				},
+				"upload": {
+					"command": "python3 upload.py",
+					"needs": ["package"],
+					"resources": {"upload": 1}
+				}
+			}
+		}
+	
+	Each step supports the following keys:
+	
+	- `command`: the command to run, either as a list of arguments or as a string to be run by the shell
+	- `needs`: the names of the steps that must succeed before this step can run
+	- `resources`: the number of units of each named resource that the step holds while it runs
+	- `inputs`: the files and directories that the step reads. A step that declares its inputs is skipped
+	  when its command, environment, inputs and upstream steps are unchanged since it last succeeded and
+	  all of its `outputs` exist. Steps that do not declare their inputs always run, as do their dependents.
+	- `exclude`: patterns for file and directory names to ignore when hashing the inputs
+	- `outputs`: the files and directories that the step produces
+	- `cwd`: the working directory for the command (defaults to the pipeline directory)
+	- `env`: additional environment variables for the command
+	- `timeout`: the maximum number of seconds that the command can run for
+	
+	Relative paths are resolved against the directory containing the pipeline file.
+	'''
+	
+	def __init__(self, pipeline, root='.', jobs=None, resources={}, force=False, echo=True, instrumentation=None):
+		'''
+		Creates a new PipelineRunner for the specified pipeline definition (see `load()` to read one from a file.)
+		
+		`root` specifies the directory that relative paths are resolved against, and that holds the pipeline
+		state (the fingerprints and durations of previous runs), the per-step logs and the hash index.
+		
+		`jobs` specifies the maximum number of steps that can run at once (defaults to the number of CPU cores.)
+		
+		`resources` specifies resource limits that override those declared by the pipeline.
+		
+		`force` specifies whether steps should be run even when their inputs are unchanged.
+		
+		`echo` specifies whether the output of each step should be printed (prefixed with the step name)
+		in addition to being written to the step's log file.
+		
+		`instrumentation` specifies the `Instrumentation` object that will be used to record a span for each step.
+		'''
+		self._root = abspath(root)
+		self._jobs = jobs if jobs is not None else (os.cpu_count() or 1)
+		self._force = force
+		self._echo = echo
+		self._instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+		self._directory = join(self._root, PIPELINE_DIRECTORY)
+		self._lock = threading.Lock()
+		
+		# Parse and validate the pipeline definition
+		self._capacity = dict(pipeline.get('resources', {}))
+		self._capacity.update(resources)
+		self._definitions = pipeline.get('steps', {})
+		self._steps = collections.OrderedDict()
+		for name, details in self._definitions.items():
+			self._steps[name] = self._parse_step(name, details)
+		self._order = self._topological_order()
+		self._selected = set()
+		
+		# Load the state from previous runs
+		self._state_file = join(self._directory, 'pipeline-state.json')
+		self._state = self._load_state()
+		self._hasher = ContentHasher(index=join(self._directory, 'content-hash-index.json'))
+		self._runner = SubprocessRunner(max_concurrency=self._jobs, capture_limit=64 * 1024)
+	
+	@staticmethod
+	def load(filename, **kwargs):
+		'''
+		Creates a PipelineRunner for the pipeline defined in the specified JSON or YAML file, resolving
+		relative paths against the file's directory. The keyword arguments are passed to the constructor.
+		'''
+		with open(filename, 'r') as f:
+			if filename.lower().endswith(('.yml', '.yaml')):
+				try:
+					import yaml
+				except ImportError:
+					raise RuntimeError('PyYAML is required to load YAML pipeline files, install it with `pip install pyyaml`')
+				pipeline = yaml.safe_load(f)
+			else:
+				pipeline = json.load(f, object_pairs_hook=collections.OrderedDict)
+		
+		kwargs.setdefault('root', dirname(abspath(filename)))
+		return PipelineRunner(pipeline, **kwargs)
+	
+	def instrumentation(self):
+		'''
+		Returns the `Instrumentation` object used to record the timing of each step
+		'''
+		return self._instrumentation
+	
+	def run(self, targets=None, check=True):
+		'''
+		Runs the specified target steps and all of the steps that they depend on (defaults to every step),
+		and returns the timing report (see `report()`.) A failed step prevents its dependents from running,
+		but does not stop independent steps. If `check` is True then an exception is raised once all of the
+		runnable steps have completed if any step failed.
+		'''
+		selected = self._select(targets)
+		self._selected = selected
+		for name in selected:
+			self._steps[name] = PipelineStep(name, self._definitions[name])
+		priorities = self._priorities(selected)
+		pending = [name for name in self._order if name in selected]
+		available = dict(self._capacity)
+		running = {}
+		deferred = set()
+		released = []
+		
+		os.makedirs(join(self._directory, 'logs'), exist_ok=True)
+		with concurrent.futures.ThreadPoolExecutor(max_workers=self._jobs) as executor:
+			while len(pending) > 0 or len(running) > 0:
+				
+				# Steps whose dependencies failed can never run
+				for name in list(pending):
+					if any([self._steps[dep].status not in SUCCESSFUL_STATUSES + ['pending', 'running'] for dep in self._steps[name].needs]):
+						self._steps[name].status = 'blocked'
+						pending.remove(name)
+				
+				# Start each ready step that fits within the available resources, in order of priority
+				ready = [name for name in pending if all([self._steps[dep].status in SUCCESSFUL_STATUSES for dep in self._steps[name].needs])]
+				for name in sorted(ready, key=lambda name: -priorities[name]):
+					step = self._steps[name]
+					if step.ready is None:
+						step.ready = time.time()
+					if len(running) < self._jobs and all([available[r] >= count for r, count in step.resources.items()]):
+						for resource, count in step.resources.items():
+							available[resource] -= count
+						
+						# If the step had to wait, record the step whose completion released what it was waiting for
+						if name in deferred:
+							step.blocked_by = self._releaser(step, released)
+						
+						step.status = 'running'
+						pending.remove(name)
+						running[executor.submit(self._execute, step)] = step
+					else:
+						deferred.add(name)
+				
+				if len(running) == 0:
+					break
+				
+				# Wait for at least one of the running steps to complete and release its resources
+				done, _ = concurrent.futures.wait(list(running.keys()), return_when=concurrent.futures.FIRST_COMPLETED)
+				released = []
+				for future in done:
+					step = running.pop(future)
+					released.append(step)
+					for resource, count in step.resources.items():
+						available[resource] += count
+		
+		self._runner.shutdown()
+		self._hasher.save()
+		
+		report = self.report()
+		failed = [name for name, step in report['steps'].items() if step['status'] in ['failed', 'blocked']]
+		if check == True and len(failed) > 0:
+			raise RuntimeError('pipeline steps did not complete: {}'.format(', '.join(failed)))
+		return report
+	
+	def report(self):
+		'''
+		Returns a dictionary describing the outcome of the most recent run, containing the `wall_time`, the
+		sum of the step durations (`step_time`), the average `parallelism`, the `critical_path` (the chain of
+		dependent steps that determined the wall time) and its duration (`critical_path_time`), and the
+		outcome and timing of each of the `steps` that were selected to run.
+		'''
+		steps = [step for step in self._steps.values() if step.finished is not None]
+		started = min([step.started for step in steps]) if len(steps) > 0 else None
+		finished = max([step.finished for step in steps]) if len(steps) > 0 else None
+		wall = (finished - started) if len(steps) > 0 else 0.0
+		total = sum([step.duration for step in steps])
+		
+		# Walk backwards from the last step to finish. Each step was held up either by the dependency that finished
+		# last or, if it then had to wait for a resource or a free slot, by the step that released it (as recorded by
+		# `run()`, falling back to the last step that finished before it started for reports without that record.)
+		path = []
+		current = max(steps, key=lambda step: step.finished) if len(steps) > 0 else None
+		while current is not None:
+			path.insert(0, current.name)
+			if current.blocked_by is not None and current.blocked_by in self._steps:
+				blockers = [self._steps[current.blocked_by]]
+			elif current.waited is not None and current.waited > 0.01:
+				blockers = [step for step in steps if step is not current and step.finished <= current.started + 0.01]
+			else:
+				blockers = [self._steps[dep] for dep in current.needs if self._steps[dep].finished is not None]
+			current = max(blockers, key=lambda step: step.finished) if len(blockers) > 0 else None
+		
+		return {
+			'wall_time': wall,
+			'step_time': total,
+			'parallelism': (total / wall) if wall > 0 else None,
+			'critical_path': path,
+			'critical_path_time': sum([self._steps[name].duration for name in path]),
+			'steps': collections.OrderedDict([(name, step.to_dict()) for name, step in self._steps.items() if name in self._selected])
+		}
+	
+	def save_report(self, filename):
+		'''
+		Writes the timing report for the most recent run to a JSON file
+		'''
+		with open(filename, 'w') as f:
+			json.dump(self.report(), f, indent=4)
+	
+	@staticmethod
+	def format_report(report):
+		'''
+		Formats a timing report as a human-readable table, with the steps on the critical path marked
+		'''
+		width = max([len(name) for name in report['steps'].keys()] + [4])
+		lines = ['{}  {:<9}  {:>9}  {:>9}'.format('Step'.ljust(width + 2), 'Status', 'Duration', 'Waited')]
+		for name, step in report['steps'].items():
+			lines.append('{}{}  {:<9}  {:>9}  {:>9}'.format(
+				'* ' if name in report['critical_path'] else '  ',
+				name.ljust(width),
+				step['status'],
+				'{:.1f}s'.format(step['duration']) if step['duration'] is not None else '-',
+				'{:.1f}s'.format(step['waited']) if step['waited'] is not None else '-'
+			))
+		
+		lines.append('')
+		lines.append('Wall time: {:.1f}s (critical path {:.1f}s: {})'.format(
+			report['wall_time'],
+			report['critical_path_time'],
+			' -> '.join(report['critical_path']) if len(report['critical_path']) > 0 else 'none'
+		))
+		if report['parallelism'] is not None:
+			lines.append('Step time: {:.1f}s (average parallelism {:.2f})'.format(report['step_time'], report['parallelism']))
+		return '\n'.join(lines)
+	
+	
+	# "Private" methods
+	
+	def _execute(self, step):
+		'''
+		Runs a single step (or skips it if its inputs are unchanged), streaming its output to its log file
+		'''
+		step.started = time.time()
+		try:
+			
+			# Skip the step if it succeeded previously with identical inputs and its outputs still exist
+			step.fingerprint = self._fingerprint(step)
+			previous = self._state['steps'].get(step.name, {})
+			outputs = all([exists(join(self._root, output)) for output in step.outputs])
+			if self._force == False and step.fingerprint is not None and previous.get('fingerprint') == step.fingerprint and outputs == True:
+				step.status = 'skipped'
+				self._print(step.name, 'inputs unchanged, skipping', sys.stdout)
+				return
+			
+			# Run the command, writing its output to the log file and optionally echoing it
+			step.log = join(self._directory, 'logs', '{}.log'.format(step.name))
+			with open(step.log, 'w') as log:
+				def handle(line, stream):
+					with self._lock:
+						log.write(line + '\n')
+					if self._echo == True:
+						self._print(step.name, line, stream)
+				
+				env = dict(os.environ)
+				env.update({key: str(value) for key, value in step.env.items()})
+				result = self._runner.run(
+					step.command,
+					timeout = step.timeout,
+					shell = isinstance(step.command, str),
+					cwd = join(self._root, step.cwd),
+					env = env,
+					on_stdout = lambda line: handle(line, sys.stdout),
+					on_stderr = lambda line: handle(line, sys.stderr)
+				)
+			
+			step.returncode = result.returncode
+			if result.timed_out == True:
+				step.error = 'timed out after {} seconds'.format(step.timeout)
+			elif result.returncode != 0:
+				step.error = 'exited with code {}'.format(result.returncode)
+			step.status = 'succeeded' if step.error is None else 'failed'
+			self._print(step.name, step.status if step.error is None else 'failed ({})'.format(step.error), sys.stdout)
+		
+		except Exception as err:
+			step.status = 'failed'
+			step.error = repr(err)
+			self._print(step.name, 'failed ({})'.format(step.error), sys.stderr)
+		
+		finally:
+			step.finished = time.time()
+			self._instrumentation.record('pipeline.{}'.format(step.name), step.started, step.finished, status=step.status)
+			self._update_state(step)
+	
+	def _fingerprint(self, step):
+		'''
+		Computes the fingerprint of a step's inputs, or returns None if the step cannot be skipped
+		'''
+		if step.inputs is None or any([self._steps[dep].fingerprint is None for dep in step.needs]):
+			return None
+		
+		fingerprint = BuildFingerprint(self._hasher)
+		fingerprint.add_value('command', step.command)
+		fingerprint.add_value('cwd', step.cwd)
+		fingerprint.add_value('env', step.env)
+		for dep in step.needs:
+			fingerprint.add_value('needs:{}'.format(dep), self._steps[dep].fingerprint)
+		for path in step.inputs:
+			fingerprint.add_tree('input:{}'.format(path), join(self._root, path), step.exclude)
+		return fingerprint.hexdigest()
+	
+	def _load_state(self):
+		'''
+		Loads the fingerprints and durations recorded by previous runs, discarding them if they are unreadable
+		'''
+		try:
+			with open(self._state_file, 'r') as f:
+				state = json.load(f)
+			if state.get('schema') == STATE_SCHEMA:
+				return state
+		except (OSError, ValueError):
+			pass
+		
+		return {'schema': STATE_SCHEMA, 'steps': {}}
+	
+	def _parse_step(self, name, details):
+		'''
+		Validates a step definition and returns the corresponding PipelineStep
+		'''
+		unknown = [key for key in details.keys() if key not in STEP_KEYS]
+		if len(unknown) > 0:
+			raise RuntimeError('step "{}" contains unknown keys: {}'.format(name, ', '.join(unknown)))
+		if 'command' not in details:
+			raise RuntimeError('step "{}" does not specify a command'.format(name))
+		
+		step = PipelineStep(name, details)
+		for resource, count in step.resources.items():
+			if resource not in self._capacity:
+				raise RuntimeError('step "{}" uses undeclared resource "{}"'.format(name, resource))
+			if count > self._capacity[resource]:
+				raise RuntimeError('step "{}" needs {} units of resource "{}" but only {} are available'.format(name, count, resource, self._capacity[resource]))
+		return step
+	
+	def _print(self, name, line, stream):
+		'''
+		Prints a line of output for a step, prefixed with the step's name
+		'''
+		with self._lock:
+			print('[{}] {}'.format(name, line), file=stream, flush=True)
+	
+	def _priorities(self, selected):
+		'''
+		Returns the estimated duration of the longest path from each selected step to the end of the
+		pipeline, using the durations recorded by previous runs (or one second for steps not yet run)
+		'''
+		priorities = {}
+		for name in reversed(self._order):
+			if name in selected:
+				dependents = [other for other in selected if name in self._steps[other].needs]
+				duration = self._state['steps'].get(name, {}).get('duration') or 1.0
+				priorities[name] = duration + max([priorities[other] for other in dependents] + [0.0])
+		return priorities
+	
+	def _releaser(self, step, released):
+		'''
+		Determines which of the steps that have just completed allowed a waiting step to start. A step that released
+		one of the resources that the waiting step needs takes precedence over one that only released a job slot.
+		'''
+		holders = [other for other in released if any([other.resources.get(r, 0) > 0 for r in step.resources.keys()])]
+		candidates = holders if len(holders) > 0 else released
+		return max(candidates, key=lambda other: other.finished).name if len(candidates) > 0 else None
+	
+	def _select(self, targets):
+		'''
+		Returns the set of steps required to run the specified targets (or all steps if none are specified)
+		'''
+		if targets is None or len(targets) == 0:
+			return set(self._steps.keys())
+		
+		selected = set()
+		pending = list(targets)
+		while len(pending) > 0:
+			name = pending.pop()
+			if name not in self._steps:
+				raise RuntimeError('unknown pipeline step "{}"'.format(name))
+			if name not in selected:
+				selected.add(name)
+				pending.extend(self._steps[name].needs)
+		return selected
+	
+	def _topological_order(self):
+		'''
+		Returns the step names in dependency order (preserving the order of definition where possible),
+		raising an error if a dependency is unknown or the dependencies contain a cycle
+		'''
+		for step in self._steps.values():
+			for dep in step.needs:
+				if dep not in self._steps:
+					raise RuntimeError('step "{}" needs unknown step "{}"'.format(step.name, dep))
+		
+		order = []
+		remaining = list(self._steps.keys())
+		while len(remaining) > 0:
+			ready = [name for name in remaining if all([dep in order for dep in self._steps[name].needs])]
+			if len(ready) == 0:
+				raise RuntimeError('pipeline steps contain a dependency cycle: {}'.format(', '.join(remaining)))
+			order.extend(ready)
+			remaining = [name for name in remaining if name not in ready]
+		return order
+	
+	def _update_state(self, step):
+		'''
+		Records the outcome of a step in the pipeline state file, so that an interrupted pipeline keeps its progress
+		'''
+		with self._lock:
+			if step.status == 'succeeded':
+				self._state['steps'][step.name] = {'fingerprint': step.fingerprint, 'duration': step.duration}
+			elif step.status == 'failed':
+				self._state['steps'].pop(step.name, None)
+			else:
+				return
+			
+			# Write to a temporary file and then move it into place so that an interrupted write never corrupts the state
+			temp = '{}.{}.tmp'.format(self._state_file, uuid.uuid4().hex)
+			with open(temp, 'w') as f:
+				json.dump(self._state, f, indent=4)
+			os.replace(temp, self._state_file)
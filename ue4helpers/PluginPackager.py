@@ -5,13 +5,13 @@ class PluginPackager(PackagerBase):
 	Provides functionality for packaging an Unreal plugin.
 	'''
 	
-	def __init__(self, root, version, archive='{name}-{version}-{platform}', strip_debug=False, strip_manifests=False, stage=[], verbose=True):
+	def __init__(self, root, version, archive='{name}-{version}-{platform}', strip_debug=False, strip_manifests=False, stage=[], verbose=True, instrumentation=None, pipelined=False, archive_format='zip', archive_options={}, cache=None, fast_clean=False):
 		'''
 		Creates a new PluginPackager with the specified configuration.
 		
 		See `PackagerBase.__init__()` for details on the input parameters.
 		'''
-		super().__init__(root, version, archive, strip_debug, strip_manifests, stage, verbose)
+		super().__init__(root, version, archive, strip_debug, strip_manifests, stage, verbose, instrumentation, pipelined, archive_format, archive_options, cache, fast_clean)
 	
 	
 	# "Private" methods
@@ -0,0 +1,350 @@
+from .FilesystemUtils import FilesystemUtils
+from os.path import exists
+import base64, binascii, concurrent.futures, hashlib, json, os, threading, time, uuid
+
+# The size of the blocks read from each response
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# The number of bytes downloaded by a segment between each update of the resume state file
+STATE_SAVE_INTERVAL = 8 * 1024 * 1024
+
+# The version of the resume state file format
+STATE_SCHEMA = 1
+
+# The digest length (in hexadecimal digits) of each supported checksum algorithm, used to infer the algorithm of bare digests
+CHECKSUM_LENGTHS = {32: 'md5', 40: 'sha1', 64: 'sha256', 128: 'sha512'}
+
+class SegmentedDownloader(object):
+	'''
+	Downloads files over HTTP(S) using multiple concurrent byte-range requests over a pooled session.
+	Progress is recorded in a sidecar state file ("<filename>.part.json") alongside the partially
+	downloaded data ("<filename>.part"), so that an interrupted download resumes where it left off
+	rather than starting again from zero. Completed downloads are verified against a checksum, which
+	can either be supplied by the caller or advertised by the server.
+	
+	Servers that do not support range requests (or do not report the size of the file) are handled
+	by falling back to a single streamed request, which cannot be resumed.
+	'''
+	
+	def __init__(self, segments=8, min_segment_size=8 * 1024 * 1024, retries=3, timeout=60, session=None):
+		'''
+		Creates a new SegmentedDownloader.
+		
+		`segments` specifies the maximum number of byte ranges that are downloaded concurrently.
+		
+		`min_segment_size` specifies the minimum size of each byte range, so that small files are not split
+		into more segments than is worthwhile.
+		
+		`retries` specifies the number of times a failed segment is retried (resuming from where it left off)
+		before the download fails.
+		
+		`timeout` specifies the connection and read timeout for each request, in seconds.
+		
+		`session` specifies the `requests.Session` to use. If this is not specified then a new session is
+		created with a connection pool large enough for all of the segments.
+		'''
+		self._segments = max(1, segments)
+		self._min_segment_size = min_segment_size
+		self._retries = retries
+		self._timeout = timeout
+		self._session = session if session is not None else self._create_session()
+		self._lock = threading.Lock()
+	
+	def download(self, url, filename, checksum=None):
+		'''
+		Downloads the specified URL to the specified file, resuming any previous partial download.
+		
+		`checksum` specifies the expected checksum of the file, either as "algorithm:hexdigest" (e.g.
+		"sha256:...") or as a bare hexadecimal digest whose algorithm is inferred from its length. If this
+		is not specified then any checksum advertised by the server is used instead (from the `Digest`,
+		`Content-MD5`, `x-goog-hash`, `x-amz-checksum-sha256` or `X-Checksum-*` response headers.)
+		
+		Returns a dictionary of statistics containing the `url`, the file `size`, the number of `bytes`
+		downloaded (which excludes any data from a previous partial download), the elapsed `seconds`,
+		whether the download was `resumed`, the `checksum` that was verified (or None), and a list of
+		`segments` containing the `start`, `end`, `bytes`, `seconds` and `throughput` (in bytes per second)
+		for each segment that was downloaded.
+		'''
+		started = time.time()
+		partial = filename + '.part'
+		stateFile = filename + '.part.json'
+		
+		# Retrieve the file details from the server
+		location, headers, size, ranges = self._probe(url)
+		expected = self._parse_checksum(checksum) if checksum is not None else self._advertised_checksum(headers)
+		identity = {
+			'url': url,
+			'size': size,
+			'etag': headers.get('ETag'),
+			'last_modified': headers.get('Last-Modified')
+		}
+		
+		# Determine whether we can resume a previous partial download, and otherwise start a new one
+		state = self._load_state(stateFile, identity) if ranges == True else None
+		resumed = state is not None and exists(partial)
+		if resumed == False:
+			state = dict(identity, schema=STATE_SCHEMA, segments=self._plan_segments(size) if ranges == True else None)
+			with open(partial, 'wb') as f:
+				if ranges == True:
+					FilesystemUtils.preallocate(f, size)
+		
+		# Download the data, using a single request if the server does not support range requests
+		if ranges == True:
+			segments = self._download_segments(location, partial, stateFile, state)
+		else:
+			segments = [self._download_single(location, partial)]
+		
+		# Verify the checksum of the downloaded data
+		if expected is not None:
+			algorithm, digest = expected
+			actual = self._hash_file(partial, algorithm)
+			if actual != digest:
+				FilesystemUtils.remove(partial)
+				FilesystemUtils.remove(stateFile)
+				raise RuntimeError('checksum mismatch for "{}": expected {} {} but received {}'.format(url, algorithm, digest, actual))
+		
+		# Move the completed download into place and discard the resume state
+		os.replace(partial, filename)
+		FilesystemUtils.remove(stateFile)
+		
+		return {
+			'url': url,
+			'size': os.path.getsize(filename),
+			'bytes': sum([s['bytes'] for s in segments]),
+			'seconds': time.time() - started,
+			'resumed': resumed,
+			'checksum': '{}:{}'.format(*expected) if expected is not None else None,
+			'segments': segments
+		}
+	
+	
+	# "Private" methods
+	
+	def _advertised_checksum(self, headers):
+		'''
+		Extracts a checksum from the response headers, returning an (algorithm, hexdigest) tuple or None
+		'''
+		
+		# Checksums from RFC 3230 `Digest` headers and Google Cloud Storage `x-goog-hash` headers are base64-encoded
+		encoded = {}
+		for header in ['Digest', 'x-goog-hash']:
+			for item in headers.get(header, '').split(','):
+				if '=' in item:
+					algorithm, value = item.strip().split('=', 1)
+					encoded[algorithm.lower().replace('-', '')] = value
+		if 'Content-MD5' in headers:
+			encoded['md5'] = headers['Content-MD5']
+		if 'x-amz-checksum-sha256' in headers:
+			encoded['sha256'] = headers['x-amz-checksum-sha256']
+		
+		for algorithm in ['sha512', 'sha256', 'sha1', 'md5']:
+			if algorithm in encoded:
+				try:
+					return (algorithm, binascii.hexlify(base64.b64decode(encoded[algorithm])).decode('ascii'))
+				except (binascii.Error, ValueError):
+					pass
+		
+		# Artifactory and Nexus `X-Checksum-*` headers are hexadecimal
+		for algorithm in ['sha256', 'sha1', 'md5']:
+			value = headers.get('X-Checksum-{}'.format(algorithm.capitalize()))
+			if value is not None:
+				return (algorithm, value.lower())
+		
+		return None
+	
+	def _create_session(self):
+		'''
+		Creates a `requests.Session` with a connection pool that is large enough for all of our segments
+		'''
+		import requests, requests.adapters
+		session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections=self._segments, pool_maxsize=self._segments)
+		session.mount('http://', adapter)
+		session.mount('https://', adapter)
+		return session
+	
+	def _download_segment(self, url, partial, stateFile, state, segment):
+		'''
+		Downloads the remaining data for a single segment, retrying from the last received byte upon failure
+		'''
+		started = time.time()
+		received = 0
+		attempt = 0
+		with open(partial, 'r+b') as f:
+			
+			# Progress is only recorded in the segment (and therefore the state file) once the data has been flushed
+			unflushed = [0]
+			def record():
+				f.flush()
+				with self._lock:
+					segment['done'] += unflushed[0]
+				unflushed[0] = 0
+				self._save_state(stateFile, state)
+			
+			while segment['done'] < segment['end'] - segment['start'] + 1:
+				try:
+					
+					# Request the remaining byte range for the segment
+					first = segment['start'] + segment['done']
+					headers = {'Range': 'bytes={}-{}'.format(first, segment['end']), 'Accept-Encoding': 'identity'}
+					with self._session.get(url, headers=headers, stream=True, timeout=self._timeout) as response:
+						response.raise_for_status()
+						if response.status_code != 206:
+							raise RuntimeError('server did not honour the range request for "{}"'.format(url))
+						
+						# Write the data as it is received, periodically recording our progress
+						f.seek(first)
+						for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+							f.write(chunk)
+							received += len(chunk)
+							unflushed[0] += len(chunk)
+							if unflushed[0] >= STATE_SAVE_INTERVAL:
+								record()
+					
+					# Record our progress once the response is complete, treating a response that ended early as a failure
+					record()
+					if segment['done'] < segment['end'] - segment['start'] + 1:
+						raise RuntimeError('connection closed early for "{}"'.format(url))
+					
+				except Exception:
+					record()
+					attempt += 1
+					if attempt > self._retries:
+						raise
+					time.sleep(min(2 ** attempt, 30))
+		
+		elapsed = time.time() - started
+		return {
+			'start': segment['start'],
+			'end': segment['end'],
+			'bytes': received,
+			'seconds': elapsed,
+			'throughput': received / elapsed if elapsed > 0 else None
+		}
+	
+	def _download_segments(self, url, partial, stateFile, state):
+		'''
+		Downloads all of the incomplete segments concurrently, returning the statistics for each segment
+		'''
+		pending = [s for s in state['segments'] if s['done'] < s['end'] - s['start'] + 1]
+		self._save_state(stateFile, state)
+		with concurrent.futures.ThreadPoolExecutor(max_workers=self._segments) as executor:
+			futures = [executor.submit(self._download_segment, url, partial, stateFile, state, s) for s in pending]
+			return [future.result() for future in futures]
+	
+	def _download_single(self, url, partial):
+		'''
+		Downloads the file using a single streamed request, returning the statistics for the request
+		'''
+		started = time.time()
+		received = 0
+		with self._session.get(url, stream=True, timeout=self._timeout) as response:
+			response.raise_for_status()
+			response.raw.decode_content = True
+			with open(partial, 'wb') as f:
+				for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+					f.write(chunk)
+					received += len(chunk)
+		
+		elapsed = time.time() - started
+		return {
+			'start': 0,
+			'end': received - 1,
+			'bytes': received,
+			'seconds': elapsed,
+			'throughput': received / elapsed if elapsed > 0 else None
+		}
+	
+	def _hash_file(self, filename, algorithm):
+		'''
+		Computes the hexadecimal digest of a file using the specified algorithm
+		'''
+		digest = hashlib.new(algorithm)
+		with open(filename, 'rb') as f:
+			for block in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+				digest.update(block)
+		return digest.hexdigest()
+	
+	def _load_state(self, stateFile, identity):
+		'''
+		Loads the resume state for a previous partial download, provided that it refers to the same version of the same file
+		'''
+		if not exists(stateFile):
+			return None
+		
+		try:
+			with open(stateFile, 'r') as f:
+				state = json.load(f)
+		except (OSError, ValueError):
+			return None
+		
+		matches = all([state.get(key) == value for key, value in identity.items()])
+		return state if state.get('schema') == STATE_SCHEMA and matches == True else None
+	
+	def _parse_checksum(self, checksum):
+		'''
+		Parses a checksum string into an (algorithm, hexdigest) tuple
+		'''
+		if ':' in checksum:
+			algorithm, digest = checksum.split(':', 1)
+		else:
+			algorithm, digest = CHECKSUM_LENGTHS.get(len(checksum)), checksum
+			if algorithm is None:
+				raise RuntimeError('could not determine the algorithm for the checksum "{}"'.format(checksum))
+		
+		algorithm = algorithm.lower().replace('-', '')
+		if algorithm not in hashlib.algorithms_available:
+			raise RuntimeError('unsupported checksum algorithm "{}"'.format(algorithm))
+		return (algorithm, digest.lower())
+	
+	def _plan_segments(self, size):
+		'''
+		Divides a file of the specified size into byte-range segments
+		'''
+		if size == 0:
+			return []
+		
+		count = max(1, min(self._segments, size // self._min_segment_size))
+		length = -(-size // count)
+		return [
+			{'start': start, 'end': min(start + length, size) - 1, 'done': 0}
+			for start in range(0, size, length)
+		]
+	
+	def _probe(self, url):
+		'''
+		Retrieves the details of the file at the specified URL, returning a tuple of the final URL (after any redirects),
+		the response headers, the file size (or None) and whether the server supports range requests. Servers that
+		reject HEAD requests (e.g. presigned S3 and GCS URLs, which are only signed for GET) are probed with a GET
+		request for the first byte of the file instead.
+		'''
+		response = self._session.head(url, headers={'Accept-Encoding': 'identity'}, allow_redirects=True, timeout=self._timeout)
+		if response.ok == True:
+			size = int(response.headers['Content-Length']) if 'Content-Length' in response.headers else None
+			ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes' and size is not None
+			return response.url, response.headers, size, ranges
+		
+		# A server that honours the range request reports the full size of the file in the `Content-Range` header
+		headers = {'Range': 'bytes=0-0', 'Accept-Encoding': 'identity'}
+		with self._session.get(url, headers=headers, stream=True, timeout=self._timeout) as response:
+			response.raise_for_status()
+			total = response.headers.get('Content-Range', '').rpartition('/')[2]
+			if response.status_code == 206 and total.isdigit() == True:
+				return response.url, response.headers, int(total), True
+			size = int(response.headers['Content-Length']) if 'Content-Length' in response.headers else None
+			return response.url, response.headers, size, False
+	
+	def _save_state(self, stateFile, state):
+		'''
+		Writes the resume state to disk, replacing the previous state atomically
+		'''
+		with self._lock:
+			data = json.dumps(state)
+		
+		temp = '{}.{}.tmp'.format(stateFile, uuid.uuid4().hex)
+		try:
+			with open(temp, 'w') as f:
+				f.write(data)
+			os.replace(temp, stateFile)
+		finally:
+			FilesystemUtils.remove(temp)
@@ -0,0 +1,279 @@
+import collections, concurrent.futures, json, os, signal, subprocess, threading, time
+
+class CommandResult(object):
+	'''
+	Represents the outcome of a command executed by a `SubprocessRunner`
+	'''
+	
+	def __init__(self, command, cwd=None):
+		self.command = command
+		self.cwd = cwd
+		self.returncode = None
+		self.started = None
+		self.finished = None
+		self.timed_out = False
+		self.truncated = False
+		self.stdout = ''
+		self.stderr = ''
+	
+	@property
+	def duration(self):
+		'''
+		Returns the wall time taken by the command in seconds
+		'''
+		return (self.finished - self.started) if self.started is not None and self.finished is not None else None
+	
+	def check(self):
+		'''
+		Raises an exception if the command timed out or terminated with a non-zero exit code
+		'''
+		if self.timed_out == True:
+			raise subprocess.TimeoutExpired(self.command, self.duration, output=self.stdout, stderr=self.stderr)
+		if self.returncode != 0:
+			raise subprocess.CalledProcessError(self.returncode, self.command, output=self.stdout, stderr=self.stderr)
+		return self
+	
+	def to_dict(self):
+		'''
+		Returns a JSON-compatible representation of the result (excluding the captured output)
+		'''
+		return {
+			'command': self.command,
+			'cwd': self.cwd,
+			'returncode': self.returncode,
+			'started': self.started,
+			'finished': self.finished,
+			'duration': self.duration,
+			'timed_out': self.timed_out,
+			'truncated': self.truncated
+		}
+
+
+class SubprocessRunner(object):
+	'''
+	Runs commands, optionally many at once, streaming their output line-by-line to callbacks as it
+	arrives. Commands can be given timeouts (after which the command's entire process tree is killed),
+	captured output is capped to a maximum size, and the wall time and exit status of every command is
+	recorded for later analysis.
+	'''
+	
+	def __init__(self, max_concurrency=None, timeout=None, capture_limit=1024 * 1024, on_stdout=None, on_stderr=None):
+		'''
+		Creates a new SubprocessRunner. The parameters specify the defaults for every command run by the
+		runner, and (with the exception of `max_concurrency`) can be overridden on a per-command basis.
+		
+		`max_concurrency` specifies the maximum number of commands that can run at once (defaults to the number of CPU cores.)
+		
+		`timeout` specifies the maximum number of seconds that a command can run for (defaults to no limit.)
+		
+		`capture_limit` specifies the maximum number of bytes of stdout and stderr output that will be captured
+		for each command. When the limit is exceeded, the earliest output is discarded so that the tail is kept.
+		
+		`on_stdout` and `on_stderr` specify functions that will be called with each line of output (without
+		the trailing newline) as it is received. Note that these are called from background threads. If a
+		callback raises an exception then it is not called again for that command, the remaining output is
+		still consumed (so the command cannot block on a full pipe), and the exception is raised by `run()`
+		once the command has completed.
+		'''
+		self._max_concurrency = max_concurrency if max_concurrency is not None else os.cpu_count()
+		self._timeout = timeout
+		self._capture_limit = capture_limit
+		self._on_stdout = on_stdout
+		self._on_stderr = on_stderr
+		self._slots = threading.BoundedSemaphore(self._max_concurrency)
+		self._executor = None
+		self._records = []
+		self._lock = threading.Lock()
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, *args):
+		self.shutdown()
+	
+	def run(self, command, timeout=None, capture=True, on_stdout=None, on_stderr=None, check=False, **kwargs):
+		'''
+		Runs a command, blocking until it completes (or until a slot is available if the maximum
+		number of commands are already running), and returns a `CommandResult`.
+		
+		If `capture` is False and no callbacks are specified then the command's output is printed
+		directly rather than being piped through the runner. If `check` is True then an exception is
+		raised if the command times out or returns a non-zero exit code. Any additional keyword
+		arguments are passed to `subprocess.Popen`.
+		'''
+		timeout = timeout if timeout is not None else self._timeout
+		on_stdout = on_stdout if on_stdout is not None else self._on_stdout
+		on_stderr = on_stderr if on_stderr is not None else self._on_stderr
+		piped = capture == True or on_stdout is not None or on_stderr is not None
+		result = CommandResult(command, kwargs.get('cwd'))
+		
+		with self._slots:
+			
+			# When a timeout is specified, start the command in a new process group so that we can kill its entire process tree
+			if timeout is not None and os.name == 'posix':
+				kwargs['start_new_session'] = True
+			
+			# Start the command
+			result.started = time.time()
+			process = subprocess.Popen(
+				command,
+				stdout = subprocess.PIPE if piped == True else None,
+				stderr = subprocess.PIPE if piped == True else None,
+				**kwargs
+			)
+			
+			# Start our reader threads if the output is piped
+			readers = []
+			if piped == True:
+				stdout = _OutputBuffer(self._capture_limit if capture == True else 0)
+				stderr = _OutputBuffer(self._capture_limit if capture == True else 0)
+				readers = [
+					threading.Thread(target=self._read_lines, args=(process.stdout, stdout, on_stdout), daemon=True),
+					threading.Thread(target=self._read_lines, args=(process.stderr, stderr, on_stderr), daemon=True)
+				]
+				for reader in readers:
+					reader.start()
+			
+			# Wait for the command to complete, killing it if it exceeds the timeout
+			try:
+				result.returncode = process.wait(timeout=timeout)
+			except subprocess.TimeoutExpired:
+				result.timed_out = True
+				SubprocessRunner.kill_tree(process)
+				result.returncode = process.wait()
+			except:
+				SubprocessRunner.kill_tree(process)
+				process.wait()
+				raise
+			finally:
+				for reader in readers:
+					reader.join()
+				result.finished = time.time()
+			
+			# Store the captured output
+			if piped == True:
+				result.stdout = stdout.value()
+				result.stderr = stderr.value()
+				result.truncated = stdout.truncated or stderr.truncated
+		
+		# Record the result
+		with self._lock:
+			self._records.append(result)
+		
+		# Propagate any exception raised by an output callback
+		for error in [stdout.error, stderr.error] if piped == True else []:
+			if error is not None:
+				raise error
+		
+		return result.check() if check == True else result
+	
+	def submit(self, command, **kwargs):
+		'''
+		Starts running a command in the background and returns a `concurrent.futures.Future` that
+		will resolve to its `CommandResult`. The keyword arguments are the same as for `run()`.
+		'''
+		with self._lock:
+			if self._executor is None:
+				self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._max_concurrency)
+			executor = self._executor
+		return executor.submit(self.run, command, **kwargs)
+	
+	def run_all(self, commands, check=False, **kwargs):
+		'''
+		Runs a list of commands concurrently (subject to the concurrency limit) and returns the list of
+		`CommandResult` objects in the same order. If `check` is True then an exception is raised for the
+		first command that failed, after all of the commands have completed. The keyword arguments are
+		the same as for `run()` and apply to all of the commands.
+		'''
+		futures = [self.submit(command, **kwargs) for command in commands]
+		results = [future.result() for future in futures]
+		if check == True:
+			for result in results:
+				result.check()
+		return results
+	
+	def records(self):
+		'''
+		Returns the list of `CommandResult` objects for all of the commands that have completed so far
+		'''
+		with self._lock:
+			return list(self._records)
+	
+	def save_records(self, filename):
+		'''
+		Writes the wall time and exit status for all of the commands that have completed so far to a JSON file
+		'''
+		with open(filename, 'w') as f:
+			json.dump([record.to_dict() for record in self.records()], f, indent=4)
+	
+	def shutdown(self, wait=True):
+		'''
+		Shuts down the pool of background threads used by `submit()` and `run_all()`
+		'''
+		with self._lock:
+			executor = self._executor
+			self._executor = None
+		if executor is not None:
+			executor.shutdown(wait=wait)
+	
+	@staticmethod
+	def kill_tree(process):
+		'''
+		Forcibly terminates a process and all of its descendants
+		'''
+		if process.poll() is not None:
+			return
+		
+		if os.name == 'nt':
+			subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+		else:
+			try:
+				if os.getpgid(process.pid) == process.pid:
+					os.killpg(process.pid, signal.SIGKILL)
+				else:
+					process.kill()
+			except (ProcessLookupError, PermissionError):
+				pass
+	
+	
+	# "Private" methods
+	
+	def _read_lines(self, pipe, buffer, callback):
+		'''
+		Reads lines from a pipe until it is closed, capturing them and passing them to the callback (if any).
+		The pipe is drained even if the callback fails, and the first exception is stored in the buffer.
+		'''
+		with pipe:
+			for line in iter(pipe.readline, b''):
+				buffer.append(line)
+				if callback is not None and buffer.error is None:
+					try:
+						callback(line.decode('utf-8', errors='replace').rstrip('\r\n'))
+					except Exception as err:
+						buffer.error = err
+
+
+class _OutputBuffer(object):
+	'''
+	Accumulates captured output up to a size limit, discarding the earliest output when the limit is exceeded
+	'''
+	
+	def __init__(self, limit):
+		self._limit = limit
+		self._lines = collections.deque()
+		self._size = 0
+		self.truncated = False
+		self.error = None
+	
+	def append(self, line):
+		if self._limit <= 0:
+			return
+		
+		self._lines.append(line)
+		self._size += len(line)
+		while self._size > self._limit and len(self._lines) > 0:
+			self._size -= len(self._lines.popleft())
+			self.truncated = True
+	
+	def value(self):
+		return b''.join(self._lines).decode('utf-8', errors='replace')
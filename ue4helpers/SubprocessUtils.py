@@ -1,3 +1,4 @@
+from .SubprocessRunner import SubprocessRunner
 import subprocess
 
 class SubprocessUtils(object):
@@ -14,6 +15,16 @@ class SubprocessUtils(object):
 		result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=stderr, **kwargs)
 		return result.stdout.decode('utf-8').strip()
 	
+	@staticmethod
+	def run_concurrent(commands, max_concurrency=None, timeout=None, check=True, **kwargs):
+		'''
+		Executes multiple subprocesses concurrently and returns the list of `CommandResult` objects once they have all
+		completed. See `SubprocessRunner` for details of the supported keyword arguments, and for more control over
+		streaming output and recording timing information.
+		'''
+		with SubprocessRunner(max_concurrency=max_concurrency, timeout=timeout) as runner:
+			return runner.run_all(commands, check=check, **kwargs)
+	
 	@staticmethod
 	def run(command, **kwargs):
 		'''
@@ -0,0 +1,244 @@
+from os.path import abspath, basename, dirname, isdir, join
+import concurrent.futures, os, shutil, stat, threading, uuid
+
+# The name of the trash directory created alongside removed items when no trash directory is specified
+TRASH_DIRECTORY = '.ue4helpers-trash'
+
+# The number of directory levels below each trashed item that are split into separate deletion tasks
+REAP_FANOUT_DEPTH = 2
+
+# The shared instance returned by `TrashReaper.default()`
+_DEFAULT_REAPER = None
+_DEFAULT_LOCK = threading.Lock()
+
+class TrashReaper(object):
+	'''
+	Removes files and directories asynchronously. Each item is first renamed into a trash directory on the
+	same filesystem, which is an atomic metadata operation that completes immediately, and is then deleted
+	by a pool of background threads. Large directory trees are split into subtrees that are deleted in
+	parallel, since removing many files is bound by per-file filesystem latency rather than bandwidth.
+	
+	Items that cannot be renamed (e.g. because they are mount points, or open on Windows) are removed
+	synchronously instead. Any items left in a trash directory by a process that was interrupted before
+	reaping completed are reaped the next time a reaper uses that trash directory. Note that the Python
+	interpreter waits for pending deletions to complete before it exits.
+	'''
+	
+	def __init__(self, threads=8, max_pending=16):
+		'''
+		Creates a new TrashReaper that uses the specified number of deletion threads. `max_pending` caps the
+		number of trashed items awaiting deletion: once the cap is reached, `trash()` blocks until the reaper
+		catches up, so that disk space held by trash cannot grow without bound.
+		'''
+		self._threads = threads
+		self._max_pending = max_pending
+		self._executor = None
+		self._condition = threading.Condition()
+		self._pending = 0
+		self._errors = []
+		self._known = set()
+	
+	@staticmethod
+	def default():
+		'''
+		Returns the shared TrashReaper instance used by `FilesystemUtils.remove()`
+		'''
+		global _DEFAULT_REAPER
+		with _DEFAULT_LOCK:
+			if _DEFAULT_REAPER is None:
+				_DEFAULT_REAPER = TrashReaper()
+			return _DEFAULT_REAPER
+	
+	def trash(self, path, trash_dir=None):
+		'''
+		Moves the specified file or directory into the trash (if it exists) and schedules it for deletion.
+		`trash_dir` specifies the trash directory, which must be on the same filesystem as the item, and
+		defaults to a directory named ".ue4helpers-trash" alongside the item. Returns True if the item was
+		trashed, or False if it did not exist or had to be removed synchronously.
+		'''
+		path = abspath(path)
+		if not os.path.lexists(path):
+			return False
+		trash_dir = abspath(trash_dir) if trash_dir is not None else join(dirname(path), TRASH_DIRECTORY)
+		
+		with self._condition:
+			
+			# Wait for the reaper to catch up if the cap on pending items has been reached
+			while self._max_pending is not None and self._pending >= self._max_pending:
+				self._condition.wait()
+			
+			# Rename the item into the trash, falling back to synchronous removal if the rename fails
+			try:
+				os.makedirs(trash_dir, exist_ok=True)
+				trashed = join(trash_dir, '{}-{}'.format(basename(path), uuid.uuid4().hex))
+				os.rename(path, trashed)
+			except OSError:
+				trashed = None
+			else:
+				self._submit(trashed)
+			
+			# Reap any items left behind in the trash directory by a previous process (if the trash directory could be created)
+			if trash_dir not in self._known and isdir(trash_dir):
+				self._known.add(trash_dir)
+				for leftover in os.listdir(trash_dir):
+					if join(trash_dir, leftover) != trashed:
+						self._submit(join(trash_dir, leftover))
+		
+		if trashed is None:
+			self._remove_tree(path)
+			return False
+		
+		return True
+	
+	def pending(self):
+		'''
+		Returns the number of trashed items that are still awaiting deletion
+		'''
+		with self._condition:
+			return self._pending
+	
+	def wait(self, timeout=None):
+		'''
+		Blocks until all trashed items have been deleted, or until the specified timeout (in seconds) elapses.
+		Returns True if all items were deleted, or False if the timeout elapsed first.
+		'''
+		with self._condition:
+			return self._condition.wait_for(lambda: self._pending == 0, timeout)
+	
+	def errors(self):
+		'''
+		Returns the list of errors that were encountered during deletion. Items that could not be deleted
+		are left in the trash, and deletion will be reattempted the next time that trash directory is used.
+		'''
+		with self._condition:
+			return list(self._errors)
+	
+	
+	# "Private" methods
+	
+	def _finished(self, trashed):
+		'''
+		Records the deletion of a trashed item, removing the trash directory itself once it is empty
+		'''
+		with self._condition:
+			self._pending -= 1
+			try:
+				os.rmdir(dirname(trashed))
+				self._known.discard(dirname(trashed))
+			except OSError:
+				pass
+			self._condition.notify_all()
+	
+	def _reap(self, path, depth, parent):
+		'''
+		Deletes a trashed item. Directories above the fanout depth have their subdirectories deleted as separate
+		tasks, and the directory itself is removed by whichever task finishes last (see `_ReapNode`.)
+		'''
+		if depth <= 0 or not isdir(path) or os.path.islink(path):
+			try:
+				self._remove_tree(path)
+			except OSError as err:
+				self._record_error(path, err)
+			parent.release()
+			return
+		
+		# Remove files immediately and split subdirectories into separate tasks
+		node = _ReapNode(self, path, parent)
+		try:
+			for entry in list(os.scandir(path)):
+				if entry.is_dir(follow_symlinks=False):
+					node.acquire()
+					self._executor.submit(self._reap, entry.path, depth - 1, node)
+				else:
+					try:
+						self._remove_file(entry.path)
+					except OSError as err:
+						self._record_error(entry.path, err)
+		except OSError as err:
+			self._record_error(path, err)
+		finally:
+			node.release()
+	
+	def _record_error(self, path, err):
+		'''
+		Records an error that occurred whilst deleting a trashed item. Items that no longer exist are not
+		errors, since another reaper may have been reaping the same leftover items from a previous process.
+		'''
+		if isinstance(err, FileNotFoundError):
+			return
+		with self._condition:
+			self._errors.append('{}: {}'.format(path, err))
+	
+	def _remove_file(self, path):
+		'''
+		Removes a single file, clearing its read-only attribute first if necessary (as required under Windows)
+		'''
+		try:
+			os.unlink(path)
+		except PermissionError:
+			os.chmod(path, stat.S_IWRITE)
+			os.unlink(path)
+	
+	def _remove_tree(self, path):
+		'''
+		Removes a file or directory tree synchronously, clearing read-only attributes where necessary
+		'''
+		def retry(function, failed, excinfo):
+			os.chmod(failed, stat.S_IWRITE)
+			function(failed)
+		
+		if isdir(path) and not os.path.islink(path):
+			shutil.rmtree(path, onerror=retry)
+		elif os.path.lexists(path):
+			self._remove_file(path)
+	
+	def _submit(self, trashed):
+		'''
+		Schedules a trashed item for deletion (the caller must hold the condition lock)
+		'''
+		if self._executor is None:
+			self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._threads)
+		self._pending += 1
+		self._executor.submit(self._reap, trashed, REAP_FANOUT_DEPTH, _ReapRoot(self, trashed))
+
+
+class _ReapRoot(object):
+	'''
+	Completion tracker for a top-level trashed item
+	'''
+	
+	def __init__(self, reaper, trashed):
+		self._reaper = reaper
+		self._trashed = trashed
+	
+	def release(self):
+		self._reaper._finished(self._trashed)
+
+
+class _ReapNode(object):
+	'''
+	Completion tracker for a directory whose subdirectories are being deleted by separate tasks. The directory
+	is removed (and its parent is notified) once the scanning task and all of the subdirectory tasks are done.
+	'''
+	
+	def __init__(self, reaper, path, parent):
+		self._reaper = reaper
+		self._path = path
+		self._parent = parent
+		self._remaining = 1
+		self._lock = threading.Lock()
+	
+	def acquire(self):
+		with self._lock:
+			self._remaining += 1
+	
+	def release(self):
+		with self._lock:
+			self._remaining -= 1
+			done = self._remaining == 0
+		if done == True:
+			try:
+				os.rmdir(self._path)
+			except OSError as err:
+				self._reaper._record_error(self._path, err)
+			self._parent.release()
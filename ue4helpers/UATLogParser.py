@@ -0,0 +1,182 @@
+import re, threading, time
+
+# Matches the banners that BuildCookRun prints at the start and end of each of its commands
+PHASE_BANNER = re.compile(r'\*+\s*(BUILD|COOK|STAGE|PACKAGE|ARCHIVE)\s+COMMAND\s+(STARTED|COMPLETED)\s*\*+', re.IGNORECASE)
+
+# Matches the lines that indicate that pak file creation has started or finished during the stage command
+PAK_STARTED = re.compile(r'Creating pak using staging manifest|Executing \d+ UnrealPak command|Running UnrealPak', re.IGNORECASE)
+PAK_FINISHED = re.compile(r'UnrealPak (?:terminated|exited|finished)|Pak files? (?:created|written)', re.IGNORECASE)
+
+# Matches the progress lines printed by the cooker
+COOK_PROGRESS = re.compile(r'Cooked packages (\d+) Packages Remain (\d+) Total (\d+)', re.IGNORECASE)
+
+# Matches the final exit code line printed by AutomationTool
+EXIT_CODE = re.compile(r'AutomationTool exiting with ExitCode=(-?\d+)', re.IGNORECASE)
+
+# Matches warning and error lines from UAT, UBT, the compiler and the Unreal log categories
+WARNING_LINE = re.compile(r'(?:^|\s|\))warning(?:\s+[A-Z]+\d+)?\s*:|:\s*Warning:', re.IGNORECASE)
+ERROR_LINE = re.compile(r'(?:^|\s|\))(?:fatal\s+)?error(?:\s+[A-Z]+\d+)?\s*:|:\s*Error:', re.IGNORECASE)
+
+
+class UATLogParser(object):
+	'''
+	Parses the output of the Unreal AutomationTool as it is produced, identifying phase boundaries
+	(build, cook, stage, pak, package, archive), warnings and errors, and cook progress counts.
+	Each of these is published as an event, and a timing summary is available once parsing is complete.
+	
+	Events are dictionaries with a `type` key (one of "phase_started", "phase_finished", "warning",
+	"error", "cook_progress" or "exit_code") and a `time` key, plus type-specific details.
+	'''
+	
+	def __init__(self, on_event=None, max_messages=100):
+		'''
+		Creates a new parser. `on_event` specifies an optional function that will be called with each
+		event as it is detected. `max_messages` specifies the maximum number of warning and error lines
+		that will be retained for inclusion in the summary (all of them are counted regardless.)
+		'''
+		self._on_event = on_event
+		self._max_messages = max_messages
+		self._lock = threading.Lock()
+		self._started = time.time()
+		self._finished = None
+		self._phases = []
+		self._open = {}
+		self._warnings = []
+		self._errors = []
+		self._warning_count = 0
+		self._error_count = 0
+		self._cook = None
+		self._exit_code = None
+	
+	def feed(self, line):
+		'''
+		Parses a single line of output. This is safe to call from multiple threads (e.g. for stdout and stderr.)
+		'''
+		with self._lock:
+			now = time.time()
+			events = []
+			
+			# Detect the start and end of each BuildCookRun command
+			banner = PHASE_BANNER.search(line)
+			if banner is not None:
+				phase = banner.group(1).lower()
+				if banner.group(2).upper() == 'STARTED':
+					events.append(self._start_phase(phase, now))
+				else:
+					if phase == 'stage' and 'pak' in self._open:
+						events.append(self._finish_phase('pak', now))
+					events.append(self._finish_phase(phase, now))
+			
+			# Detect the start and end of pak file creation
+			elif PAK_STARTED.search(line) is not None and 'pak' not in self._open:
+				events.append(self._start_phase('pak', now))
+			elif PAK_FINISHED.search(line) is not None and 'pak' in self._open:
+				events.append(self._finish_phase('pak', now))
+			
+			# Detect cook progress updates
+			progress = COOK_PROGRESS.search(line)
+			if progress is not None:
+				self._cook = {
+					'cooked': int(progress.group(1)),
+					'remaining': int(progress.group(2)),
+					'total': int(progress.group(3))
+				}
+				events.append(dict(self._cook, type='cook_progress', time=now))
+			
+			# Detect errors and warnings
+			elif ERROR_LINE.search(line) is not None:
+				self._error_count += 1
+				if len(self._errors) < self._max_messages:
+					self._errors.append(line)
+				events.append({'type': 'error', 'time': now, 'phase': self._current_phase(), 'message': line})
+			elif WARNING_LINE.search(line) is not None:
+				self._warning_count += 1
+				if len(self._warnings) < self._max_messages:
+					self._warnings.append(line)
+				events.append({'type': 'warning', 'time': now, 'phase': self._current_phase(), 'message': line})
+			
+			# Detect the final exit code
+			exitCode = EXIT_CODE.search(line)
+			if exitCode is not None:
+				self._exit_code = int(exitCode.group(1))
+				events.append({'type': 'exit_code', 'time': now, 'exit_code': self._exit_code})
+		
+		# Publish our events outside of the lock
+		for event in [e for e in events if e is not None]:
+			if self._on_event is not None:
+				self._on_event(event)
+	
+	def finish(self):
+		'''
+		Marks parsing as complete, closing any phases that did not report their completion
+		'''
+		with self._lock:
+			now = time.time()
+			events = [self._finish_phase(phase, now) for phase in list(self._open.keys())]
+			self._finished = now
+		
+		for event in events:
+			if self._on_event is not None:
+				self._on_event(event)
+	
+	def summary(self):
+		'''
+		Returns a dictionary summarising the phase durations, warnings, errors and cook progress
+		'''
+		with self._lock:
+			end = self._finished if self._finished is not None else time.time()
+			return {
+				'duration': end - self._started,
+				'phases': [dict(phase) for phase in self._phases],
+				'warnings': self._warning_count,
+				'errors': self._error_count,
+				'warning_messages': list(self._warnings),
+				'error_messages': list(self._errors),
+				'cook': dict(self._cook) if self._cook is not None else None,
+				'exit_code': self._exit_code
+			}
+	
+	def format_summary(self):
+		'''
+		Returns a human-readable timing summary
+		'''
+		summary = self.summary()
+		lines = ['AutomationTool timing summary:']
+		for phase in summary['phases']:
+			lines.append('  {:<10} {:>10.1f}s'.format(phase['name'], phase['duration'] if phase['duration'] is not None else 0.0))
+		lines.append('  {:<10} {:>10.1f}s'.format('total', summary['duration']))
+		if summary['cook'] is not None:
+			lines.append('  Cooked {} of {} packages'.format(summary['cook']['cooked'], summary['cook']['total']))
+		lines.append('  {} warning(s), {} error(s)'.format(summary['warnings'], summary['errors']))
+		return '\n'.join(lines)
+	
+	
+	# "Private" methods
+	
+	def _current_phase(self):
+		'''
+		Returns the name of the innermost phase that is currently running, if any
+		'''
+		running = [phase['name'] for phase in self._phases if self._open.get(phase['name']) is phase]
+		return running[-1] if len(running) > 0 else None
+	
+	def _finish_phase(self, name, now):
+		'''
+		Records the end of a phase and returns the corresponding event (or None if the phase was not running)
+		'''
+		phase = self._open.pop(name, None)
+		if phase is None:
+			return None
+		
+		phase['end'] = now
+		phase['duration'] = now - phase['start']
+		return {'type': 'phase_finished', 'time': now, 'phase': name, 'duration': phase['duration']}
+	
+	def _start_phase(self, name, now):
+		'''
+		Records the start of a phase and returns the corresponding event
+		'''
+		phase = {'name': name, 'start': now, 'end': None, 'duration': None}
+		self._phases.append(phase)
+		self._open[name] = phase
+		return {'type': 'phase_started', 'time': now, 'phase': name}
@@ -1,4 +1,7 @@
+from .ArchiveUtils import ARCHIVE_EXTENSIONS
+from .ContentHasher import ContentHasher, GENERATED_DIRECTORIES, HASH_INDEX, STABLE_ALGORITHM
 from .GitUtils import GitUtils
+from os.path import join
 
 class VersionHelpers(object):
 	'''
@@ -25,3 +28,28 @@ class VersionHelpers(object):
 		Returns the currently checked out tag of a git repository for use as a version string
 		'''
 		return lambda root, descriptor: GitUtils.tag_name(root)
+	
+	@staticmethod
+	def from_content_hash(length=12, exclude=[], index=HASH_INDEX, threads=0):
+		'''
+		Hashes the contents of the project or plugin tree for use as a version string, which is useful for builds
+		from trees with uncommitted changes or from sources that are not under version control.
+		
+		Generated directories (Binaries, DerivedDataCache, Intermediate, Saved and dist), hidden files and
+		directories, archive files and any files or directories matching the patterns in `exclude` are ignored.
+		Files are hashed in parallel, using `threads` threads (defaults to the number of CPU cores.) SHA-256 is
+		always used, so that the same tree produces the same version string under every version of Python.
+		
+		`length` specifies the number of hexadecimal digits of the digest to use for the version string.
+		
+		`index` specifies the path (relative to the root directory) of the persistent index used to reuse the
+		digests of files whose size and modification time have not changed. Specify None to disable the index.
+		'''
+		def compute(root, descriptor):
+			archives = ['*{}'.format(extension) for extension in ARCHIVE_EXTENSIONS.values()]
+			hasher = ContentHasher(index=join(root, index) if index is not None else None, threads=threads, algorithm=STABLE_ALGORITHM)
+			digest = hasher.hash_tree(root, exclude=GENERATED_DIRECTORIES + archives + exclude)
+			hasher.save()
+			return digest[:length]
+		
+		return compute
@@ -1,15 +1,77 @@
-from .ArchiveUtils import ArchiveUtils
-from .AWSUtils import AWSUtils
-from .CacheUtils import CacheUtils
-from .ConanUtils import ConanUtils
-from .DescriptorData import DescriptorData
-from .DockerUtils import DockerUtils
-from .FilesystemUtils import FilesystemUtils
-from .GCPUtils import GCPUtils
-from .GitUtils import GitUtils
-from .PlatformInfo import PlatformInfo
-from .PluginPackager import PluginPackager
-from .ProjectPackager import ProjectPackager
-from .SubprocessUtils import SubprocessUtils
-from .UnrealUtils import UnrealUtils
-from .VersionHelpers import VersionHelpers
+import importlib, sys, types
+
+# The public classes exported by the package, and the submodules that define them.
+# Submodules are only imported when one of their classes is first accessed, so that
+# scripts only pay the import cost for the functionality that they actually use.
+_EXPORTS = {
+	'ArchiveMerger': 'ArchiveMerger',
+	'ArchiveUtils': 'ArchiveUtils',
+	'ArtifactStore': 'ArtifactStore',
+	'AWSUtils': 'AWSUtils',
+	'BuildFingerprint': 'BuildFingerprint',
+	'CacheUtils': 'CacheUtils',
+	'ChunkStore': 'ChunkStore',
+	'ConanUtils': 'ConanUtils',
+	'ContentHasher': 'ContentHasher',
+	'DescriptorData': 'DescriptorData',
+	'DockerContextBuilder': 'DockerContextBuilder',
+	'DockerFilesystemHelper': 'DockerFilesystemHelper',
+	'DockerUtils': 'DockerUtils',
+	'FilesystemUtils': 'FilesystemUtils',
+	'GCPUtils': 'GCPUtils',
+	'GCSArtifactStore': 'ArtifactStore',
+	'GitMirrorCache': 'GitMirrorCache',
+	'GitUtils': 'GitUtils',
+	'Instrumentation': 'Instrumentation',
+	'InstrumentationHook': 'Instrumentation',
+	'LocalArtifactStore': 'ArtifactStore',
+	'PipelineRunner': 'PipelineRunner',
+	'PlatformInfo': 'PlatformInfo',
+	'PluginPackager': 'PluginPackager',
+	'ProjectPackager': 'ProjectPackager',
+	'S3ArtifactStore': 'ArtifactStore',
+	'SegmentedDownloader': 'SegmentedDownloader',
+	'SubprocessRunner': 'SubprocessRunner',
+	'SubprocessUtils': 'SubprocessUtils',
+	'TrashReaper': 'TrashReaper',
+	'UATLogParser': 'UATLogParser',
+	'UnrealUtils': 'UnrealUtils',
+	'VersionHelpers': 'VersionHelpers'
+}
+
+__all__ = list(_EXPORTS.keys())
+
+def __getattr__(name):
+	'''
+	Imports the submodule for an exported class when the class is first accessed
+	'''
+	if name in _EXPORTS:
+		module = importlib.import_module('.{}'.format(_EXPORTS[name]), __name__)
+		return getattr(module, name)
+	
+	raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+def __dir__():
+	'''
+	Lists the exported classes alongside the module's own attributes
+	'''
+	return sorted(set(globals().keys()) | set(_EXPORTS.keys()))
+
+
+class _LazyModule(types.ModuleType):
+	'''
+	Module type for the package itself. When a submodule is imported, Python binds it as an attribute
+	of the package, which would shadow the class of the same name. We intercept that binding and store
+	the class instead, so that `ue4helpers.ArchiveUtils` always refers to the class. Defining `__getattr__`
+	here as well provides lazy loading under Python versions that predate module-level `__getattr__`.
+	'''
+	
+	def __getattr__(self, name):
+		return __getattr__(name)
+	
+	def __setattr__(self, name, value):
+		if name in _EXPORTS and isinstance(value, types.ModuleType) and hasattr(value, name):
+			value = getattr(value, name)
+		super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = _LazyModule
@@ -0,0 +1,56 @@
+from .PipelineRunner import PipelineRunner
+import argparse, sys
+
+def main():
+	'''
+	Entry point for the `ue4helpers` command
+	'''
+	parser = argparse.ArgumentParser(prog='ue4helpers', description='Unreal Engine 4 Continuous Integration helper functionality')
+	commands = parser.add_subparsers(dest='command')
+	
+	# The `run` command runs the steps of a pipeline file
+	run = commands.add_parser('run', help='Run the steps of a pipeline file')
+	run.add_argument('pipeline', help='The JSON or YAML pipeline file')
+	run.add_argument('targets', nargs='*', help='The steps to run (along with the steps they depend on), defaults to all steps')
+	run.add_argument('-j', '--jobs', type=int, default=None, help='The maximum number of steps to run at once (defaults to the number of CPU cores)')
+	run.add_argument('--resource', action='append', default=[], metavar='NAME=COUNT', help='Override the limit for a resource declared by the pipeline')
+	run.add_argument('--force', action='store_true', help='Run steps even if their inputs are unchanged')
+	run.add_argument('--quiet', action='store_true', help='Write step output only to the log files rather than echoing it')
+	run.add_argument('--report', default=None, help='Write the timing report for the run to the specified JSON file')
+	run.add_argument('--trace', default=None, help='Write the step timings to the specified Chrome Trace Event format file')
+	
+	# Allow target steps to follow the options (argparse only collects the targets that precede them)
+	args, extra = parser.parse_known_args()
+	unknown = [arg for arg in extra if arg.startswith('-')]
+	if len(unknown) > 0:
+		parser.error('unrecognized arguments: {}'.format(' '.join(unknown)))
+	if args.command == 'run':
+		args.targets.extend(extra)
+	
+	if args.command != 'run':
+		parser.print_help()
+		return 1
+	
+	# Parse any resource limit overrides
+	resources = {}
+	for item in args.resource:
+		name, _, count = item.partition('=')
+		if count.isdigit() == False:
+			parser.error('invalid resource limit "{}", expected NAME=COUNT'.format(item))
+		resources[name] = int(count)
+	
+	# Run the pipeline and report the results
+	pipeline = PipelineRunner.load(args.pipeline, jobs=args.jobs, resources=resources, force=args.force, echo=not args.quiet)
+	report = pipeline.run(args.targets, check=False)
+	print('', flush=True)
+	print(PipelineRunner.format_report(report), flush=True)
+	if args.report is not None:
+		pipeline.save_report(args.report)
+	if args.trace is not None:
+		pipeline.instrumentation().save_chrome_trace(args.trace)
+	
+	failed = [step for step in report['steps'].values() if step['status'] in ['failed', 'blocked']]
+	return 1 if len(failed) > 0 else 0
+
+if __name__ == '__main__':
+	sys.exit(main())